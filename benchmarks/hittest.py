@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Hit-test latency against polygon count, for a linear scan over all
+polygons and for the grid index, using the GUI-free Agg backend
+
+    python benchmarks/hittest.py [counts ...]
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+from matplotlib import patches
+from matplotlib.backend_bases import KeyEvent
+
+from labelmaker.spatial import gridindex, cellsize
+
+def setup(count, shape = (2000, 1000), seed = 0):
+    rng = np.random.RandomState(seed)
+    fig, ax = plt.subplots()
+    ax.set_xlim(0, shape[0])
+    ax.set_ylim(shape[1], 0)
+
+    polys = {}
+    index = gridindex(cellsize(shape))
+    for _ in range(count):
+        centre = rng.uniform(0, 1, 2) * shape
+        size = rng.uniform(5, 100, 2)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, rng.randint(5, 40)))
+        vertices = centre + np.c_[np.cos(angles), np.sin(angles)] * size
+        poly = patches.Polygon(vertices, alpha = 0.5)
+        ax.add_patch(poly)
+        polys[poly] = 1
+        index.insert(poly, poly.get_xy())
+
+    fig.canvas.draw()
+    events = []
+    for x, y in rng.uniform(0, 1, (200, 2)) * shape:
+        px, py = ax.transData.transform((x, y))
+        events.append(KeyEvent('key_press_event', fig.canvas, 'd', px, py))
+
+    return polys, index, events
+
+def scan(polys, events):
+    for event in events:
+        [poly for poly in polys if poly.contains(event)[0]]
+
+def indexed(index, events):
+    for event in events:
+        [poly for poly in index.candidates(event.xdata, event.ydata)
+              if poly.contains(event)[0]]
+
+def main(argv):
+    counts = [int(x) for x in argv[1:]] or [10, 100, 500, 1000, 5000]
+
+    print('{:>8} {:>14} {:>14}'.format('polygons', 'scan (us)', 'index (us)'))
+    for count in counts:
+        polys, index, events = setup(count)
+        a = min(timeit.repeat(lambda: scan(polys, events), number = 1, repeat = 3))
+        b = min(timeit.repeat(lambda: indexed(index, events), number = 1, repeat = 3))
+        n = len(events)
+        print('{:>8} {:>14.1f} {:>14.1f}'.format(count, 1e6 * a / n, 1e6 * b / n))
+        plt.close('all')
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite - time the expensive operations of the labelmaker on a
+synthetic SEG-Y file and random polygons, using the GUI-free Agg backend.
+Results are written as JSON, and can be compared to a stored baseline:
+
+    python benchmarks/suite.py -o baseline.json
+    python benchmarks/suite.py -o results.json --baseline baseline.json
+
+The exit status is 1 if any benchmark is slower than the baseline by more
+than the tolerance
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import segyio
+
+import labelmaker.core as core
+from labelmaker.labelmaker import plotter, parser
+from labelmaker.section import decimated, shape, pyramid
+
+import hittest
+import synthetic
+
+def timed(fn, repeat):
+    """
+    Run fn repeat times
+    :return: list of seconds of every run
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+class context(object):
+    """
+    The synthetic data shared by the benchmarks, in a temporary directory
+    """
+    def __init__(self, directory, traces, samples, count):
+        self.directory = directory
+        self.path = os.path.join(directory, 'synthetic.sgy')
+        self.shape = (traces, samples)
+
+        synthetic.segy(self.path, traces, samples)
+        self.polygons = synthetic.polygons(count, traces, samples)
+
+    def gui(self, *options):
+        args = parser().parse_args([self.path] + list(options))
+        with segyio.open(self.path, ignore_geometry=True) as f:
+            traces = decimated(f)
+            dims = shape(f)
+            lod = pyramid(f, traces)
+            p = plotter(args, traces, dims, lod)
+            p.run()
+            p.canvas.draw()
+        return p
+
+def python(code):
+    # a fresh interpreter, to time imports
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH = root)
+    return lambda: subprocess.check_call([sys.executable, '-c', code], env = env,
+                                         stdout = subprocess.DEVNULL)
+
+def import_library(ctx):
+    return python('import labelmaker.core, labelmaker.render, labelmaker.utility')
+
+def cli_help(ctx):
+    return python('import labelmaker\n'
+                  'try: labelmaker.main(["labelmaker", "--help"])\n'
+                  'except SystemExit: pass')
+
+def startup(ctx):
+    # open, read the section and draw the first frame
+    def run():
+        ctx.gui()
+        plt.close('all')
+    return run
+
+def redraw(ctx):
+    # a full redraw of the figure, as on zoom, pan and resize
+    return ctx.gui().canvas.draw
+
+def redraw_polygons(*options):
+    # a full redraw, with every polygon drawn
+    def benchmark(ctx):
+        p = ctx.gui(*options)
+        for vertices, cls in ctx.polygons: p.insert(vertices, cls)
+        return p.canvas.draw
+    return benchmark
+
+def load_traces(ctx):
+    def run():
+        with segyio.open(ctx.path, ignore_geometry=True) as f:
+            decimated(f, 2, 2)
+    return run
+
+def mkoutput(ctx):
+    return lambda: core.mkoutput(ctx.polygons, ctx.shape, 1, 1)
+
+def export(ctx):
+    return lambda: core.export(ctx.path, ctx.polygons, 1, 1,
+                               directory = ctx.directory)
+
+def save_polys(fmt):
+    def benchmark(ctx):
+        p = ctx.gui('--polys-format', fmt)
+        for vertices, cls in ctx.polygons: p.insert(vertices, cls)
+        return p.save_polys
+    return benchmark
+
+def load_polys(fmt):
+    def benchmark(ctx):
+        p = ctx.gui('--polys-format', fmt)
+        for vertices, cls in ctx.polygons: p.insert(vertices, cls)
+        p.save_polys()
+        saved = core.polys_path(ctx.path, 'polys-', '.' + fmt)
+
+        def run():
+            for poly in p.polys: poly.remove()
+            p.polys.clear()
+            p.index = type(p.index)(p.index.cellsize)
+            p.load_polys(saved)
+        return run
+    return benchmark
+
+def hit_testing(ctx):
+    polys, index, events = hittest.setup(len(ctx.polygons), ctx.shape)
+    return lambda: hittest.indexed(index, events)
+
+benchmarks = [
+    ('import-library', import_library),
+    ('cli-help', cli_help),
+    ('startup', startup),
+    ('redraw', redraw),
+    ('redraw-polygons', redraw_polygons()),
+    ('redraw-polygons-raster', redraw_polygons('--raster-labels')),
+    ('load-traces', load_traces),
+    ('mkoutput', mkoutput),
+    ('export', export),
+    ('save-polys-json', save_polys('json')),
+    ('save-polys-npz', save_polys('npz')),
+    ('load-polys-json', load_polys('json')),
+    ('load-polys-npz', load_polys('npz')),
+    ('hit-testing', hit_testing),
+]
+
+def environment():
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'matplotlib': matplotlib.__version__,
+            'segyio': getattr(segyio, '__version__', 'unknown')}
+
+def run(args):
+    selected = [(name, fn) for name, fn in benchmarks
+                if not args.only or name in args.only]
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix = 'labelmaker-bench-') as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            ctx = context(tmp, args.traces, args.samples, args.polygons)
+            for name, benchmark in selected:
+                # the labelmaker prints progress, which is not interesting here
+                with contextlib.redirect_stdout(io.StringIO()):
+                    runs = timed(benchmark(ctx), args.repeat)
+                plt.close('all')
+
+                results[name] = {'seconds': min(runs), 'runs': runs}
+                print('{:<22} {:>10.4f}s'.format(name, min(runs)))
+        finally:
+            os.chdir(cwd)
+
+    return {'config': {'traces': args.traces,
+                       'samples': args.samples,
+                       'polygons': args.polygons,
+                       'repeat': args.repeat},
+            'environment': environment(),
+            'results': results}
+
+def regressions(results, baseline, tolerance):
+    """
+    Compare results to a baseline
+    :param results: dict, see run()
+    :param baseline: dict, see run()
+    :param tolerance: float, allowed slowdown, as a fraction of the baseline
+    :return: list of (name, baseline seconds, seconds, ratio, regressed)
+    """
+    if results['config'] != baseline['config']:
+        print('Warning: the baseline was run with {}'.format(baseline['config']))
+
+    compared = []
+    for name, result in results['results'].items():
+        if name not in baseline['results']: continue
+        before = baseline['results'][name]['seconds']
+        after = result['seconds']
+        ratio = after / before if before > 0 else float('inf')
+        compared.append((name, before, after, ratio, ratio > 1 + tolerance))
+
+    return compared
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = argv[0],
+                                     description='Labelmaker benchmark suite')
+    parser.add_argument('--traces', type=int, default=2000,
+                        help='Traces in the synthetic section')
+    parser.add_argument('--samples', type=int, default=1000,
+                        help='Samples per trace in the synthetic section')
+    parser.add_argument('--polygons', type=int, default=200,
+                        help='Number of random polygons')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs of every benchmark, the fastest is reported')
+    parser.add_argument('--only', nargs='+',
+                        choices=[name for name, _ in benchmarks],
+                        help='Only run these benchmarks')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', type=str,
+                        help='Compare to the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown over the baseline, as a fraction')
+    args = parser.parse_args(argv[1:])
+
+    results = run(args)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2)
+        print("Wrote", args.output)
+
+    if args.baseline is None: return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    compared = regressions(results, baseline, args.tolerance)
+    print('{:<18} {:>11} {:>11} {:>8}'.format('benchmark', 'baseline', 'now', 'ratio'))
+    for name, before, after, ratio, regressed in compared:
+        print('{:<18} {:>10.4f}s {:>10.4f}s {:>7.2f}x{}'.format(
+              name, before, after, ratio, '  REGRESSION' if regressed else ''))
+
+    return 1 if any(regressed for *_, regressed in compared) else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
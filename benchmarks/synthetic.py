@@ -0,0 +1,65 @@
+"""
+Synthetic SEG-Y files and polygons for the benchmarks
+"""
+
+import numpy as np
+import segyio
+
+def segy(path, traces, samples, chunksize = 1024, seed = 0):
+    """
+    Write a single-inline segy file with traces traces of samples samples.
+    The traces are smooth sinusoids with some noise, so that they look
+    somewhat like a seismic section
+    :param path: output path
+    :param traces: int
+    :param samples: int
+    :param chunksize: int, traces generated and written at a time
+    :param seed: int, random seed of the noise
+    """
+    spec = segyio.spec()
+    spec.format = 5
+    spec.samples = list(range(samples))
+    spec.ilines = [1]
+    spec.xlines = list(range(1, traces + 1))
+    spec.offsets = [1]
+    spec.sorting = segyio.TraceSortingFormat.INLINE_SORTING
+
+    rng = np.random.RandomState(seed)
+    depth = np.arange(samples, dtype=np.single)
+
+    with segyio.create(str(path), spec) as f:
+        for first in range(0, traces, chunksize):
+            last = min(first + chunksize, traces)
+            x = np.arange(first, last, dtype=np.single)[:, np.newaxis]
+            data = np.sin(depth / 7 + np.sin(x / 50) * 3)
+            data += rng.normal(0, 0.1, data.shape).astype(np.single)
+
+            f.header[first:last] = [{segyio.su.iline: 1,
+                                     segyio.su.xline: 1 + i,
+                                     segyio.su.offset: 1,
+                                     segyio.su.cdp: i}
+                                    for i in range(first, last)]
+            f.trace[first:last] = data.astype(np.single)
+
+def polygons(count, traces, samples, seed = 0):
+    """
+    Random, star-shaped polygons of 5 to 40 vertices within a section
+    :param count: int, number of polygons
+    :param traces: int, width of the section
+    :param samples: int, height of the section
+    :param seed: int, random seed
+    :return: list of (numpy array of shape (n, 2), class)
+    """
+    rng = np.random.RandomState(seed)
+    shape = np.array([traces, samples], dtype=np.float64)
+
+    polys = []
+    for _ in range(count):
+        centre = rng.uniform(0, 1, 2) * shape
+        size = rng.uniform(0.005, 0.05, 2) * shape
+        angles = np.sort(rng.uniform(0, 2 * np.pi, rng.randint(5, 40)))
+        vertices = centre + np.c_[np.cos(angles), np.sin(angles)] * size
+        vertices = np.clip(vertices, 0, shape - 1)
+        polys.append((vertices, rng.randint(1, 10)))
+
+    return polys
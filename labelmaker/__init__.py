@@ -1 +1,5 @@
-from .labelmaker import main
+def main(argv = None):
+    # matplotlib, and with it a GUI backend, is only imported when the
+    # interactive labelmaker starts
+    from .cli import main
+    return main(argv)
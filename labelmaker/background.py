@@ -0,0 +1,89 @@
+import threading
+
+# Long-running work, i.e. exports, run in a background thread so that the
+# GUI stays responsive. A task reports its progress through a callback,
+# progress(done, total), which is also where it is stopped: once cancelled,
+# the next call raises cancelled, which unwinds the task like any other
+# error, so files are cleaned up by the same code paths.
+#
+# Tasks that write the same files must not run at the same time. A task
+# started with a previous task cancels it, i.e. supersedes it, and waits for
+# it to stop before it starts its own work
+
+class cancelled(Exception):
+    """
+    Raised by the progress callback of a cancelled task
+    """
+
+class task(object):
+    """
+    A function run in a background thread, see the module comment
+    """
+    def __init__(self, name, fn, *args, previous = None, **kwargs):
+        """
+        :param name: str, what the task does, for the status
+        :param fn: callable, called as fn(*args, progress = callback, **kwargs)
+        :param previous: task, which is cancelled and waited for first
+        """
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.previous = previous
+
+        self.done = 0
+        self.total = 0
+        self.state = 'waiting'
+        self.result = None
+        self.error = None
+
+        self.stop = threading.Event()
+        # not a daemon, so that an export in progress when the window is
+        # closed still completes
+        self.thread = threading.Thread(target = self.run, name = name)
+
+    def start(self):
+        if self.previous is not None: self.previous.cancel()
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.stop.set()
+
+    def running(self):
+        return self.thread.is_alive()
+
+    def wait(self, timeout = None):
+        self.thread.join(timeout)
+        return not self.running()
+
+    def progress(self, done, total):
+        self.done, self.total = done, total
+        if self.stop.is_set(): raise cancelled()
+
+    def run(self):
+        if self.previous is not None:
+            self.previous.wait()
+            # only one superseded task is kept waiting for
+            self.previous = None
+
+        try:
+            self.progress(0, 0)
+            self.state = 'running'
+            self.result = self.fn(*self.args, progress = self.progress, **self.kwargs)
+            self.state = 'done'
+        except cancelled:
+            self.state = 'cancelled'
+        except Exception as e:
+            self.error = e
+            self.state = 'failed'
+
+    def status(self):
+        """
+        The state of the task, as a line of text
+        """
+        if self.state == 'running' and self.total:
+            return '{}: {}%'.format(self.name, 100 * self.done // self.total)
+        if self.state == 'failed':
+            return '{} failed: {}'.format(self.name, self.error)
+        return '{}: {}'.format(self.name, self.state)
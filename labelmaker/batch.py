@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import sys
+import time
+
+from .core import export_saved
+
+def export_pair(job):
+    """
+    Export one (segy, polygons) pair, and time it. Runs in a worker process
+    :param job: (segy path, polygons path, options dict)
+    :return: (segy path, output path or None, seconds, error message or None)
+    """
+    fname, polys, options = job
+    verbose = options.pop('verbose', False)
+
+    start = time.perf_counter()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else log):
+            output = export_saved(fname, polys, **options)
+    except Exception as e:
+        return fname, None, time.perf_counter() - start, str(e)
+
+    return fname, output, time.perf_counter() - start, None
+
+def pairs(args):
+    files = list(args.files)
+    if args.list is not None:
+        with open(args.list) as f:
+            for line in f:
+                files.extend(line.split())
+
+    if len(files) % 2 != 0:
+        raise ValueError('Expected (segy, polygons) pairs, got {} paths'.format(len(files)))
+
+    return list(zip(files[::2], files[1::2]))
+
+def main(argv = None):
+    if argv is None: argv = sys.argv
+
+    parser = argparse.ArgumentParser(prog = argv[0],
+                                     description='Labelmaker batch export - render saved '
+                                                 'polygons to segy files, without a GUI')
+    parser.add_argument('files',
+                        type=str,
+                        nargs='*',
+                        help='Pairs of input segy file and saved polygons')
+
+    parser.add_argument('--list',
+                        type=str,
+                        help='File with one "segy polygons" pair per line')
+
+    parser.add_argument('-p',
+                        '--prefix',
+                        type=str,
+                        help='Output file prefix',
+                        default='labelmade-')
+
+    parser.add_argument('-o',
+                        '--output-dir',
+                        type=str,
+                        help='Directory to write exported files to. Default: working directory')
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of files exported in parallel')
+
+    parser.add_argument('--chunk-size',
+                        type=int,
+                        default=4096,
+                        help='Number of traces rendered and written at a time')
+
+    parser.add_argument('-f',
+                        '--format',
+                        choices=['segy', 'npy', 'rle'],
+                        default='segy',
+                        help='Output format of the labels')
+
+    parser.add_argument('-v',
+                        '--verbose',
+                        action='store_true',
+                        help='Print progress for every file')
+
+    args = parser.parse_args(args = argv[1:])
+
+    try:
+        jobs = pairs(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    options = {'prefix': args.prefix,
+               'chunksize': args.chunk_size,
+               'directory': os.path.abspath(args.output_dir or os.getcwd()),
+               'format': args.format,
+               'verbose': args.verbose}
+    work = [(fname, polys, dict(options)) for fname, polys in jobs]
+
+    start = time.perf_counter()
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers = args.jobs) as pool:
+        for fname, output, seconds, error in pool.map(export_pair, work):
+            if error is not None:
+                failed += 1
+                print('{}: failed after {:.2f}s: {}'.format(fname, seconds, error))
+            else:
+                print('{}: {:.2f}s -> {}'.format(fname, seconds, output))
+
+    print('Exported {} of {} files in {:.2f}s'.format(
+        len(work) - failed, len(work), time.perf_counter() - start))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
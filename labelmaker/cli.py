@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+import argparse
+import segyio
+import sys
+
+from .section import shape, pyramid
+from . import preview
+from .cube import cube
+from . import timing
+
+# The command line interface of the interactive labelmaker. matplotlib, and
+# with it a GUI backend, is only imported when the plotter starts, after the
+# arguments are parsed and the section is read
+
+def parser(prog = None):
+    parser = argparse.ArgumentParser(prog = prog,
+                                     description='Labelmaker - open segyiofile, '
+                                                 'mark areas interactively and export the result')
+    parser.add_argument('input',
+                        type=str,
+                        help='Input file')
+
+    parser.add_argument('-t',
+                        '--threshold',
+                        type=float,
+                        help='Point selection sensitivity',
+                        default=0.01)
+
+    parser.add_argument('-p',
+                        '--prefix',
+                        type=str,
+                        help='Output file prefix',
+                        default='labelmade-')
+
+    parser.add_argument('-f',
+                        '--format',
+                        choices=['segy', 'npy', 'rle'],
+                        default='segy',
+                        help='Output format of exported labels: float32 segy, '
+                             'uint8 .npy or run-length encoded .rle')
+
+    parser.add_argument('-d',
+                        '--compare',
+                        type=str,
+                        action='append',
+                        help='Filepath to exported results (for comparing). '
+                             'Given twice, show where the two results disagree')
+
+    parser.add_argument('-c',
+                        '--cmap',
+                        '--colours',
+                        type=str,
+                        default='seismic',
+                        help='Set colour map')
+
+    parser.add_argument('--clip',
+                        type=float,
+                        default=99.5,
+                        help='Clip the colours at this percentile of the amplitudes, '
+                             'and 100 minus it. 100 shows the full range. '
+                             'Change with [ and ] while running')
+
+    parser.add_argument('--fill-tolerance',
+                        type=float,
+                        default=0.1,
+                        help='Grow filled regions (b) through amplitudes this close '
+                             'to the clicked one, as a fraction of the clipped '
+                             'colour range')
+
+    parser.add_argument('-x',
+                        '--horizontal',
+                        '--downsample-horizontal',
+                        type=int,
+                        default=1,
+                        help='Downsample horizontally (keep every n trace)')
+
+    parser.add_argument('-y',
+                        '--vertical',
+                        '--downsample-vertical',
+                        type=int,
+                        default=1,
+                        help='Downsample vertically (keep every n sample)')
+
+    parser.add_argument('--no-lod',
+                        action='store_true',
+                        help='Always show the downsampled section, also when zoomed in')
+
+    parser.add_argument('--no-cache',
+                        action='store_true',
+                        help='Do not use, or store, the cached downsampled section')
+
+    parser.add_argument('--cache-dir',
+                        type=str,
+                        help='Directory of cached downsampled sections. '
+                             'Default: ${} or ~/.cache/labelmaker'.format(preview.ENVIRONMENT))
+
+    parser.add_argument('--preview-cache-size',
+                        type=int,
+                        default=2048,
+                        help='Disk space for cached downsampled sections, in MB')
+
+    parser.add_argument('--cube',
+                        action='store_true',
+                        help='Label the inlines and crosslines of a 3D survey')
+
+    parser.add_argument('--cache-size',
+                        type=int,
+                        default=512,
+                        help='Memory for cached lines in --cube mode, in MB')
+
+    parser.add_argument('-l',
+                        '--load',
+                        type=str,
+                        help='Filepath for saved polygons (.json, .npz or .lmp)')
+
+    parser.add_argument('--raster-labels',
+                        action='store_true',
+                        help='Draw the polygons as one label image, which is faster '
+                             'with many polygons. Hatched classes are shaded instead')
+
+    parser.add_argument('--polys-format',
+                        choices=['json', 'npz'],
+                        default='json',
+                        help='File format for saved polygons')
+
+    parser.add_argument('-a',
+                        '--autosave',
+                        action='store_true',
+                        help='Save every edit to polys-<input>.lmp, and resume from it')
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of processes used to render the export')
+
+    parser.add_argument('--profile',
+                        type=str,
+                        help='Append timings as JSON lines to this file. '
+                             'Default: ${}'.format(timing.ENVIRONMENT))
+
+    parser.add_argument('--profile-action',
+                        type=str,
+                        help='Run this action, e.g. export or key:b, '
+                             'under cProfile. Default: ${}'.format(
+                             timing.ENVIRONMENT_ACTION))
+
+    parser.add_argument('--chunk-size',
+                        type=int,
+                        default=4096,
+                        help='Number of traces rendered and written at a time on export')
+
+    return parser
+
+def main(argv = None):
+    if argv is None: argv = sys.argv
+
+    p = parser(argv[0])
+    args = p.parse_args(args = argv[1:])
+    if args.compare is not None and len(args.compare) > 2:
+        p.error('--compare can be given at most twice')
+    if args.fill_tolerance < 0:
+        p.error('--fill-tolerance must not be negative')
+
+    timing.enable(args.profile, args.profile_action)
+
+    # only the decimated section is read for display - the full-resolution
+    # traces are never held in memory
+    if args.cube:
+        with segyio.open(args.input) as f:
+            with timing.timed('load', input = args.input, cube = True) as info:
+                f.mmap()
+                volume = cube(f, args.horizontal, args.vertical,
+                              budget = args.cache_size * 1024 * 1024)
+                traces = volume.section('iline', 0)
+                dims = (len(volume.traces('iline', 0)), len(f.samples))
+                info.update(timing.array(traces))
+
+            from .labelmaker import plotter
+            runner = plotter(args, traces, dims, cube = volume)
+            runner.run()
+            volume.close()
+        return
+
+    with segyio.open(args.input, ignore_geometry=True) as f:
+        with timing.timed('load', input = args.input, cube = False) as info:
+            cache = None
+            if not args.no_cache:
+                try:
+                    cache = preview.previewcache(args.cache_dir,
+                                                 args.preview_cache_size * 1024 * 1024)
+                except OSError as e:
+                    print('Warning: Could not use the preview cache: {}'.format(e))
+
+            traces, stats = preview.load(f, args.input, args.horizontal,
+                                         args.vertical, cache)
+            dims = shape(f)
+
+            lod = None
+            if not args.no_lod:
+                lod = pyramid(f, traces, args.horizontal, args.vertical)
+            info.update(timing.array(traces))
+
+        from .labelmaker import plotter
+        runner = plotter(args, traces, dims, lod, stats = stats)
+        runner.run()
+
+if __name__ == '__main__':
+    main(sys.argv)
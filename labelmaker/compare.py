@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import json
+import sys
+import time
+
+import numpy as np
+
+from .batch import pairs
+from .formats import reader
+from .section import decimated
+
+def confusion(a, b, classes = None):
+    """
+    The confusion matrix of two label arrays
+    :param a: numpy array of non-negative integral labels, the reference
+    :param b: numpy array of labels, same shape as a
+    :param classes: int, minimum number of classes in the matrix
+    :return: numpy array of shape (n, n), where [i, j] is the number of
+             samples labelled i in a and j in b
+    """
+    a = np.asarray(a, dtype=np.int64).ravel()
+    b = np.asarray(b, dtype=np.int64).ravel()
+    if len(a) and min(a.min(), b.min()) < 0:
+        raise ValueError('Labels must be non-negative')
+
+    n = max(classes or 0, int(max(a.max(), b.max())) + 1 if len(a) else 0)
+    counts = np.bincount(a * n + b, minlength = n * n)
+    return counts.reshape(n, n)
+
+def grow(matrix, n):
+    if len(matrix) >= n: return matrix
+    grown = np.zeros((n, n), dtype=matrix.dtype)
+    grown[:len(matrix), :len(matrix)] = matrix
+    return grown
+
+def iou(matrix):
+    """
+    Intersection over union of every class
+    :param matrix: confusion matrix, see confusion()
+    :return: numpy array of floats, nan for classes in neither file
+    """
+    intersection = np.diag(matrix).astype(np.float64)
+    union = matrix.sum(axis=0) + matrix.sum(axis=1) - intersection
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return intersection / union
+
+def compare(reference, labels, chunksize = 4096):
+    """
+    Compare two label files, chunksize traces at a time, so that neither
+    file is ever fully in memory. The files can be in any of the export
+    formats, see formats.reader
+    :param reference: path to the reference labels
+    :param labels: path to the labels compared to the reference
+    :param chunksize: int, traces read at a time
+    :return: dict with the 'confusion' matrix, per-class 'iou' and the
+             'disagreement' of every trace, the fraction of its samples
+             where the files differ
+    """
+    with reader(reference) as f, reader(labels) as g:
+        if f.shape != g.shape:
+            raise ValueError('{} and {} have different dimensions'.format(
+                             reference, labels))
+
+        traces, samples = f.shape
+        matrix = np.zeros((0, 0), dtype=np.int64)
+        disagreement = np.empty(traces, dtype=np.float64)
+
+        for first in range(0, traces, chunksize):
+            last = min(first + chunksize, traces)
+            a, b = f.read(first, last), g.read(first, last)
+
+            chunk = confusion(a, b, len(matrix))
+            matrix = grow(matrix, len(chunk)) + chunk
+            disagreement[first:last] = np.count_nonzero(a != b, axis=1) / samples
+
+    return {'confusion': matrix,
+            'iou': iou(matrix),
+            'disagreement': disagreement}
+
+def disagreement(reference, labels, horizontal = 1, vertical = 1):
+    """
+    Where two label files disagree, decimated for display
+    :param reference: path to the reference labels
+    :param labels: path to the labels compared to the reference
+    :param horizontal: int, keep every n trace
+    :param vertical: int, keep every n sample
+    :return: boolean numpy array of shape (traces, samples)
+    """
+    a = decimated_labels(reference, horizontal, vertical)
+    b = decimated_labels(labels, horizontal, vertical)
+
+    if a.shape != b.shape:
+        raise ValueError('{} and {} have different dimensions'.format(
+                         reference, labels))
+    return a != b
+
+def decimated_labels(path, horizontal = 1, vertical = 1, chunksize = 4096):
+    """
+    Every horizontal-th trace and vertical-th sample of a label file
+    """
+    with reader(path) as f:
+        if f.format == 'segy': return decimated(f.f, horizontal, vertical)
+
+        # read whole chunks of traces, starting on a kept trace
+        chunksize = max(horizontal, chunksize - chunksize % horizontal)
+        parts = [f.read(first, first + chunksize)[::horizontal, ::vertical]
+                 for first in range(0, f.shape[0], chunksize)]
+
+    if not parts: return np.zeros((0, 0), dtype=np.uint8)
+    return np.concatenate(parts)
+
+def report(result):
+    """
+    The result of compare() as a table of the classes in either file
+    :return: list of lines
+    """
+    matrix, ious = result['confusion'], result['iou']
+    present = [c for c in range(len(matrix)) if not np.isnan(ious[c])]
+
+    lines = ['class        iou   reference      labels']
+    for c in present:
+        lines.append('{:5d} {:10.4f} {:11d} {:11d}'.format(
+                     c, ious[c], matrix[c].sum(), matrix[:, c].sum()))
+
+    labelled = [c for c in present if c != 0]
+    if labelled:
+        lines.append('mean iou (labelled classes): {:.4f}'.format(
+                     np.mean(ious[labelled])))
+    lines.append('traces that disagree: {} of {}'.format(
+                 np.count_nonzero(result['disagreement']),
+                 len(result['disagreement'])))
+    return lines
+
+def compare_pair(job):
+    """
+    Compare one pair of files, and time it. Runs in a worker process
+    :param job: (reference path, labels path, chunksize)
+    :return: (reference, labels, result or None, seconds, error or None)
+    """
+    reference, labels, chunksize = job
+    start = time.perf_counter()
+    try:
+        result = compare(reference, labels, chunksize)
+    except Exception as e:
+        return reference, labels, None, time.perf_counter() - start, str(e)
+
+    return reference, labels, result, time.perf_counter() - start, None
+
+def main(argv = None):
+    if argv is None: argv = sys.argv
+
+    parser = argparse.ArgumentParser(prog = argv[0],
+                                     description='Labelmaker compare - confusion matrix, '
+                                                 'IoU and per-trace disagreement of '
+                                                 'exported label files, without a GUI')
+    parser.add_argument('files',
+                        type=str,
+                        nargs='*',
+                        help='Pairs of reference and compared label files (segy, .npy or .rle)')
+
+    parser.add_argument('--list',
+                        type=str,
+                        help='File with one "reference labels" pair per line')
+
+    parser.add_argument('-o',
+                        '--output',
+                        type=str,
+                        help='Write the results of all pairs to this JSON file')
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of pairs compared in parallel')
+
+    parser.add_argument('--chunk-size',
+                        type=int,
+                        default=4096,
+                        help='Number of traces read at a time')
+
+    args = parser.parse_args(args = argv[1:])
+
+    try:
+        jobs = pairs(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    work = [(reference, labels, args.chunk_size) for reference, labels in jobs]
+
+    results = []
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers = args.jobs) as pool:
+        for reference, labels, result, seconds, error in pool.map(compare_pair, work):
+            if error is not None:
+                failed += 1
+                print('{} {}: failed after {:.2f}s: {}'.format(
+                      reference, labels, seconds, error))
+                continue
+
+            print('{} {}: {:.2f}s'.format(reference, labels, seconds))
+            for line in report(result): print('    ' + line)
+
+            results.append({
+                'reference': reference,
+                'labels': labels,
+                'confusion': result['confusion'].tolist(),
+                'iou': [None if np.isnan(x) else float(x) for x in result['iou']],
+                'disagreement': result['disagreement'].tolist(),
+            })
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f)
+        print("Wrote", args.output)
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,298 @@
+import contextlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import segyio
+
+from . import formats
+from . import render
+from . import timing
+from . import store
+from .cube import line_headers, line_traces
+
+def poly_paths(polys):
+    poly_paths = []
+    for poly,cls in polys.items():
+        poly_paths.append({'vertices': poly.get_path().vertices.tolist(),
+                       'poly_class': cls})
+    return poly_paths
+
+def save_polys(fname, polys, x, y,  prefix = 'polys-'):
+    polys_save={'x': x,
+                'y': y,
+                'poly_paths': poly_paths(polys)}
+
+    write_polys(fname, polys_save, prefix)
+
+def save_lines(fname, lines, x, y, prefix = 'polys-'):
+    """
+    Save the polygons of the lines of a cube
+    :param lines: list of (kind, line number, polys)
+    """
+    polys_save={'x': x,
+                'y': y,
+                'lines': [{'kind': kind,
+                           'line': int(lineno),
+                           'poly_paths': poly_paths(polys)}
+                          for kind, lineno, polys in lines]}
+
+    write_polys(fname, polys_save, prefix)
+
+def save_binary(fname, entries, x, y, prefix = 'polys-'):
+    """
+    Save polygons as a compact .npz snapshot, see store.save_npz
+    :param entries: list of (kind, line number, vertices, class)
+    """
+    output_path = polys_path(fname, prefix, '.npz')
+    store.save_npz(output_path, entries, x, y)
+    print("Wrote", output_path)
+
+def polys_path(fname, prefix, extension):
+    fname = prefix + os.path.splitext(os.path.basename(fname))[0] + extension
+    return os.path.join(os.getcwd(), fname)
+
+def write_polys(fname, polys_save, prefix):
+    output_path = polys_path(fname, prefix, '.json')
+
+    with open(output_path,'w') as f:
+        json.dump(polys_save, f)
+
+    print("Wrote", output_path)
+
+def read_polys(path):
+    """
+    Read polygons saved with save_polys, save_lines, save_binary or
+    autosaved to a journal, without matplotlib
+    :param path: path to the .json, .npz or .lmp file
+    :return: dict with the downsampling 'x' and 'y', and either
+             'polygons', a list of (vertices, class), or 'lines', a list of
+             (kind, line number, polygons)
+    """
+    extension = os.path.splitext(path)[1]
+    if extension == '.npz': return store.load_npz(path)
+    if extension == '.lmp': return store.load_journal(path)
+
+    with open(path, 'r') as f:
+        saved_polys = json.load(f)
+
+    def polygons(poly_paths):
+        return [(np.asarray(p['vertices'], dtype=np.float64), p['poly_class'])
+                for p in poly_paths]
+
+    polys = {'x': saved_polys['x'], 'y': saved_polys['y']}
+    if 'lines' in saved_polys:
+        polys['lines'] = [(line['kind'], line['line'], polygons(line['poly_paths']))
+                          for line in saved_polys['lines']]
+    else:
+        polys['polygons'] = polygons(saved_polys['poly_paths'])
+
+    return polys
+
+@contextlib.contextmanager
+def staged(path):
+    """
+    Write a file under a temporary name next to path, which replaces path
+    when the block completes. If the block fails or is cancelled, the
+    temporary file is removed, so that no partial output is left behind
+    :param path: path to the output file
+    :return: temporary path
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix = '.' + name + '-', suffix = '.tmp',
+                               dir = directory)
+    os.close(fd)
+    # mkstemp files are private, but the output should get the usual mode
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp, 0o666 & ~umask)
+
+    try:
+        yield tmp
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+    os.replace(tmp, path)
+
+def export(fname, polys, xscale, yscale, prefix = 'labelmade-',
+           chunksize = 4096, jobs = 1, directory = None, format = 'segy',
+           progress = None):
+    """
+    :param progress: callable, progress(traces written, traces), which can
+                     stop the export by raising, see background.task
+    """
+    print("writing polygons to file")
+    polygons = render.polygons(polys)
+
+    if directory is None: directory = os.getcwd()
+    output_path = formats.output_path(fname, prefix, format, directory)
+
+    fields = {'input': fname, 'output': output_path, 'format': format,
+              'polygons': len(polygons), 'jobs': jobs}
+    with timing.timed('export', **fields), staged(output_path) as tmp:
+        if format == 'segy':
+            write_segy(fname, tmp, polygons, xscale, yscale, chunksize, jobs,
+                       progress)
+        else:
+            write_labels(fname, tmp, polygons, xscale, yscale,
+                         chunksize, jobs, format, progress)
+
+    print("Wrote", output_path)
+    return output_path
+
+def write_segy(fname, output_path, polygons, xscale, yscale, chunksize, jobs,
+               progress = None):
+    # the input is labelled as traces, and the output is too, so files with
+    # an inconsistent geometry are exported like any other
+    with segyio.open(fname, ignore_geometry=True) as f:
+        meta = segyio.tools.metadata(f)
+        with segyio.create(output_path, meta) as out:
+            out.text[0] = f.text[0]
+
+            for i in range(1, 1 + f.ext_headers):
+                out.text[i] = f.text[i]
+
+            out.bin = f.bin
+
+            # render, and copy headers, one block of traces at a time, so
+            # that neither the labels nor the headers are ever fully in memory
+            shape = (f.tracecount, len(f.samples))
+            parts = render.chunks(polygons, shape, xscale, yscale,
+                                  chunksize, jobs = jobs)
+            for first, labels in parts:
+                last = first + len(labels)
+                print('writing traces {}-{} of {}'.format(first, last, f.tracecount))
+                with timing.timed('write-traces', first = first, **timing.array(labels)):
+                    out.header[first:last] = f.header[first:last]
+                    out.trace[first:last] = labels
+                if progress is not None: progress(last, f.tracecount)
+
+def write_labels(fname, output_path, polygons, xscale, yscale, chunksize,
+                 jobs, format, progress = None):
+    with segyio.open(fname, ignore_geometry=True) as f:
+        shape = (f.tracecount, len(f.samples))
+
+    parts = render.chunks(polygons, shape, xscale, yscale, chunksize,
+                          jobs = jobs, dtype = np.uint8)
+    with formats.writer(output_path, shape, format) as out:
+        for first, labels in parts:
+            last = first + len(labels)
+            print('writing traces {}-{} of {}'.format(first, last, shape[0]))
+            with timing.timed('write-traces', first = first, **timing.array(labels)):
+                out.write(first, labels)
+            if progress is not None: progress(last, shape[0])
+
+def export_lines(fname, lines, xscale, yscale, prefix = 'labelmade-',
+                 chunksize = 4096, jobs = 1, directory = None, format = 'segy',
+                 progress = None):
+    """
+    Export the polygons of the lines of a cube. Lines are rendered one at a
+    time, and written on top of each other in order, so a crossline labelled
+    after an inline wins where they intersect
+    :param lines: list of (trace indices, polys)
+    :param progress: callable, progress(lines written, lines), see export
+    """
+    if format != 'segy':
+        return export_lines_volume(fname, lines, xscale, yscale, prefix,
+                                   chunksize, jobs, directory, format, progress)
+
+    if directory is None: directory = os.getcwd()
+    output_path = formats.output_path(fname, prefix, format, directory)
+
+    with staged(output_path) as tmp:
+        write_segy(fname, tmp, [], xscale, yscale, chunksize, jobs)
+
+        with segyio.open(tmp, 'r+', ignore_geometry=True) as out:
+            samples = len(out.samples)
+            for i, (traces, polys) in enumerate(lines, 1):
+                if progress is not None: progress(i - 1, len(lines))
+                print('writing line ({}/{})'.format(i, len(lines)))
+                labels = mkoutput(polys, (len(traces), samples), xscale, yscale, jobs)
+                for trace, label in zip(traces, labels):
+                    merged = out.trace[int(trace)]
+                    labelled = label != 0
+                    merged[labelled] = label[labelled]
+                    out.trace[int(trace)] = merged
+
+    print("Wrote", output_path)
+    return output_path
+
+def export_lines_volume(fname, lines, xscale, yscale, prefix, chunksize,
+                        jobs, directory, format, progress = None):
+    # lines are merged in a uint8 .npy volume, which for run-length encoded
+    # output is temporary, and encoded a chunk at a time when complete
+    if directory is None: directory = os.getcwd()
+    output_path = formats.output_path(fname, prefix, format, directory)
+
+    with segyio.open(fname, ignore_geometry=True) as f:
+        shape = (f.tracecount, len(f.samples))
+
+    with tempfile.TemporaryDirectory(prefix = 'labelmaker-') as tmp, \
+         staged(output_path) as staging:
+        path = staging if format == 'npy' else os.path.join(tmp, 'labels.npy')
+        volume = np.lib.format.open_memmap(path, mode = 'w+',
+                                           dtype = np.uint8, shape = shape)
+
+        for i, (traces, polys) in enumerate(lines, 1):
+            if progress is not None: progress(i - 1, len(lines))
+            print('writing line ({}/{})'.format(i, len(lines)))
+            labels = mkoutput(polys, (len(traces), shape[1]), xscale, yscale, jobs)
+            for trace, label in zip(traces, formats.as_labels(labels)):
+                labelled = label != 0
+                volume[int(trace), labelled] = label[labelled]
+
+        if format == 'rle':
+            with formats.writer(staging, shape, format) as out:
+                for first in range(0, shape[0], chunksize):
+                    out.write(first, volume[first:first + chunksize])
+
+        volume.flush()
+        del volume
+
+    print("Wrote", output_path)
+    return output_path
+
+def mkoutput(polys, shape, xscale, yscale, jobs = 1):
+    polygons = render.polygons(polys)
+
+    if jobs > 1:
+        return render.render_parallel(polygons, shape, xscale, yscale, jobs)
+
+    output = np.zeros(shape, dtype=np.single)
+
+    npoly = len(polygons)
+    for i, (vertices, cls) in enumerate(polygons, 1):
+        print('rendering polygon ({}/{})'.format(i, npoly))
+        with timing.timed('rasterize', polygon = i, vertices = len(vertices)):
+            render.fill(output, vertices, cls, xscale, yscale)
+
+    return output
+
+def export_saved(fname, path, prefix = 'labelmade-', chunksize = 4096,
+                 jobs = 1, directory = None, format = 'segy'):
+    """
+    Export saved polygons, see read_polys, like ctrl+e would
+    :param fname: path to the segy file the polygons were drawn on
+    :param path: path to the saved polygons
+    :return: path to the exported file
+    """
+    polys = read_polys(path)
+    x, y = polys['x'], polys['y']
+
+    if 'polygons' in polys:
+        return export(fname, polys['polygons'], x, y, prefix, chunksize,
+                      jobs, directory, format)
+
+    with segyio.open(fname, ignore_geometry=True) as f:
+        headers = line_headers(f)
+
+    lines = [(line_traces(headers, kind, lineno), polygons)
+             for kind, lineno, polygons in polys['lines']
+             if polygons]
+    return export_lines(fname, lines, x, y, prefix, chunksize, jobs,
+                        directory, format)
@@ -0,0 +1,181 @@
+import collections
+import queue
+import threading
+
+import numpy as np
+import segyio
+
+class slicecache(object):
+    """
+    Least-recently-used cache of slices, bounded by the total size of the
+    cached arrays. Safe to use from several threads
+    """
+    def __init__(self, budget):
+        """
+        :param budget: int, maximum number of bytes cached
+        """
+        self.budget = budget
+        self.size = 0
+        self.slices = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.slices)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.slices
+
+    def get(self, key):
+        """
+        :param key: hashable
+        :return: the cached slice, or None
+        """
+        with self.lock:
+            data = self.slices.get(key)
+            if data is not None: self.slices.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        """
+        Cache data, and evict the least recently used slices until the cache
+        is within budget. The newest slice is always kept
+        :param key: hashable
+        :param data: numpy array
+        """
+        with self.lock:
+            if key in self.slices:
+                self.size -= self.slices.pop(key).nbytes
+
+            self.slices[key] = data
+            self.size += data.nbytes
+
+            while self.size > self.budget and len(self.slices) > 1:
+                _, old = self.slices.popitem(last = False)
+                self.size -= old.nbytes
+
+class cube(object):
+    """
+    Inline and crossline sections of a 3D survey, read with segyio's
+    iline/xline accessors and downsampled for display.
+
+    Recently viewed lines are kept in a slicecache, and a background thread
+    reads the neighbours of the line last asked for, so stepping through the
+    cube rarely waits for the disk
+    """
+    kinds = ('iline', 'xline')
+
+    def __init__(self, f, horizontal = 1, vertical = 1,
+                 budget = 512 * 1024 * 1024, prefetch = 2):
+        """
+        :param f: open segyio file handle, with geometry
+        :param horizontal: int, keep every n trace of a line
+        :param vertical: int, keep every n sample
+        :param budget: int, bytes of lines to cache
+        :param prefetch: int, lines to prefetch in each direction
+        """
+        if f.unstructured:
+            raise ValueError('File has no inline/crossline geometry')
+
+        if len(f.offsets) != 1:
+            raise ValueError('Only files with a single offset are supported')
+
+        self.f = f
+        self.horizontal = horizontal
+        self.vertical = vertical
+        self.lines = {'iline': list(f.ilines), 'xline': list(f.xlines)}
+        self.depth = prefetch
+
+        self.cache = slicecache(budget)
+        self.headers = None
+
+        # segyio file handles are not thread safe
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target = self.prefetcher, daemon = True)
+        self.worker.start()
+
+    def lineno(self, kind, index):
+        return self.lines[kind][index]
+
+    def load(self, kind, index):
+        accessor = self.f.iline if kind == 'iline' else self.f.xline
+        with self.lock:
+            line = accessor[self.lineno(kind, index)]
+
+        return np.ascontiguousarray(line[::self.horizontal, ::self.vertical])
+
+    def section(self, kind, index):
+        """
+        The downsampled section of a line, and start prefetching its
+        neighbours
+        :param kind: 'iline' or 'xline'
+        :param index: int, index of the line, not the line number
+        :return: numpy array of shape (traces, samples)
+        """
+        key = (kind, index)
+        data = self.cache.get(key)
+        if data is None:
+            data = self.load(kind, index)
+            self.cache.put(key, data)
+
+        self.prefetch(kind, index)
+        return data
+
+    def prefetch(self, kind, index):
+        # lines queued for an earlier position are no longer interesting
+        try:
+            while True: self.requests.get_nowait()
+        except queue.Empty:
+            pass
+
+        for distance in range(1, self.depth + 1):
+            for neighbour in (index + distance, index - distance):
+                if 0 <= neighbour < len(self.lines[kind]):
+                    self.requests.put((kind, neighbour))
+
+    def prefetcher(self):
+        while True:
+            key = self.requests.get()
+            if key is None: return
+            if key in self.cache: continue
+            self.cache.put(key, self.load(*key))
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
+
+    def traces(self, kind, index):
+        """
+        The indices in the file of the traces of a line, in section order
+        :param kind: 'iline' or 'xline'
+        :param index: int, index of the line
+        :return: numpy array of ints
+        """
+        if self.headers is None:
+            with self.lock:
+                self.headers = line_headers(self.f)
+
+        return line_traces(self.headers, kind, self.lineno(kind, index))
+
+def line_headers(f):
+    """
+    The inline and crossline numbers of every trace in a file
+    :param f: open segyio file handle
+    :return: {'iline': numpy array, 'xline': numpy array}
+    """
+    return {
+        'iline': f.attributes(segyio.su.iline)[:],
+        'xline': f.attributes(segyio.su.xline)[:],
+    }
+
+def line_traces(headers, kind, lineno):
+    """
+    The indices of the traces of a line, in file order, which is also the
+    order of segyio's iline/xline accessors
+    :param headers: see line_headers()
+    :param kind: 'iline' or 'xline'
+    :param lineno: int, line number
+    :return: numpy array of ints
+    """
+    return np.flatnonzero(headers[kind] == lineno)
@@ -0,0 +1,202 @@
+import os
+
+import numpy as np
+import segyio
+
+# Label volumes as (traces, samples), in more compact formats than float32
+# segy:
+#  * .npy, a uint8 numpy array, which can be memory mapped
+#  * .rle, every trace run-length encoded, as runs of (value, length). The
+#    runs are followed by an index of the first run of every trace, so any
+#    range of traces can be decoded without reading the rest of the file
+#
+# Labels are class values, which are never larger than 255
+
+FORMATS = {'segy': '.sgy', 'npy': '.npy', 'rle': '.rle'}
+
+MAGIC = b'LMRLE001'
+HEADER = np.dtype([('magic', 'S8'),
+                   ('traces', '<i8'),
+                   ('samples', '<i8'),
+                   ('index', '<i8')])
+RUN = np.dtype([('value', 'u1'), ('length', '<u4')])
+
+def output_path(fname, prefix, format, directory):
+    """
+    The path of the exported labels of fname
+    :param format: 'segy', 'npy' or 'rle'
+    """
+    base = os.path.basename(fname)
+    if format != 'segy':
+        base = os.path.splitext(base)[0] + FORMATS[format]
+    return os.path.join(directory, prefix + base)
+
+def as_labels(chunk):
+    """
+    Convert a chunk of labels to uint8
+    :param chunk: numpy array of class values
+    :return: numpy array of uint8
+    """
+    if chunk.dtype == np.uint8: return chunk
+    if chunk.size and (chunk.min() < 0 or chunk.max() > 255):
+        raise ValueError('Labels must be in [0, 255] to be stored as uint8')
+    return chunk.astype(np.uint8)
+
+def encode(chunk):
+    """
+    Run-length encode every trace of a chunk
+    :param chunk: numpy array of shape (traces, samples)
+    :return: (runs, counts), where runs is a numpy array of RUN, and counts
+             is the number of runs of every trace
+    """
+    traces, samples = chunk.shape
+    flat = as_labels(chunk).ravel()
+
+    # a run starts where the value changes, and at the start of every trace
+    starts = np.ones(flat.size, dtype=bool)
+    starts[1:] = flat[1:] != flat[:-1]
+    starts[::samples] = True
+    starts = np.flatnonzero(starts)
+
+    runs = np.empty(len(starts), dtype=RUN)
+    runs['value'] = flat[starts]
+    runs['length'] = np.diff(np.append(starts, flat.size))
+    counts = np.bincount(starts // samples, minlength = traces)
+    return runs, counts
+
+def decode(runs, samples):
+    """
+    Decode runs, see encode(), to traces
+    :param runs: numpy array of RUN, of whole traces
+    :param samples: int, samples per trace
+    :return: numpy array of shape (traces, samples) of uint8
+    """
+    values = np.repeat(runs['value'], runs['length'].astype(np.int64))
+    return values.reshape(-1, samples)
+
+class writer(object):
+    """
+    Write labels to a .npy or .rle file, a chunk of traces at a time, in
+    order
+    """
+    def __init__(self, path, shape, format):
+        """
+        :param path: output path
+        :param shape: (int, int), the (traces, samples) of the labels
+        :param format: 'npy' or 'rle'
+        """
+        self.path = path
+        self.shape = shape
+        self.format = format
+
+        if format == 'npy':
+            self.out = np.lib.format.open_memmap(path, mode = 'w+',
+                                                 dtype = np.uint8, shape = shape)
+        else:
+            self.out = open(path, 'wb')
+            self.out.write(np.zeros(1, dtype=HEADER).tobytes())
+            self.counts = []
+
+    def write(self, first, chunk):
+        """
+        :param first: int, index of the first trace of chunk
+        :param chunk: numpy array of shape (traces, samples)
+        """
+        if self.format == 'npy':
+            self.out[first:first + len(chunk)] = as_labels(chunk)
+            return
+
+        runs, counts = encode(chunk)
+        self.out.write(runs.tobytes())
+        self.counts.append(counts)
+
+    def close(self):
+        if self.format == 'npy':
+            self.out.flush()
+            del self.out
+            return
+
+        counts = np.concatenate(self.counts) if self.counts else np.zeros(0, np.int64)
+        index = np.zeros(len(counts) + 1, dtype='<i8')
+        np.cumsum(counts, out = index[1:])
+
+        position = self.out.tell()
+        self.out.write(index.tobytes())
+
+        traces, samples = self.shape
+        self.out.seek(0)
+        self.out.write(np.array([(MAGIC, traces, samples, position)],
+                                dtype=HEADER).tobytes())
+        self.out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+class reader(object):
+    """
+    Read ranges of traces from a label file - .npy, .rle or segy - without
+    reading the rest of the file
+    """
+    def __init__(self, path):
+        """
+        :param path: path to the labels
+        """
+        extension = os.path.splitext(path)[1]
+        self.f = None
+
+        if extension == '.npy':
+            self.format = 'npy'
+            self.data = np.load(path, mmap_mode = 'r')
+            self.shape = self.data.shape
+
+        elif extension == '.rle':
+            self.format = 'rle'
+            buf = np.memmap(path, dtype=np.uint8, mode='r')
+            header = buf[:HEADER.itemsize].view(HEADER)[0]
+            if header['magic'] != MAGIC:
+                raise ValueError('{} is not a run-length encoded label file'.format(path))
+
+            traces, samples = int(header['traces']), int(header['samples'])
+            position = int(header['index'])
+            self.shape = (traces, samples)
+            self.runs = buf[HEADER.itemsize:position].view(RUN)
+            self.index = buf[position:].view('<i8')
+
+        else:
+            self.format = 'segy'
+            self.f = segyio.open(path, ignore_geometry=True)
+            self.f.mmap()
+            self.shape = (self.f.tracecount, len(self.f.samples))
+
+    def read(self, first, last):
+        """
+        :param first: int, first trace
+        :param last: int, last trace, exclusive
+        :return: numpy array of shape (last - first, samples)
+        """
+        traces, samples = self.shape
+        first, last = max(0, first), min(last, traces)
+        if first >= last:
+            dtype = np.single if self.format == 'segy' else np.uint8
+            return np.zeros((0, samples), dtype=dtype)
+
+        if self.format == 'npy':
+            return np.asarray(self.data[first:last])
+
+        if self.format == 'rle':
+            runs = self.runs[self.index[first]:self.index[last]]
+            return decode(runs, samples)
+
+        return self.f.trace.raw[first:last].reshape(last - first, samples)
+
+    def close(self):
+        if self.f is not None: self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
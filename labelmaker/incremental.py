@@ -0,0 +1,365 @@
+import os
+import shutil
+import threading
+
+import numpy as np
+import segyio
+
+from . import formats
+from . import render
+from .core import export, staged
+
+class polygonmasks(object):
+    """
+    The dirty regions and cached masks of polygons, for rendering only what
+    changed, see exporter and labellayer.
+
+    Polygons are reported as they are added, removed or change class. The
+    bounding boxes of those changes are the dirty regions. Every polygon's
+    mask is rasterized once, on the display grid, and cached bit-packed, so
+    a dirty region is rendered by pasting cached masks in order
+    """
+    def __init__(self, xscale = 1, yscale = 1, shape = None):
+        """
+        :param xscale: int, horizontal downsampling of the display
+        :param yscale: int, vertical downsampling of the display
+        :param shape: (traces, samples) of the output
+        """
+        self.xscale = xscale
+        self.yscale = yscale
+        self.shape = shape
+
+        # polygon -> (corner, mask shape, packed mask), or None until the
+        # mask is needed
+        self.masks = {}
+        # display bounding boxes (w, n, e, s) of changes since the last
+        # render. Exports can run in a background thread while polygons are
+        # edited
+        self.dirty = []
+        self.lock = threading.Lock()
+
+    def changed(self, key, vertices):
+        """
+        Mark the area of a polygon as dirty, e.g. when it is added or
+        changes class
+        :param key: hashable, the polygon
+        :param vertices: numpy array of shape (n, 2)
+        """
+        box = render.bbox(np.asarray(vertices))
+        with self.lock:
+            self.dirty.append(box)
+            # the mask is rasterized when it is first needed
+            self.masks.setdefault(key, None)
+
+    def removed(self, key, vertices):
+        """
+        Mark the area of a removed polygon as dirty, and forget its mask
+        :param key: hashable, the polygon
+        :param vertices: numpy array of shape (n, 2)
+        """
+        box = render.bbox(np.asarray(vertices))
+        with self.lock:
+            self.dirty.append(box)
+            self.masks.pop(key, None)
+
+    def mask(self, key, vertices):
+        """
+        The polygon's cached mask, see render.rasterize. Masks are only
+        cached for polygons that are reported changed and not removed, as
+        exports render in the background from a snapshot of the polygons,
+        which may since have been removed
+        :return: (corner, boolean numpy array)
+        """
+        with self.lock:
+            cached = self.masks.get(key)
+
+        if cached is None:
+            corner, inside = render.rasterize(vertices, self.shape,
+                                              self.xscale, self.yscale)
+            with self.lock:
+                if key in self.masks:
+                    self.masks[key] = (corner, inside.shape,
+                                       np.packbits(inside, axis = None))
+            return corner, inside
+
+        corner, shape, packed = cached
+        count = shape[0] * shape[1]
+        inside = np.unpackbits(packed, count = count).reshape(shape).view(bool)
+        return corner, inside
+
+    def render(self, polygons, box, dtype = np.single):
+        """
+        Render a dirty region from scratch, from every polygon that overlaps
+        it, in order
+        :param polygons: list of (polygon, bbox, class)
+        :param box: (w, n, e, s), the dirty region
+        :return: (first trace, first sample, numpy array of shape (traces,
+                 samples)), or None if the region is outside the output
+        """
+        traces, samples = self.shape
+        h, v = self.xscale, self.yscale
+        w, n, e, s = box
+        ta, tb = max(0, w * h), min(traces, e * h)
+        sa, sb = max(0, n * v), min(samples, s * v)
+        if ta >= tb or sa >= sb: return None
+
+        window = np.zeros((tb - ta, sb - sa), dtype = dtype)
+        for poly, pbox, cls in polygons:
+            if not overlaps(pbox, box): continue
+            corner, inside = self.mask(poly, poly.get_xy())
+            render.paste(window, corner, inside, cls, h, v, origin = (ta, sa))
+        return ta, sa, window
+
+class exporter(polygonmasks):
+    """
+    Re-export that only re-renders what changed since the last export.
+
+    On re-export only the dirty regions are rendered again, see
+    polygonmasks, and patched into a copy of the previously exported file,
+    which then replaces it.
+
+    The first export, and any export after the output file was changed by
+    someone else, is a full export. Segy and .npy output is patched,
+    run-length encoded output is always exported in full
+    """
+    def __init__(self, fname, xscale, yscale, prefix = 'labelmade-',
+                 chunksize = 4096, jobs = 1, format = 'segy'):
+        """
+        :param fname: path to the input segy file
+        :param xscale: int, horizontal downsampling of the display
+        :param yscale: int, vertical downsampling of the display
+        :param prefix: output file prefix
+        :param chunksize: int, traces per chunk of a full export
+        :param jobs: int, processes used for a full export
+        :param format: output format, see formats.FORMATS
+        """
+        super(exporter, self).__init__(xscale, yscale)
+        self.fname = fname
+        self.prefix = prefix
+        self.chunksize = chunksize
+        self.jobs = jobs
+        self.format = format
+
+        self.output = None
+        self.stamp = None
+        # the regions taken for exports, see take(), in order, until
+        # written. Exports can be stopped before they even start
+        self.taken = []
+
+    def current(self):
+        # the output can only be patched if it is the file written last
+        return self.output is not None and stamp(self.output) == self.stamp
+
+    def take(self):
+        """
+        Take the regions changed since the last export. Take them together
+        with the snapshot of the polygons that is exported, so that changes
+        made after the snapshot are left for the next export
+        :return: list of dirty regions, for export()
+        """
+        with self.lock:
+            dirty, self.dirty = self.dirty, []
+            self.taken.append(dirty)
+        return dirty
+
+    def export(self, polys, dirty = None, directory = None, progress = None):
+        """
+        Export the polygons, patching the previous export if possible
+        :param polys: ordered mapping of polygon to class. Neither the
+                      mapping nor the polygons may change during the export
+        :param dirty: the regions changed since the last export, from take()
+                      when the polygons were copied. Taken now by default
+        :param directory: output directory, the working directory by default
+        :param progress: callable, progress(done, total), which can stop the
+                         export by raising, see background.task. A stopped
+                         export leaves the previous output as it was, and
+                         its regions are exported next time
+        :return: path to the exported file
+        """
+        if directory is None: directory = os.getcwd()
+        output = formats.output_path(self.fname, self.prefix, self.format, directory)
+
+        if dirty is None: dirty = self.take()
+        # the regions taken for stopped or superseded exports were changed
+        # before this snapshot was taken, so it renders them too
+        with self.lock:
+            n = next(i for i, taken in enumerate(self.taken) if taken is dirty) + 1
+            dirty = [box for taken in self.taken[:n] for box in taken]
+
+        full = self.format == 'rle' or output != self.output or not self.current()
+        if full:
+            self.output = export(self.fname, polys, self.xscale, self.yscale,
+                                 self.prefix, self.chunksize, self.jobs,
+                                 directory, self.format, progress)
+            with segyio.open(self.fname, ignore_geometry = True) as f:
+                self.shape = (f.tracecount, len(f.samples))
+            self.stamp = stamp(self.output)
+        elif dirty:
+            self.patch(polys, merged(dirty), progress)
+            self.stamp = stamp(self.output)
+        else:
+            print("Nothing changed since the last export")
+
+        with self.lock:
+            del self.taken[:n]
+        return self.output
+
+    def patch(self, polys, regions, progress = None):
+        """
+        Patch regions of the previous export. The regions are written to a
+        copy of the output, which replaces it when all are written, so a
+        stopped patch leaves the previous export as it was
+        :param polys: ordered mapping of polygon to class
+        :param regions: list of non-overlapping (w, n, e, s), see merged()
+        """
+        polygons = [(poly, render.bbox(poly.get_xy()), cls)
+                    for poly, cls in polys.items()]
+
+        count = len(regions)
+        with staged(self.output) as tmp:
+            shutil.copyfile(self.output, tmp)
+            with target(tmp, self.format) as out:
+                for i, region in enumerate(regions, 1):
+                    if progress is not None: progress(i - 1, count)
+
+                    rendered = self.render(polygons, region)
+                    if rendered is None: continue
+
+                    ta, sa, window = rendered
+                    print('patching region ({}/{}), traces {}-{}'.format(
+                          i, count, ta, ta + len(window)))
+                    out.write(ta, sa, window)
+
+        print("Wrote", self.output)
+
+class labellayer(polygonmasks):
+    """
+    The labels of the polygons on the display grid, as an RGBA image, so
+    that any number of polygons is drawn as one image. Only the dirty
+    regions are rendered again, see polygonmasks
+    """
+    def __init__(self, shape, colours):
+        """
+        :param shape: (traces, samples) of the display grid
+        :param colours: numpy array of uint8, of shape (256, 4), the RGBA
+                        colour of every class value
+        """
+        super(labellayer, self).__init__(1, 1, shape)
+        self.colours = colours
+        # the bounding box of every polygon, which is needed for every
+        # update, and polygons never move
+        self.boxes = {}
+        self.labels = np.zeros(shape, dtype = np.uint8)
+        # in the (samples, traces) layout of imshow
+        self.rgba = np.zeros((shape[1], shape[0], 4), dtype = np.uint8)
+
+    def changed(self, key, vertices):
+        self.boxes[key] = render.bbox(np.asarray(vertices))
+        super(labellayer, self).changed(key, vertices)
+
+    def removed(self, key, vertices):
+        super(labellayer, self).removed(key, vertices)
+        self.boxes.pop(key, None)
+
+    def update(self, polys):
+        """
+        Render the dirty regions
+        :param polys: ordered mapping of polygon to class
+        :return: list of the rendered regions, as (w, n, e, s)
+        """
+        with self.lock:
+            dirty, self.dirty = self.dirty, []
+        if not dirty: return []
+
+        polygons = [(poly, self.box(poly), cls) for poly, cls in polys.items()]
+
+        regions = []
+        for box in merged(dirty):
+            rendered = self.render(polygons, box, dtype = np.uint8)
+            if rendered is None: continue
+
+            ta, sa, window = rendered
+            tb, sb = ta + window.shape[0], sa + window.shape[1]
+            self.labels[ta:tb, sa:sb] = window
+            self.rgba[sa:sb, ta:tb] = self.colours[window.T]
+            regions.append((ta, sa, tb, sb))
+        return regions
+
+    def box(self, poly):
+        if poly not in self.boxes:
+            self.boxes[poly] = render.bbox(poly.get_xy())
+        return self.boxes[poly]
+
+class target(object):
+    """
+    An exported file, opened for patching windows of labels in place
+    """
+    def __init__(self, path, format):
+        self.format = format
+        if format == 'npy':
+            self.out = np.load(path, mmap_mode = 'r+')
+        else:
+            self.out = segyio.open(path, 'r+', ignore_geometry = True)
+
+    def write(self, first, sample, window):
+        """
+        :param first: int, first trace of the window
+        :param sample: int, first sample of the window
+        :param window: numpy array of shape (traces, samples)
+        """
+        traces, samples = window.shape
+        if self.format == 'npy':
+            self.out[first:first + traces, sample:sample + samples] = window
+            return
+
+        for t, labels in zip(range(first, first + traces), window):
+            trace = self.out.trace[t]
+            trace[sample:sample + samples] = labels
+            self.out.trace[t] = trace
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        if self.format == 'npy':
+            self.out.flush()
+            del self.out
+        else:
+            self.out.close()
+
+def stamp(path):
+    # the modification time and size of a file, or None if it is missing
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def overlaps(a, b):
+    aw, an, ae, as_ = a
+    bw, bn, be, bs = b
+    return aw < be and bw < ae and an < bs and bn < as_
+
+def merged(boxes):
+    """
+    Merge overlapping boxes, so that no area is rendered twice
+    :param boxes: list of (w, n, e, s)
+    :return: list of (w, n, e, s), none of which overlap
+    """
+    boxes = list(boxes)
+    done = False
+    while not done:
+        done = True
+        result = []
+        for box in boxes:
+            for i, other in enumerate(result):
+                if not overlaps(box, other): continue
+                result[i] = (min(box[0], other[0]), min(box[1], other[1]),
+                             max(box[2], other[2]), max(box[3], other[3]))
+                done = False
+                break
+            else:
+                result.append(box)
+        boxes = result
+
+    return boxes
@@ -1,19 +1,36 @@
 #!/usr/bin/env python3
 
-import argparse
 import numpy as np
-import math
 import segyio
 import sys
-import os
-import json
 
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 from matplotlib import patches
 from matplotlib.lines import Line2D
+from matplotlib.transforms import Bbox, TransformedBbox
 
 from .utility import within_tolerance, axis_lengths, closest
+from .core import save_polys, save_lines, save_binary, polys_path, read_polys
+from .core import export, export_lines, mkoutput
+from . import store
+from .section import decimated
+from .spatial import gridindex, cellsize
+from .incremental import exporter, labellayer
+from . import compare
+from . import timing
+from . import preview
+from . import rgba
+from . import background
+from . import region
+from .cli import parser, main
+
+# the clip percentiles stepped through with [ and ]
+CLIPS = [90, 95, 98, 99, 99.5, 99.8, 99.9, 100]
+
+# hatches cannot be drawn in the label layer, see --raster-labels, and
+# hatched classes are blended towards black or white instead
+SHADES = {'xx': (0.0, 0.4), '++': (1.0, 0.4)}
 
 def classes(cmap):
     definitions = [
@@ -51,76 +68,9 @@ def classes(cmap):
 
     return definitions
 
-def save_polys(fname, polys, x, y,  prefix = 'polys-'):
-    poly_paths = []
-    for poly,cls in polys.items():
-        poly_paths.append({'vertices': poly.get_path().vertices.tolist(),
-                       'poly_class': cls})
-
-    polys_save={'x': x,
-                'y': y,
-                'poly_paths': poly_paths}
-
-    fname = prefix + os.path.splitext(fname)[0] + '.json'
-    output_path = os.path.join(os.getcwd(), fname)
-
-    with open(output_path,'w') as f:
-        json.dump(polys_save, f)
-
-    print("Wrote", output_path)
-
-def export(fname, output, prefix = 'labelmade-'):
-    print("writing polygons to file")
-    with segyio.open(fname) as f:
-        meta = segyio.tools.metadata(f)
-        output_path = os.path.join(os.getcwd(), prefix + os.path.basename(fname))
-        with segyio.create(output_path, meta) as out:
-            out.text[0] = f.text[0]
-
-            for i in range(1, 1 + f.ext_headers):
-                out.text[i] = f.text[i]
-
-            out.bin = f.bin
-            out.header = f.header
-            out.trace = output
-    print("Wrote", output_path)
-
-def mkoutput(polys, shape, xscale, yscale):
-    traces, samples = shape
-    output = np.zeros((traces, samples), dtype=np.single).T
-
-    npoly = len(polys)
-    for i, (poly, cls) in enumerate(polys.items(), 1):
-        print('rendering polygon ({}/{})'.format(i, npoly))
-        xys = poly.get_xy()
-
-        # find the rectangle that covers all of the polygon
-        w, n = xys.min(axis=0)
-        e, s = xys.max(axis=0)
-
-        w, n = int(math.floor(w)), int(math.floor(n))
-        e, s = int(math.ceil(e + 1)), int(math.ceil(s + 1))
-
-        w *= xscale
-        e *= xscale
-        s *= yscale
-        n *= yscale
-
-        xs = list(range(w, e))
-        ys = list(range(n, s))
-        xs1 = np.floor_divide(np.tile(xs, len(ys)), xscale)
-        ys1 = np.floor_divide(np.repeat(ys, len(xs)), yscale)
-        points = np.transpose([xs1, ys1])
-        contains = poly.get_path().contains_points
-        mask = contains(points)
-
-        subout = output[n:s, w:e]
-        np.place(subout, mask, [cls])
-
-    return output.T
-
 class plotter(object):
-    def __init__(self, args, traces):
+    def __init__(self, args, traces, shape, pyramid = None, cube = None,
+                 stats = None):
         self.args = args
         self.x = []
         self.y = []
@@ -128,8 +78,20 @@ class plotter(object):
         self.canvas = None
         self.ax = None
         self.line = None
+        self.background = None
         self.threshold = args.threshold
         self.traces = traces
+        self.shape = shape
+        self.pyramid = pyramid
+        self.cube = cube
+        self.image = None
+        self.level = None
+        # the colormapped section, and the window it shows
+        self.raster = None
+        self.window = None
+        # display statistics of the section, see preview.statistics
+        self.stats = stats
+        self.clip = args.clip
         self.overlaypath = args.compare
         self.saved_polys_path = args.load
 
@@ -137,6 +99,32 @@ class plotter(object):
         self.vertical = args.vertical
 
         self.polys = {}
+        self.index = gridindex(cellsize(traces.shape))
+        # in a cube, every line has its own polygons
+        self.current_line = ('iline', 0)
+        self.linepolys = {self.current_line: self.polys}
+        # autosave journal, and the journal id of every polygon
+        self.journal = None
+        self.ids = {}
+        # re-exports only render what changed since the last export. Cubes
+        # are always exported in full
+        self.exporter = None
+        if cube is None:
+            self.exporter = exporter(args.input, args.horizontal, args.vertical,
+                                     prefix = args.prefix,
+                                     chunksize = args.chunk_size,
+                                     jobs = args.jobs,
+                                     format = args.format)
+        # with --raster-labels, the polygons are composited into the section
+        self.layer = None
+        # the window the labels were last composited over
+        self.labelwindow = None
+        # the running export, and its progress below the axes
+        self.task = None
+        self.timer = None
+        self.status = None
+        self.statusbox = None
+        self.statusbackground = None
         self.last_removed = None
         self.pick = None
         self.current_poly_class = 1
@@ -148,41 +136,269 @@ class plotter(object):
                      'd': self.rmpoly,
                      'u': self.undo,
                      'ctrl+e': self.export,
+                     'ctrl+x': self.cancel_export,
+                     'b': self.fill,
                      'z': self.undo_dot,
                      'i': self.print_class_info,
                      'ctrl+i': self.color_info,
-                     'e': self.edit_poly
+                     'e': self.edit_poly,
+                     '[': self.clip_more,
+                     ']': self.clip_less,
                      }
 
+        if self.cube is not None:
+            self.keys.update({'pagedown': self.next_line,
+                              'pageup': self.previous_line,
+                              't': self.toggle_direction})
+
     def run(self):
+        with timing.timed('run', **timing.array(self.traces)):
+            self.setup()
+
+        plt.show()
+
+    def setup(self):
         self.classes = classes(self.cmap)
 
         self.hotkeys = {d['hotkey']: d for d in self.classes}
         self.valclass = {d['value']: d for d in self.classes}
 
         self.fig, self.ax = plt.subplots()
-        self.ax.imshow(self.traces[::self.horizontal, ::self.vertical].T,
-                       aspect='auto',
-                       cmap=plt.get_cmap(self.args.cmap))
         plt.subplots_adjust(bottom=0.2)
-
+        # full redraws of the figure, e.g. on zoom and pan
+        self.fig.draw = timing.wrapped('draw', self.fig.draw)
+        with timing.timed('imshow', **timing.array(self.traces)):
+            # the limits are clipped percentiles of a sample of the
+            # section, which spares imshow a pass over the whole section,
+            # and keeps a few spikes from washing out the colours
+            if self.stats is None: self.stats = preview.statistics(self.traces)
+            vmin, vmax = preview.limits(self.stats, self.clip)
+
+            traces, samples = self.traces.shape
+            xlim, ylim = (-0.5, traces - 0.5), (samples - 0.5, -0.5)
+            self.window = ('section', self.traces, xlim + ylim)
+            if self.pyramid is not None:
+                # the first frame is at screen resolution too, but only from
+                # the section that is already read
+                bbox = self.ax.bbox
+                self.window = self.pyramid.window(xlim, ylim,
+                                                  bbox.width, bbox.height,
+                                                  finer = False)
+                self.level = self.window[0]
+
+            # imshow gets the window colormapped once, which it does not
+            # normalise and colormap again on every draw. The clim is kept in
+            # sync for the cursor readout
+            cmap = plt.get_cmap(self.args.cmap)
+            self.raster = rgba.rgbacache(cmap, vmin, vmax)
+            self.image = self.ax.imshow(self.raster.get(*self.window),
+                                        aspect='auto',
+                                        extent=self.window[2],
+                                        cmap=cmap,
+                                        vmin=vmin,
+                                        vmax=vmax)
+            self.image.get_cursor_data = self.cursor_data
+            if self.args.raster_labels: self.start_layer()
+            self.ax.set_xlim(*xlim)
+            self.ax.set_ylim(*ylim)
+        if self.cube is not None: self.ax.set_title(self.line_title())
+
+        if self.pyramid is not None:
+            # the image extent changes with the level of detail, and must
+            # not move the view
+            self.ax.set_autoscale_on(False)
+            self.ax.callbacks.connect('xlim_changed', self.onlimits)
+            self.ax.callbacks.connect('ylim_changed', self.onlimits)
+
+        # the line is animated, i.e. left out of full draws, and blitted on
+        # top of the cached background instead
         self.line = Line2D(self.x, self.y, ls='--', c='#666666',
-                      marker='x', mew=2, mec='#204a87', picker=5)
+                      marker='x', mew=2, mec='#204a87', picker=5,
+                      animated=True)
         self.ax.add_line(self.line)
 
         self.canvas = self.line.figure.canvas
+        self.canvas.mpl_connect('draw_event', self.ondraw)
+
+        # export progress is polled, and blitted in the bottom margin
+        self.status = self.fig.text(0.01, 0.01, '', fontsize='small',
+                                    animated=True)
+        self.statusbox = TransformedBbox(Bbox([[0, 0], [1, 0.06]]),
+                                         self.fig.transFigure)
+        self.timer = self.canvas.new_timer(interval=250)
+        self.timer.add_callback(self.onprogress)
+        if self.pyramid is not None:
+            self.canvas.mpl_connect('resize_event', self.onlimits)
         if self.overlaypath is None:
             self.canvas.mpl_connect('button_release_event', self.onrelease)
             self.canvas.mpl_connect('key_press_event', self.complete)
             self.canvas.mpl_connect('pick_event', self.onpick)
 
         if self.overlaypath is not None:
-            self.add_overlay(self.overlaypath)
+            self.add_overlay(*self.overlaypath)
+
+        if self.args.autosave:
+            self.start_autosave()
 
         if self.saved_polys_path is not None:
-            self.load_polys(self.saved_polys_path)
+            # the loaded polygons are journaled, and are already among the
+            # resumed polygons of an existing journal
+            if self.journal is not None and self.journal.resumed:
+                print('Warning: Not loading {}, the polygons in {} are resumed '
+                      'instead'.format(self.saved_polys_path, self.journal.path))
+            else:
+                self.load_polys(self.saved_polys_path)
+
+    def onlimits(self, *_):
+        # swap in the level of detail that fits the visible window on zoom,
+        # pan and resize. The extent maps every level onto the same display
+        # coordinates, so polygons are unaffected
+        bbox = self.ax.bbox
+        lod = self.pyramid.window(self.ax.get_xlim(), self.ax.get_ylim(),
+                                  bbox.width, bbox.height)
+        if lod is None: return
+
+        key, data, extent = lod
+        if key == self.level: return
+
+        self.level = key
+        self.show(key, data, extent)
+
+    def show(self, key, data, extent):
+        # the window is colormapped, unless it is cached
+        self.window = (key, data, extent)
+        self.image.set_data(self.raster.get(key, data, extent))
+        self.image.set_extent(extent)
+
+    def draw_labels(self, renderer):
+        # the changed labels are rendered, resampled to the shown window and
+        # composited over it, so that the polygons are drawn as part of the
+        # section image. That is done when it is drawn, so that any number of
+        # changes between draws, e.g. loading polygons, costs one update
+        if self.layer.update(self.polys): self.labelwindow = None
+        if self.labelwindow is not self.window:
+            _, data, (left, right, bottom, top) = self.window
+            # resampled in the (samples, traces) layout, i.e. with the axes
+            # of the extent swapped
+            labels = rgba.resample(self.layer.rgba, (top, bottom, right, left),
+                                   data.shape[::-1])
+            image = self.raster.get(*self.window).copy()
+            rgba.composite(image, labels)
+            self.image.set_data(image)
+            self.labelwindow = self.window
+        type(self.image).draw(self.image, renderer)
+
+    def cursor_data(self, event):
+        # the image is RGBA, but the readout should be the amplitude
+        _, data, (left, right, bottom, top) = self.window
+        if event.xdata is None or event.ydata is None: return None
+
+        traces, samples = data.shape
+        i = int(np.floor((event.xdata - left) / (right - left) * traces))
+        j = int(np.floor((event.ydata - top) / (bottom - top) * samples))
+        if not (0 <= i < traces and 0 <= j < samples): return None
+        return data[i, j]
+
+    def set_clip(self, clip):
+        self.clip = clip
+        vmin, vmax = preview.limits(self.stats, clip)
+        self.raster.set_limits(vmin, vmax)
+        self.image.set_clim(vmin, vmax)
+        self.show(*self.window)
+        print('Clip at {}%: [{:g}, {:g}]'.format(clip, vmin, vmax))
+        self.canvas.draw()
 
-        plt.show()
+    def clip_more(self, *_):
+        tighter = [c for c in CLIPS if c < self.clip]
+        if tighter: self.set_clip(tighter[-1])
+
+    def clip_less(self, *_):
+        wider = [c for c in CLIPS if c > self.clip]
+        if wider: self.set_clip(wider[0])
+
+    def line_title(self):
+        kind, index = self.current_line
+        return '{} {}'.format(kind, self.cube.lineno(kind, index))
+
+    def next_line(self, *_):
+        kind, index = self.current_line
+        if index + 1 < len(self.cube.lines[kind]):
+            self.show_line(kind, index + 1)
+
+    def previous_line(self, *_):
+        kind, index = self.current_line
+        if index > 0:
+            self.show_line(kind, index - 1)
+
+    def toggle_direction(self, event):
+        # switch to the perpendicular line through the cursor, or through the
+        # middle of the view
+        kind, _ = self.current_line
+        other = 'xline' if kind == 'iline' else 'iline'
+
+        x = event.xdata
+        if x is None: x = sum(self.ax.get_xlim()) / 2
+        count = len(self.cube.lines[other])
+        index = min(max(0, int(round(x * self.horizontal))), count - 1)
+        self.show_line(other, index)
+
+    def show_line(self, kind, index):
+        for poly in self.polys: poly.remove()
+        self.x, self.y = [], []
+        self.line.set_data(self.x, self.y)
+        self.last_removed = None
+
+        self.current_line = (kind, index)
+        self.polys = self.linepolys.setdefault(self.current_line, {})
+        self.traces = self.cube.section(kind, index)
+        self.shape = (len(self.cube.traces(kind, index)), self.shape[1])
+        self.index = gridindex(cellsize(self.traces.shape))
+        self.attach(self.polys)
+        # the labels are shown with the line
+        if self.layer is not None: self.start_layer()
+
+        traces, samples = self.traces.shape
+        self.show(('line', kind, index), self.traces,
+                  (-0.5, traces - 0.5, samples - 0.5, -0.5))
+        self.ax.set_xlim(-0.5, traces - 0.5)
+        self.ax.set_ylim(samples - 0.5, -0.5)
+        self.ax.set_title(self.line_title())
+
+        toolbar = self.canvas.manager and self.canvas.manager.toolbar
+        if toolbar is not None: toolbar.update()
+        self.canvas.draw()
+
+    def start_layer(self):
+        # every polygon is rendered into the label layer, and the patches
+        # are kept, invisible, for hit testing and editing
+        self.layer = labellayer(self.traces.shape, self.label_colours())
+        for poly in self.polys: self.layer.changed(poly, poly.get_xy())
+        self.labelwindow = None
+        self.image.draw = self.draw_labels
+
+    def label_colours(self):
+        # the colour of every class value in the label layer, see SHADES
+        colours = np.zeros((256, 4), dtype=np.uint8)
+        for cls in self.classes:
+            rgb = np.array(mpl.colors.to_rgb(cls['color']))
+            if cls['hatch'] in SHADES:
+                target, amount = SHADES[cls['hatch']]
+                rgb = rgb * (1 - amount) + target * amount
+            colours[cls['value']] = np.rint(np.append(rgb, 0.5) * 255)
+        return colours
+
+    def attach(self, polys):
+        for poly in polys:
+            self.ax.add_patch(poly)
+            self.index.insert(poly, poly.get_xy())
+
+    def patch(self, vertices, value):
+        cls = self.valclass[value]
+        return patches.Polygon(vertices,
+                               alpha=0.5,
+                               fc=cls['color'],
+                               hatch=cls['hatch'],
+                               visible=self.layer is None)
 
     def print_class_info(self, *_):
         for cls in self.classes:
@@ -222,11 +438,36 @@ class plotter(object):
             color_fig.show()
 
     def save_polys(self, *_):
-        save_polys(self.args.input, self.polys, self.args.horizontal, self.args.vertical)
+        x, y = self.args.horizontal, self.args.vertical
+
+        if self.args.polys_format == 'npz':
+            entries = [(kind, lineno, poly.get_xy(), cls)
+                       for kind, lineno, polys in self.all_lines()
+                       for poly, cls in polys.items()]
+            save_binary(self.args.input, entries, x, y)
+        elif self.cube is not None:
+            save_lines(self.args.input, self.all_lines(), x, y)
+        else:
+            save_polys(self.args.input, self.polys, x, y)
+
+        if self.journal is not None:
+            ids = self.journal.compact()
+            self.ids = {poly: ids[key] for poly, key in self.ids.items() if key in ids}
+
+    def all_lines(self):
+        if self.cube is None:
+            return [(None, None, self.polys)]
+
+        return [(kind, self.cube.lineno(kind, index), polys)
+                for (kind, index), polys in self.linepolys.items()]
+
+    def lineinfo(self):
+        if self.cube is None: return None, None
+        kind, index = self.current_line
+        return kind, self.cube.lineno(kind, index)
 
     def load_polys(self, path):
-        with open(path, 'r') as f:
-            saved_polys = json.load(f)
+        saved_polys = read_polys(path)
 
         hori, vert = saved_polys['x'], saved_polys['y']
 
@@ -239,23 +480,144 @@ class plotter(object):
             print(msg)
             return
 
-        for poly_path in saved_polys['poly_paths']:
-            cls = self.valclass[poly_path['poly_class']]
-            poly = patches.Polygon(poly_path['vertices'],
-                                   alpha=0.5,
-                                   fc=cls['color'],
-                                   hatch=cls['hatch'])
-            self.ax.add_patch(poly)
-            self.polys[poly] = poly_path['poly_class']
+        if 'lines' in saved_polys:
+            if self.cube is None:
+                print("Warning: Could not load polys: {} has polygons for the "
+                      "lines of a cube, use --cube".format(path))
+                return
+
+            for kind, lineno, polygons in saved_polys['lines']:
+                for vertices, cls in polygons:
+                    self.insert(vertices, cls, kind, lineno)
+            return
+
+        for vertices, cls in saved_polys['polygons']:
+            self.insert(vertices, cls)
+
+    def insert(self, vertices, cls, kind = None, lineno = None, key = None):
+        """
+        Add a saved polygon to the line it was drawn on, or to the current
+        line. key is the polygon's journal id, if it is already autosaved
+        """
+        if kind is None: kind, lineno = self.lineinfo()
+
+        polys = self.polys
+        if kind is not None:
+            line = (kind, self.cube.lines[kind].index(lineno))
+            polys = self.linepolys.setdefault(line, {})
+
+        poly = self.patch(vertices, cls)
+        polys[poly] = cls
+        if polys is self.polys: self.attach([poly])
+        self.changed(poly)
+
+        if self.journal is not None:
+            if key is None:
+                key = self.journal.add(poly.get_xy(), cls, kind, lineno)
+            self.ids[poly] = key
+
+    def start_autosave(self):
+        # every edit is appended to the journal. An existing journal is from
+        # an earlier session, which is resumed
+        path = polys_path(self.args.input, 'polys-', '.lmp')
+        try:
+            self.journal = store.journal(path, self.horizontal, self.vertical)
+        except ValueError as e:
+            print('Warning: Could not autosave: {}'.format(e))
+            return
+
+        for key, (kind, lineno, vertices, cls) in list(self.journal.polygons.items()):
+            self.insert(vertices, cls, kind, lineno, key = key)
+
+        print("Autosaving to", path)
+
+    def autosave(self, op, poly):
+        if self.journal is None: return
+
+        if op == store.ADD:
+            kind, lineno = self.lineinfo()
+            self.ids[poly] = self.journal.add(poly.get_xy(), self.polys[poly],
+                                              kind, lineno, key = self.ids.get(poly))
+        elif op == store.REMOVE:
+            self.journal.remove(self.ids[poly])
+        elif op == store.CLASS:
+            self.journal.setclass(self.ids[poly], self.polys[poly])
 
-    def add_overlay(self, path):
-        with segyio.open(path) as f:
-            traces = f.trace.raw[:]
+    def changed(self, poly, removed = False):
+        if self.layer is not None:
+            # rendered when the section is drawn, see draw_labels
+            if removed: self.layer.removed(poly, poly.get_xy())
+            else:       self.layer.changed(poly, poly.get_xy())
 
-        self.ax.imshow(traces[::self.horizontal, ::self.vertical].T,
-                       aspect='auto',
-                       cmap=plt.get_cmap(self.args.cmap),
-                       alpha=0.5)
+        if self.exporter is None: return
+        if removed: self.exporter.removed(poly, poly.get_xy())
+        else:       self.exporter.changed(poly, poly.get_xy())
+
+    def add_overlay(self, path, other = None):
+        if other is not None:
+            self.add_disagreement(path, other)
+            return
+
+        with segyio.open(path, ignore_geometry=True) as f:
+            traces = decimated(f, self.horizontal, self.vertical)
+
+        # labels span the class values, which then have the same colour in
+        # every file, and no scan of the labels is needed
+        self.raster.overlay(traces,
+                            plt.get_cmap(self.args.cmap),
+                            vmin=0,
+                            vmax=max(cls['value'] for cls in self.classes),
+                            alpha=0.5)
+        self.show(*self.window)
+
+    def add_disagreement(self, reference, labels):
+        # the metrics are computed on the full files, streamed, but only the
+        # decimated disagreement is drawn
+        result = compare.compare(reference, labels, self.args.chunk_size)
+        for line in compare.report(result): print(line)
+
+        diff = compare.disagreement(reference, labels, self.horizontal, self.vertical)
+        self.raster.overlay(np.ma.masked_equal(diff.astype(np.uint8), 0),
+                            plt.get_cmap('autumn'),
+                            vmin=0,
+                            vmax=1,
+                            alpha=0.7)
+        self.show(*self.window)
+
+    def ondraw(self, event):
+        # a full draw happens on zoom, pan, resize etc. - cache the freshly
+        # rendered section and polygons, then put the line on top
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+        self.statusbackground = self.canvas.copy_from_bbox(self.statusbox)
+        self.fig.draw_artist(self.status)
+
+    def blit(self, *artists):
+        """
+        Redraw only the line and artists, on top of the cached background,
+        instead of re-rendering the section and every polygon. The artists
+        become a part of the background until the next full draw. Artists
+        that change or disappear need a full draw instead
+        """
+        # polygons in the label layer only show up in a full draw
+        if self.layer is not None and artists: self.background = None
+        if self.background is None or not self.canvas.supports_blit:
+            self.canvas.draw_idle()
+            return
+
+        self.canvas.restore_region(self.background)
+        for artist in artists:
+            self.ax.draw_artist(artist)
+
+        if artists:
+            self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.ax.bbox)
+
+    def navigating(self):
+        toolbar = self.canvas.manager and self.canvas.manager.toolbar
+        return toolbar is not None and bool(toolbar.mode)
 
     def onrelease(self, event):
         if self.pick is not None:
@@ -264,7 +626,7 @@ class plotter(object):
             self.pick = None
             return
 
-        if self.canvas.manager.toolbar._active is not None: return
+        if self.navigating(): return
         if event.inaxes != self.line.axes: return
         if event.button != 1: return
 
@@ -272,32 +634,76 @@ class plotter(object):
         self.y.append(event.ydata)
 
         self.line.set_data(self.x, self.y)
-        self.canvas.draw()
+        self.blit()
 
     def clear(self, *_):
         self.x, self.y = [], []
         self.line.set_data(self.x, self.y)
+        self.blit()
 
     def mkpoly(self, *_):
         if len(self.x) == 0: return
-        cls = self.valclass[self.current_poly_class]
 
-        poly = patches.Polygon(list(zip(self.x, self.y)),
-                               alpha=0.5,
-                               fc=cls['color'],
-                               hatch=cls['hatch'])
+        poly = self.addpoly(list(zip(self.x, self.y)))
+        self.x, self.y = [], []
+        self.line.set_data(self.x, self.y)
+        self.blit(poly)
+
+    def addpoly(self, vertices):
+        poly = self.patch(vertices, self.current_poly_class)
         self.ax.add_patch(poly)
 
         self.polys[poly] = self.current_poly_class
-        self.clear()
+        self.index.insert(poly, poly.get_xy())
+        self.autosave(store.ADD, poly)
+        self.changed(poly)
+        return poly
+
+    def fill(self, event):
+        # grow a region of similar amplitudes from the cursor, within the
+        # visible part of the section, and add its outline as a polygon
+        if event.inaxes != self.line.axes: return
+
+        traces, samples = self.traces.shape
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        t0 = max(0, int(np.floor(x0 + 0.5)))
+        t1 = min(traces, int(np.ceil(x1 + 0.5)))
+        s0 = max(0, int(np.floor(y0 + 0.5)))
+        s1 = min(samples, int(np.ceil(y1 + 0.5)))
+
+        i = int(np.floor(event.xdata + 0.5))
+        j = int(np.floor(event.ydata + 0.5))
+        if not (t0 <= i < t1 and s0 <= j < s1): return
+
+        vmin, vmax = preview.limits(self.stats, self.clip)
+        tolerance = self.args.fill_tolerance * (vmax - vmin)
+
+        window = np.asarray(self.traces[t0:t1, s0:s1])
+        filled = region.grow(window, (i - t0, j - s0), tolerance)
+        if filled is None:
+            print('Not filling, the region is mostly speckle, '
+                  'zoom in or lower --fill-tolerance')
+            return
+
+        vertices = region.outline(filled)
+        if vertices is None: return
+
+        print('Filled {} samples, outlined by {} vertices'.format(
+              np.count_nonzero(filled), len(vertices)))
+        self.blit(self.addpoly(vertices + (t0, s0)))
 
     def rmpoly(self, event):
         if event.inaxes != self.line.axes: return
 
-        for poly in self.polys:
+        for poly in self.index.candidates(event.xdata, event.ydata):
             if not poly.contains(event)[0]: continue
             poly.remove()
+            self.index.remove(poly)
+            self.autosave(store.REMOVE, poly)
+            self.changed(poly, removed = True)
             self.last_removed = (poly, self.polys.pop(poly))
+            self.canvas.draw()
             return
 
     def edit_poly(self, event):
@@ -307,16 +713,19 @@ class plotter(object):
             print("Complete current path before editing")
             return
 
-        for poly, cls in self.polys.items():
+        for poly in self.index.candidates(event.xdata, event.ydata):
             if not poly.contains(event)[0]: continue
 
             t = poly.get_path().vertices
-            self.current_poly_class = cls
+            self.current_poly_class = self.polys[poly]
             self.x = t.T[0].tolist()[:-1]
             self.y = t.T[1].tolist()[:-1]
             self.line.set_data(self.x, self.y)
 
             poly.remove()
+            self.index.remove(poly)
+            self.autosave(store.REMOVE, poly)
+            self.changed(poly, removed = True)
             self.polys.pop(poly)
             self.canvas.draw()
             break
@@ -326,6 +735,10 @@ class plotter(object):
         if self.last_removed[0] in self.polys: return
         self.polys.update([self.last_removed])
         self.ax.add_patch(self.last_removed[0])
+        self.index.insert(self.last_removed[0], self.last_removed[0].get_xy())
+        self.autosave(store.ADD, self.last_removed[0])
+        self.changed(self.last_removed[0])
+        self.blit(self.last_removed[0])
 
     def undo_dot(self, *_):
         if len(self.x) == 0: return
@@ -333,7 +746,7 @@ class plotter(object):
         self.y.pop()
 
         self.line.set_data(self.x, self.y)
-        self.canvas.draw()
+        self.blit()
 
     def set_class(self, event):
         cls = self.hotkeys[event.key]
@@ -346,20 +759,28 @@ class plotter(object):
 
         if event.inaxes != self.ax: return
 
-        for poly in self.polys.keys():
+        changed = False
+        for poly in self.index.candidates(event.xdata, event.ydata):
             if not poly.contains(event)[0]: continue
             self.polys[poly] = cls['value']
             poly.set_facecolor(cls['color'])
             poly.set_hatch(cls['hatch'])
+            self.autosave(store.CLASS, poly)
+            self.changed(poly)
+            changed = True
 
-        self.canvas.draw()
+        # recoloured polygons cannot be drawn over the old ones, because
+        # they are transparent
+        if changed: self.canvas.draw()
 
     def complete(self, event):
         if event.key not in self.keys and event.key not in self.hotkeys: return
 
-        if event.key in self.keys: self.keys[event.key](event)
-        if event.key in self.hotkeys: self.set_class(event)
-        self.canvas.draw()
+        # every action redraws what it changes
+        action = self.keys.get(event.key, self.set_class)
+        with timing.timed('key:' + event.key, action = action.__name__,
+                          polygons = len(self.polys)):
+            action(event)
 
     def onpick(self, event):
         if event.artist is not self.line: return
@@ -380,73 +801,60 @@ class plotter(object):
         self.y[idx] = yp
 
         self.line.set_data(self.x, self.y)
-        self.canvas.draw()
+        self.blit()
         self.current_point = None
 
     def export(self, *_):
-        data = mkoutput(self.polys, self.traces.shape, self.horizontal, self.vertical)
-        export(self.args.input, data, prefix = self.args.prefix)
-
-def main(argv = None):
-    if argv is None: argv = sys.argv
-
-    parser = argparse.ArgumentParser(prog = argv[0],
-                                     description='Labelmaker - open segyiofile, '
-                                                 'mark areas interactively and export the result')
-    parser.add_argument('input',
-                        type=str,
-                        help='Input file')
-
-    parser.add_argument('-t',
-                        '--threshold',
-                        type=float,
-                        help='Point selection sensitivity',
-                        default=0.01)
-
-    parser.add_argument('-p',
-                        '--prefix',
-                        type=str,
-                        help='Output file prefix',
-                        default='labelmade-')
-
-    parser.add_argument('-d',
-                        '--compare',
-                        type=str,
-                        help='Filepath to exported results (for comparing)')
-
-    parser.add_argument('-c',
-                        '--cmap',
-                        '--colours',
-                        type=str,
-                        default='seismic',
-                        help='Set colour map')
-
-    parser.add_argument('-x',
-                        '--horizontal',
-                        '--downsample-horizontal',
-                        type=int,
-                        default=1,
-                        help='Downsample horizontally (keep every n trace)')
-
-    parser.add_argument('-y',
-                        '--vertical',
-                        '--downsample-vertical',
-                        type=int,
-                        default=1,
-                        help='Downsample vertically (keep every n sample)')
-
-    parser.add_argument('-l',
-                        '--load',
-                        type=str,
-                        help='Filepath for saved polygons')
-
-    args = parser.parse_args(args = argv[1:])
-
-    with segyio.open(args.input) as f:
-        traces = f.trace.raw[:]
-
-    runner = plotter(args, traces)
-    runner.run()
+        # exports run in the background, on a snapshot of the polygons, so
+        # that labelling can go on. A new export supersedes a running one
+        if self.cube is not None:
+            lines = [(self.cube.traces(kind, index), dict(polys))
+                     for (kind, index), polys in self.linepolys.items()
+                     if polys]
+            fn = export_lines
+            args = (self.args.input, lines, self.horizontal, self.vertical)
+            kwargs = {'prefix': self.args.prefix,
+                      'chunksize': self.args.chunk_size,
+                      'jobs': self.args.jobs,
+                      'format': self.args.format}
+        else:
+            # the changes in the snapshot are taken with it, later changes
+            # are left for the next export
+            args = (dict(self.polys), self.exporter.take())
+            fn, kwargs = self.exporter.export, {}
+
+        if self.task is not None and self.task.running():
+            print('Superseding the running export')
+
+        self.task = background.task('export', fn, *args, previous = self.task,
+                                    **kwargs).start()
+        self.timer.start()
+
+    def cancel_export(self, *_):
+        if self.task is None or not self.task.running(): return
+        self.task.cancel()
+        print('Cancelling the export')
+
+    def onprogress(self):
+        task = self.task
+        self.show_status(task.status())
+        if task.running(): return
+
+        self.timer.stop()
+        if task.state == 'failed':
+            print('Export failed: {}'.format(task.error))
+        elif task.state == 'cancelled':
+            print('Export cancelled')
+
+    def show_status(self, text):
+        self.status.set_text(text)
+        if self.statusbackground is None or not self.canvas.supports_blit:
+            self.canvas.draw_idle()
+            return
+
+        self.canvas.restore_region(self.statusbackground)
+        self.fig.draw_artist(self.status)
+        self.canvas.blit(self.statusbox)
 
 if __name__ == '__main__':
     main(sys.argv)
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+from .section import decimated
+
+# Persistent cache of decimated sections, so that reopening a file shows the
+# first frame without reading and decimating it again.
+#
+# Entries are keyed by the file's real path, size, modification time and the
+# decimation, so a changed file is never served from the cache. Every entry
+# is a .npy file, which is memory mapped on load, and a .json file with
+# display statistics. Entries are evicted least recently used first when the
+# cache grows beyond its disk budget
+
+ENVIRONMENT = 'LABELMAKER_CACHE'
+
+# part of every key, so that entries with older statistics are never used
+VERSION = 3
+
+# the statistics are estimated from at most this many values
+SAMPLES = 1 << 20
+
+# sections larger than this fraction of the budget are not cached, as they
+# would evict most of the cache, and copy a large file into it
+LARGEST = 0.5
+
+# the percentiles kept of every section, densest in the tails where the
+# clip limits are
+PERCENTILES = np.unique(np.concatenate([np.linspace(0, 2, 201),
+                                        np.linspace(2, 98, 97),
+                                        np.linspace(98, 100, 201)]))
+
+def directory():
+    """
+    The default cache directory, $LABELMAKER_CACHE, or labelmaker in the
+    user's cache directory
+    """
+    path = os.environ.get(ENVIRONMENT)
+    if path: return path
+
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'labelmaker')
+
+def key(path, horizontal, vertical):
+    """
+    The cache key of a decimated section of a file
+    :param path: path to the segy file
+    :param horizontal: int, horizontal decimation
+    :param vertical: int, vertical decimation
+    :return: str
+    """
+    st = os.stat(path)
+    identity = '{}|{}|{}|{}|{}|{}'.format(os.path.realpath(path), st.st_size,
+                                          st.st_mtime_ns, horizontal, vertical,
+                                          VERSION)
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+def statistics(data, samples = SAMPLES):
+    """
+    Display statistics of a section, estimated from an evenly spread sample
+    of about samples values. A range of percentiles of the sample is kept,
+    so that clip limits can be changed without another pass over the data,
+    see limits()
+    :param data: numpy array, of shape (traces, samples) or (samples,)
+    :param samples: int, number of values sampled
+    :return: dict with the sampled 'min', 'max' and 'percentiles'
+    """
+    rows = data.reshape(-1, data.shape[-1]) if data.ndim > 1 else data.reshape(1, -1)
+    traces, depth = rows.shape
+
+    # traces and samples are strided separately, as one stride over the
+    # flattened section lines up with the trace length, and then only reads
+    # a few depths of every trace. A few dozen depths of every sampled trace
+    # are kept, and the rest of the stride is over the traces
+    ratio = rows.size / samples
+    si = max(1, min(math.ceil(math.sqrt(ratio)), depth // 32))
+    ti = min(traces, max(1, math.ceil(ratio / si)))
+    si = max(si, math.ceil(ratio / ti))
+
+    sample = np.asarray(rows[::ti, ::si], dtype=np.float64).reshape(-1)
+    sample = sample[np.isfinite(sample)]
+
+    if sample.size == 0:
+        return {'min': 0.0, 'max': 0.0, 'percentiles': [0.0] * len(PERCENTILES)}
+
+    values = np.percentile(sample, PERCENTILES)
+    return {'min': float(values[0]),
+            'max': float(values[-1]),
+            'percentiles': values.tolist()}
+
+def limits(stats, clip = 100):
+    """
+    The display limits that clip the highest and lowest values
+    :param stats: dict, see statistics()
+    :param clip: float, percentile of the upper limit. The lower limit is
+                 the 100 - clip percentile. 100 is the full range
+    :return: (vmin, vmax)
+    """
+    clip = min(max(clip, 50), 100)
+    values = stats.get('percentiles')
+    if values is None or len(values) != len(PERCENTILES):
+        return stats['min'], stats['max']
+
+    low, high = np.interp([100 - clip, clip], PERCENTILES, values)
+    return float(low), float(high)
+
+class previewcache(object):
+    """
+    Disk cache of decimated sections and their display statistics
+    """
+    def __init__(self, path = None, budget = 2 * 1024 ** 3):
+        """
+        :param path: cache directory, see directory()
+        :param budget: int, maximum bytes of cached sections
+        """
+        self.path = path or directory()
+        self.budget = budget
+        os.makedirs(self.path, exist_ok = True)
+
+    def files(self, name):
+        base = os.path.join(self.path, name)
+        return base + '.npy', base + '.json'
+
+    def get(self, path, horizontal, vertical):
+        """
+        :param path: path to the segy file
+        :param horizontal: int, horizontal decimation
+        :param vertical: int, vertical decimation
+        :return: (memory mapped section, statistics), or None
+        """
+        data, meta = self.files(key(path, horizontal, vertical))
+        try:
+            with open(meta) as f:
+                stats = json.load(f)
+            section = np.load(data, mmap_mode = 'r')
+        except (OSError, ValueError):
+            return None
+
+        # the modification time orders the entries for eviction
+        os.utime(data)
+        return section, stats
+
+    def put(self, path, horizontal, vertical, section, stats):
+        """
+        Cache a section, and evict old entries until the cache is within
+        budget. Sections larger than a fraction of the budget, see LARGEST,
+        are not cached
+        :param path: path to the segy file
+        :param horizontal: int, horizontal decimation
+        :param vertical: int, vertical decimation
+        :param section: numpy array
+        :param stats: dict, see statistics()
+        :return: bool, True if the section was cached
+        """
+        if section.nbytes > self.budget * LARGEST: return False
+        data, meta = self.files(key(path, horizontal, vertical))
+
+        # the .npy is written last, and an entry without it is ignored, so
+        # a crash never leaves a half-written entry behind
+        with open(meta + '.tmp', 'w') as f:
+            json.dump(stats, f)
+        os.replace(meta + '.tmp', meta)
+
+        with open(data + '.tmp', 'wb') as f:
+            np.save(f, section)
+        os.replace(data + '.tmp', data)
+
+        self.evict()
+        return True
+
+    def entries(self):
+        """
+        The cached sections, least recently used first
+        :return: list of (path, bytes)
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.npy'): continue
+            fname = os.path.join(self.path, name)
+            try:
+                st = os.stat(fname)
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, fname, st.st_size))
+
+        return [(fname, size) for _, fname, size in sorted(entries)]
+
+    def size(self):
+        return sum(size for _, size in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size in entries)
+
+        for fname, size in entries:
+            if total <= self.budget: break
+
+            for stale in (fname, os.path.splitext(fname)[0] + '.json'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            total -= size
+
+def load(f, path, horizontal, vertical, cache):
+    """
+    The decimated section of a file, from the cache if possible
+    :param f: open segyio file handle of path
+    :param path: path to the segy file
+    :param horizontal: int, keep every n trace
+    :param vertical: int, keep every n sample
+    :param cache: previewcache, or None to always read the file
+    :return: (section, statistics)
+    """
+    if cache is not None:
+        entry = cache.get(path, horizontal, vertical)
+        if entry is not None: return entry
+
+    section = decimated(f, horizontal, vertical)
+    stats = statistics(section)
+
+    if cache is not None:
+        try:
+            if not cache.put(path, horizontal, vertical, section, stats):
+                print('Not caching the preview, it is larger than half of '
+                      'the cache, see --preview-cache-size')
+        except OSError as e:
+            print('Warning: Could not cache the preview: {}'.format(e))
+
+    return section, stats
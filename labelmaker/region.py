@@ -0,0 +1,235 @@
+import numpy as np
+
+# Region growing, i.e. flood fill by amplitude. The fill is done on runs of
+# samples within the tolerance, rather than on samples, so that the work in
+# python is proportional to the number of runs, and everything else is
+# vectorised. Runs in neighbouring traces are connected if they share a
+# sample, and the region is every run connected to the seed. The fill starts
+# in a small window around the seed, which grows while the region reaches
+# its edges, so that small regions are cheap in large, noisy sections. The
+# work is bounded by the number of runs in the window, and a fill that needs
+# more runs than that, i.e. of a region that is mostly speckle, is refused.
+#
+# The region is turned into a polygon by its outline along the pixel edges,
+# so that the polygon covers exactly the pixels of the region, and is
+# exported, saved and edited like any drawn polygon. Polygons cannot have
+# holes, so holes in the region are filled. The corners of the outline are
+# at the ends of runs, and every corner is joined to the nearest corner in
+# the direction of its edge, so the outline is found without walking it
+
+def runs(mask):
+    """
+    The runs of True along the samples of every trace
+    :param mask: boolean numpy array of shape (traces, samples)
+    :return: (trace, start, stop) numpy arrays, sorted by trace and start
+    """
+    traces, samples = mask.shape
+    padded = np.zeros((traces, samples + 2), dtype=bool)
+    padded[:, 1:-1] = mask
+
+    # every trace starts and ends outside a run, so the changes alternate
+    # between starts and stops
+    trace, change = np.nonzero(padded[:, 1:] != padded[:, :-1])
+    return trace[0::2], change[0::2], change[1::2]
+
+def neighbours(trace, start, stop, samples):
+    """
+    The pairs of runs in neighbouring traces that share a sample
+    :return: (a, b) numpy arrays of run indices
+    """
+    # runs are sorted by trace and start, and do not overlap within a trace,
+    # so the keys of both the starts and stops are sorted
+    span = samples + 1
+    first = trace * span + start
+    last = trace * span + stop
+
+    nxt = (trace + 1) * span
+    lo = np.searchsorted(last, nxt + start, side='right')
+    hi = np.searchsorted(first, nxt + stop, side='left')
+
+    count = np.maximum(hi - lo, 0)
+    a = np.repeat(np.arange(len(trace)), count)
+    offset = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    b = np.repeat(lo, count) + offset
+    return a, b
+
+def components(n, a, b):
+    """
+    Connected components of a graph, by hooking and pointer jumping
+    :param n: int, number of nodes
+    :param a: numpy array of edge endpoints
+    :param b: numpy array of edge endpoints
+    :return: numpy array, the smallest node of the component of every node
+    """
+    parent = np.arange(n)
+    while True:
+        pa, pb = parent[a], parent[b]
+        differ = pa != pb
+        if not differ.any(): return parent
+
+        # roots are only hooked to smaller roots, so whichever of several
+        # hooks to the same root wins, the smallest node stays the root
+        low = np.minimum(pa[differ], pb[differ])
+        high = np.maximum(pa[differ], pb[differ])
+        parent[high] = low
+
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent): break
+            parent = grand
+
+def paint(shape, trace, start, stop):
+    """
+    The mask of runs, the inverse of runs()
+    :param shape: (traces, samples)
+    :return: boolean numpy array of shape
+    """
+    # +1 at the start and -1 at the stop of every run, summed along the
+    # trace. Runs in a trace do not touch, so no two runs share a sample
+    edges = np.zeros((shape[0], shape[1] + 1), dtype=np.int8)
+    edges[trace, start] = 1
+    edges[trace, stop] = -1
+    return np.cumsum(edges, axis=1, dtype=np.int8)[:, :-1] > 0
+
+def connected(trace, start, stop, samples, seed):
+    """
+    The runs that are connected to the seed
+    :param trace: numpy array, see runs()
+    :param start: numpy array, see runs()
+    :param stop: numpy array, see runs()
+    :param samples: int, samples per trace
+    :param seed: (trace, sample), which must be in a run
+    :return: (trace, start, stop) numpy arrays, see runs()
+    """
+    i, j = seed
+    a, b = neighbours(trace, start, stop, samples)
+    label = components(len(trace), a, b)
+
+    # the seed is in the run of its trace that starts at or before it
+    first = np.searchsorted(trace, i)
+    mine = first + np.searchsorted(start[first:np.searchsorted(trace, i, 'right')],
+                                   j, side='right') - 1
+    keep = label == label[mine]
+    return trace[keep], start[keep], stop[keep]
+
+def grow(data, seed, tolerance, window = 256, limit = 2 ** 19):
+    """
+    The region of samples connected to the seed, through samples that are
+    within the tolerance of the seed's amplitude
+    :param data: numpy array of shape (traces, samples)
+    :param seed: (trace, sample)
+    :param tolerance: float, maximum absolute difference from the seed
+    :param window: int, size of the first window around the seed that is
+                   searched, which is doubled while the region reaches its
+                   edges
+    :param limit: int, maximum number of runs in the window
+    :return: boolean numpy array of the shape of data, all False if the seed
+             amplitude is not finite or the tolerance is negative, or None if
+             the window needs more than limit runs
+    """
+    traces, samples = data.shape
+    i, j = seed
+    value = data[i, j]
+    region = np.zeros(data.shape, dtype=bool)
+    if not np.isfinite(value): return region
+
+    half = max(window // 2, 1)
+    while True:
+        t0, t1 = max(i - half, 0), min(i + half + 1, traces)
+        s0, s1 = max(j - half, 0), min(j + half + 1, samples)
+        with np.errstate(invalid='ignore'):
+            mask = np.abs(data[t0:t1, s0:s1] - value) <= tolerance
+
+        # the seed is not in a run, and nothing is connected to it
+        if not mask[i - t0, j - s0]: return region
+
+        trace, start, stop = runs(mask)
+        if len(trace) > limit: return None
+
+        part = paint(mask.shape, *connected(trace, start, stop, mask.shape[1],
+                                            (i - t0, j - s0)))
+        # a region that does not reach the inner edges of the window cannot
+        # continue outside it
+        reaches = ((t0 > 0 and part[0].any()) or
+                   (t1 < traces and part[-1].any()) or
+                   (s0 > 0 and part[:, 0].any()) or
+                   (s1 < samples and part[:, -1].any()))
+        if not reaches: break
+        half *= 2
+
+    region[t0:t1, s0:s1] = part
+    return region
+
+def outline(region):
+    """
+    The outer outline of a 4-connected region, along the pixel edges. Pixel
+    (i, j) covers [i - 0.5, i + 0.5) x [j - 0.5, j + 0.5), like the display
+    coordinates of the section
+    :param region: boolean numpy array of shape (traces, samples)
+    :return: numpy array of shape (n, 2), or None if the region is empty
+    """
+    inside = region.any(axis=1)
+    rows = region.any(axis=0)
+    if not rows.any(): return None
+
+    # only the bounding box of the region is searched
+    t0, t1 = np.flatnonzero(inside)[[0, -1]]
+    s0, s1 = np.flatnonzero(rows)[[0, -1]]
+    box = region[t0:t1 + 1, s0:s1 + 1]
+    traces, samples = box.shape
+
+    # the outline goes clockwise, with the region on the right, from the top
+    # left corner of the first pixel of the top row
+    i, j = np.argmax(box[:, 0]), 0
+
+    # the region of that pixel, with its holes filled, i.e. everything that
+    # is not connected to the outside. Padded, so that the outside is
+    # connected around the region, and all pixels by a corner are in bounds
+    padded = np.zeros((traces + 2, samples + 2), dtype=bool)
+    padded[1:-1, 1:-1] = paint(box.shape, *connected(*runs(box), samples, (i, j)))
+    filled = ~paint(padded.shape, *connected(*runs(~padded), samples + 2, (0, 0)))
+
+    # corner (x, y) is the top left corner of pixel (x, y). Corners of the
+    # outline are at the ends of runs, with an odd number of the four pixels
+    # around them in the region. Pixels that only touch by a corner cannot
+    # both be next to the outside, as that would enclose one of the others
+    trace, start, stop = runs(filled)
+    x = np.concatenate([trace, trace + 1, trace, trace + 1])
+    y = np.concatenate([start, start, stop, stop])
+    key = np.unique(x * (samples + 3) + y)
+    x, y = key // (samples + 3), key % (samples + 3)
+
+    nw, ne = filled[x - 1, y - 1], filled[x, y - 1]
+    sw, se = filled[x - 1, y], filled[x, y]
+    corner = nw ^ ne ^ sw ^ se
+    x, y = x[corner], y[corner]
+    nw, ne, sw, se = nw[corner], ne[corner], sw[corner], se[corner]
+
+    # the edge out of every corner has the region on its right, and ends in
+    # the nearest corner in its direction, in the same row or column
+    dx = (se & ~ne).astype(np.intp) - (nw & ~sw)
+    dy = (sw & ~se).astype(np.intp) - (ne & ~nw)
+    n = len(x)
+    byrow = np.lexsort((x, y))
+    bycol = np.lexsort((y, x))
+    rowpos = np.empty(n, dtype=np.intp)
+    rowpos[byrow] = np.arange(n)
+    colpos = np.empty(n, dtype=np.intp)
+    colpos[bycol] = np.arange(n)
+    nxt = np.where(dx != 0, byrow[(rowpos + dx) % n], bycol[(colpos + dy) % n])
+
+    # the order along the outline, by pointer jumping towards the corner
+    # before the first, where the outline is cut
+    first = np.flatnonzero((x == i + 1) & (y == j + 1))[0]
+    last = np.flatnonzero(nxt == first)[0]
+    nxt[last] = last
+    togo = np.ones(n, dtype=np.intp)
+    togo[last] = 0
+    for _ in range(n.bit_length()):
+        togo += togo[nxt]
+        nxt = nxt[nxt]
+
+    order = np.empty(n, dtype=np.intp)
+    order[n - 1 - togo] = np.arange(n)
+    vertices = np.stack([x[order], y[order]], axis=1).astype(np.float64)
+    return vertices + (t0 - 1.5, s0 - 1.5)
@@ -0,0 +1,307 @@
+import math
+import os
+import tempfile
+import time
+import numpy as np
+
+from . import timing
+
+def polygons(polys):
+    """
+    Normalise polygons to a list of (vertices, class) pairs
+    :param polys: mapping of matplotlib polygons to class, or an iterable of
+                  (polygon or vertices, class) pairs
+    :return: list of (numpy array of shape (n, 2), class)
+    """
+    items = polys.items() if hasattr(polys, 'items') else polys
+
+    normalised = []
+    for poly, cls in items:
+        xy = poly.get_xy() if hasattr(poly, 'get_xy') else poly
+        normalised.append((np.asarray(xy, dtype=np.float64), cls))
+
+    return normalised
+
+def bbox(vertices):
+    """
+    The integer rectangle that covers all of the polygon
+    :param vertices: numpy array of shape (n, 2)
+    :return: (w, n, e, s), where e and s are exclusive
+    """
+    w, n = vertices.min(axis=0)
+    e, s = vertices.max(axis=0)
+
+    w, n = int(math.floor(w)), int(math.floor(n))
+    e, s = int(math.ceil(e + 1)), int(math.ceil(s + 1))
+    return w, n, e, s
+
+def mask(vertices, xs, ys):
+    """
+    Even-odd point-in-polygon test for every point in the grid xs × ys.
+
+    Each row is tested against all edges that cross it in one vectorised
+    pass. The crossing test is exactly the one matplotlib uses in
+    Path.contains_points, so points on edges and vertices are classified
+    identically
+    :param vertices: numpy array of shape (n, 2), the polygon ring
+    :param xs: numpy array of x coordinates
+    :param ys: numpy array of y coordinates
+    :return: boolean numpy array of shape (len(ys), len(xs))
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    inside = np.zeros((len(ys), len(xs)), dtype=bool)
+
+    # edges go from (x0, y0) to (x1, y1), closing the ring. A closing vertex
+    # that repeats the first gives an empty edge, which never crosses
+    x0, y0 = vertices[:, 0], vertices[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+
+    for row, ty in enumerate(ys):
+        flag0 = y0 >= ty
+        flag1 = y1 >= ty
+        crossing = flag0 != flag1
+        if not crossing.any(): continue
+
+        ex0, ey0 = x0[crossing], y0[crossing]
+        ex1, ey1 = x1[crossing], y1[crossing]
+        flag1 = flag1[crossing]
+
+        lhs = (ey1 - ty) * (ex0 - ex1)
+        rhs = (ex1[:, np.newaxis] - xs) * (ey0 - ey1)[:, np.newaxis]
+        hits = (lhs[:, np.newaxis] >= rhs) == flag1[:, np.newaxis]
+        inside[row] = np.logical_xor.reduce(hits, axis=0)
+
+    return inside
+
+def fill(out, vertices, value, xscale = 1, yscale = 1, origin = (0, 0)):
+    """
+    Write value into every sample of out that is inside the polygon.
+
+    The polygon is in the (decimated) display coordinates, and out is at
+    full resolution, so trace t, sample s is inside the polygon if the point
+    (t // xscale, s // yscale) is. out may be a window into a larger output,
+    in which case origin is the (trace, sample) of out[0, 0]
+    :param out: numpy array of shape (traces, samples)
+    :param vertices: numpy array of shape (n, 2)
+    :param value: the class value to write
+    :param xscale: int, horizontal downsampling of the display
+    :param yscale: int, vertical downsampling of the display
+    :param origin: (int, int), offset of out in the full output
+    """
+    t0, s0 = origin
+    traces, samples = out.shape
+    if traces == 0 or samples == 0: return
+
+    w, n, e, s = bbox(vertices)
+    w = max(w, t0 // xscale)
+    n = max(n, s0 // yscale)
+    e = min(e, (t0 + traces - 1) // xscale + 1)
+    s = min(s, (s0 + samples - 1) // yscale + 1)
+    if w >= e or n >= s: return
+
+    inside = mask(vertices, np.arange(w, e), np.arange(n, s))
+    paste(out, (w, n), inside.T, value, xscale, yscale, origin)
+
+def rasterize(vertices, shape, xscale = 1, yscale = 1):
+    """
+    The polygon's mask on the display grid, over its bounding box clipped
+    to the output. Together with paste(), this fills exactly the samples
+    fill() does
+    :param vertices: numpy array of shape (n, 2)
+    :param shape: (int, int), the (traces, samples) of the full output
+    :param xscale: int, horizontal downsampling of the display
+    :param yscale: int, vertical downsampling of the display
+    :return: ((w, n), boolean numpy array of shape (e - w, s - n)), where
+             (w, n) is the display point of mask[0, 0]
+    """
+    traces, samples = shape
+    w, n, e, s = bbox(vertices)
+    w, n = max(w, 0), max(n, 0)
+    e = min(e, -(-traces // xscale))
+    s = min(s, -(-samples // yscale))
+    if w >= e or n >= s:
+        return (0, 0), np.zeros((0, 0), dtype=bool)
+
+    return (w, n), mask(vertices, np.arange(w, e), np.arange(n, s)).T
+
+def paste(out, corner, inside, value, xscale = 1, yscale = 1, origin = (0, 0)):
+    """
+    Write value into every sample of out covered by a display grid mask,
+    see rasterize()
+    :param out: numpy array of shape (traces, samples)
+    :param corner: (int, int), the display point of inside[0, 0]
+    :param inside: boolean numpy array of shape (x, y)
+    :param value: the class value to write
+    :param xscale: int, horizontal downsampling of the display
+    :param yscale: int, vertical downsampling of the display
+    :param origin: (int, int), offset of out in the full output
+    """
+    w, n = corner
+    e, s = w + inside.shape[0], n + inside.shape[1]
+    t0, s0 = origin
+    traces, samples = out.shape
+
+    ta, tb = max(t0, w * xscale), min(t0 + traces, e * xscale)
+    sa, sb = max(s0, n * yscale), min(s0 + samples, s * yscale)
+    if ta >= tb or sa >= sb: return
+
+    cols = np.arange(ta, tb) // xscale - w
+    rows = np.arange(sa, sb) // yscale - n
+
+    window = out[ta - t0:tb - t0, sa - s0:sb - s0]
+    window[inside[np.ix_(cols, rows)]] = value
+
+def render(polygons, out, xscale = 1, yscale = 1, origin = (0, 0)):
+    """
+    Fill all polygons into out, in order, so later polygons overwrite
+    earlier ones where they overlap
+    :param polygons: list of (vertices, class) pairs, see polygons()
+    :param out: numpy array of shape (traces, samples)
+    :param xscale: int, horizontal downsampling of the display
+    :param yscale: int, vertical downsampling of the display
+    :param origin: (int, int), offset of out in the full output
+    """
+    for vertices, cls in polygons:
+        fill(out, vertices, cls, xscale, yscale, origin)
+
+def tiles(traces, jobs, tilesize = None):
+    """
+    Split traces into contiguous ranges
+    :param traces: int, number of traces
+    :param jobs: int, number of workers the tiles are spread over
+    :param tilesize: int, traces per tile. Defaults to 4 tiles per worker
+    :return: list of (first, last) trace ranges, last exclusive
+    """
+    if tilesize is None:
+        tilesize = max(1, -(-traces // (4 * jobs)))
+
+    return [(t, min(t + tilesize, traces)) for t in range(0, traces, tilesize)]
+
+_tile_state = {}
+
+def _tile_init(path, shape, dtype, polygons, xscale, yscale, traced):
+    _tile_state['output'] = np.memmap(path, dtype=dtype, mode='r+', shape=shape)
+    _tile_state['polygons'] = polygons
+    _tile_state['scale'] = (xscale, yscale)
+    _tile_state['traced'] = traced
+
+def _tile_render(tile):
+    first, last, origin = tile
+    output = _tile_state['output']
+    xscale, yscale = _tile_state['scale']
+
+    if not _tile_state['traced']:
+        render(_tile_state['polygons'], output[first:last], xscale, yscale,
+               origin = (origin + first, 0))
+        return []
+
+    # the worker does not write the trace, but times every polygon and
+    # returns the records, which are written by chunks()
+    records = []
+    for i, (vertices, cls) in enumerate(_tile_state['polygons'], 1):
+        start, wall = time.perf_counter(), time.time()
+        fill(output[first:last], vertices, cls, xscale, yscale,
+             origin = (origin + first, 0))
+        records.append({'event': 'rasterize',
+                        'seconds': time.perf_counter() - start,
+                        'start': wall,
+                        'peak_rss_kb': timing.peak_memory(),
+                        'polygon': i,
+                        'vertices': len(vertices),
+                        'first': origin + first,
+                        'traces': last - first,
+                        'pid': os.getpid()})
+    return records
+
+def chunks(polygons, shape, xscale, yscale, chunksize, jobs = 1,
+           dtype = np.single, tilesize = None):
+    """
+    Render polygons chunksize traces at a time.
+
+    Only one chunk is held in memory, so the label volume is never fully
+    materialised. With jobs > 1, every chunk is split into trace tiles that
+    are rendered by a pool of worker processes into a shared memory-mapped
+    buffer. Tiles do not overlap and every tile renders all polygons in
+    order, so the result is identical to the serial render().
+
+    Every chunk, and every polygon rendered into it, is timed in the trace,
+    see timing.
+
+    The yielded array is reused, and is only valid until the next chunk is
+    requested
+    :param polygons: list of (vertices, class) pairs, see polygons()
+    :param shape: (int, int), the (traces, samples) of the output
+    :param xscale: int, horizontal downsampling of the display
+    :param yscale: int, vertical downsampling of the display
+    :param chunksize: int, traces per chunk
+    :param jobs: int, number of worker processes
+    :param dtype: numpy dtype of the output
+    :param tilesize: int, traces per tile
+    :return: generator of (first trace, numpy array of shape (n, samples))
+    """
+    traces, samples = shape
+    chunksize = max(1, min(chunksize, traces))
+
+    if jobs <= 1:
+        buf = np.empty((chunksize, samples), dtype=dtype)
+        for first in range(0, traces, chunksize):
+            last = min(first + chunksize, traces)
+            chunk = buf[:last - first]
+            with timing.timed('render-chunk', first = first, traces = last - first):
+                chunk[:] = 0
+                for i, (vertices, cls) in enumerate(polygons, 1):
+                    with timing.timed('rasterize', polygon = i, vertices = len(vertices),
+                                      first = first, traces = last - first):
+                        fill(chunk, vertices, cls, xscale, yscale, origin = (first, 0))
+            yield first, chunk
+        return
+
+    # multiprocessing is slow to import, and only needed for parallel renders
+    import multiprocessing
+
+    with tempfile.TemporaryDirectory(prefix = 'labelmaker-') as tmp:
+        path = os.path.join(tmp, 'chunk')
+        buf = np.memmap(path, dtype=dtype, mode='w+', shape=(chunksize, samples))
+        # bound for the del below, also when there are no traces
+        chunk = buf
+
+        initargs = (path, (chunksize, samples), dtype, polygons, xscale, yscale,
+                    timing.enabled())
+        with multiprocessing.Pool(jobs, _tile_init, initargs) as pool:
+            for first in range(0, traces, chunksize):
+                last = min(first + chunksize, traces)
+                chunk = buf[:last - first]
+                with timing.timed('render-chunk', first = first,
+                                  traces = last - first, jobs = jobs):
+                    chunk[:] = 0
+
+                    work = [(a, b, first) for a, b in tiles(last - first, jobs, tilesize)]
+                    for records in pool.imap_unordered(_tile_render, work):
+                        for record in records: timing.emit(record)
+                yield first, chunk
+
+        del buf, chunk
+
+def render_parallel(polygons, shape, xscale, yscale, jobs,
+                    dtype = np.single, tilesize = None):
+    """
+    Render polygons into a new (traces, samples) array with a pool of jobs
+    worker processes, see chunks()
+    :param polygons: list of (vertices, class) pairs, see polygons()
+    :param shape: (int, int), the (traces, samples) of the output
+    :param xscale: int, horizontal downsampling of the display
+    :param yscale: int, vertical downsampling of the display
+    :param jobs: int, number of worker processes
+    :param dtype: numpy dtype of the output
+    :param tilesize: int, traces per tile
+    :return: numpy array of shape (traces, samples)
+    """
+    traces, _ = shape
+    output = np.empty(shape, dtype=dtype)
+
+    parts = chunks(polygons, shape, xscale, yscale, traces, jobs, dtype, tilesize)
+    for first, chunk in parts:
+        output[first:first + len(chunk)] = chunk
+
+    return output
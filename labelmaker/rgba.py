@@ -0,0 +1,139 @@
+import collections
+
+import numpy as np
+
+from . import timing
+
+# Pre-colormapped images of the section. Given float data, matplotlib
+# normalises and colormaps the whole array on every full draw of the figure,
+# i.e. on every zoom, pan and resize, and once more for every overlay. The
+# section is instead colormapped once into a uint8 RGBA image, with the
+# overlays composited into it, which imshow only has to resample.
+#
+# Images are cached per visible window, so that going back to an earlier
+# zoom level is free, and the cache is cleared when the colormap, the clip
+# limits or the overlays change. Neither matplotlib nor pyplot is imported
+# here, colormaps are any callable like matplotlib.colors.Colormap
+
+def colormap(data, cmap, vmin, vmax, alpha = 1.0):
+    """
+    Colormap data into a uint8 RGBA image, like imshow does with
+    Normalize(vmin, vmax)
+    :param data: numpy array of shape (traces, samples), or a masked array,
+                 where masked values are transparent
+    :param cmap: colormap
+    :param vmin: float, value of the lowest colour
+    :param vmax: float, value of the highest colour
+    :param alpha: float, opacity of the image
+    :return: numpy array of uint8, of shape (traces, samples, 4)
+    """
+    x = np.ma.getdata(data).astype(np.float32)
+    if vmax > vmin:
+        x -= vmin
+        x /= (vmax - vmin)
+    else:
+        x = np.where(np.isfinite(x), 0, x).astype(np.float32)
+
+    image = cmap(x, alpha = alpha, bytes = True)
+
+    mask = np.ma.getmask(data)
+    if mask is not np.ma.nomask: image[mask] = 0
+    return image
+
+def resample(image, extent, shape):
+    """
+    Nearest-neighbour resampling of an image at the resolution of the
+    decimated section onto a window, see section.pyramid
+    :param image: numpy array of shape (traces, samples, ...)
+    :param extent: (left, right, bottom, top) of the window, in display
+                   coordinates
+    :param shape: (traces, samples) of the window
+    :return: numpy array of shape shape + image.shape[2:]
+    """
+    left, right, bottom, top = extent
+    traces, samples = shape
+    if extent == (-0.5, image.shape[0] - 0.5, image.shape[1] - 0.5, -0.5):
+        if (traces, samples) == image.shape[:2]: return image
+
+    # pixel (i, j) of the decimated section covers [i - 0.5, i + 0.5), and
+    # every pixel of the window shows the trace and sample at its top left
+    # corner, see section.pyramid.extent
+    x = left + np.arange(traces) * (right - left) / traces
+    y = top + np.arange(samples) * (bottom - top) / samples
+    i = np.clip(np.floor(x + 0.5 + 1e-9).astype(np.intp), 0, image.shape[0] - 1)
+    j = np.clip(np.floor(y + 0.5 + 1e-9).astype(np.intp), 0, image.shape[1] - 1)
+    return image[i[:, np.newaxis], j]
+
+def composite(image, layer):
+    """
+    Blend an RGBA layer over an RGBA image, in-place
+    :param image: numpy array of uint8, of shape (..., 4)
+    :param layer: numpy array of uint8, same shape as image
+    """
+    alpha = layer[..., 3:].astype(np.float32) / 255
+    blended = image[..., :3] * (1 - alpha) + layer[..., :3] * alpha
+    image[..., :3] = np.rint(blended)
+
+class rgbacache(object):
+    """
+    Colormapped, composited images of the visible windows of a section
+    """
+    def __init__(self, cmap, vmin, vmax, size = 4):
+        """
+        :param cmap: colormap
+        :param vmin: float, value of the lowest colour
+        :param vmax: float, value of the highest colour
+        :param size: int, number of windows kept
+        """
+        self.cmap = cmap
+        self.vmin = vmin
+        self.vmax = vmax
+        self.size = size
+        # RGBA overlays, at the resolution of the decimated section
+        self.layers = []
+        self.images = collections.OrderedDict()
+
+    def clear(self):
+        self.images.clear()
+
+    def set_limits(self, vmin, vmax):
+        if (vmin, vmax) == (self.vmin, self.vmax): return
+        self.vmin, self.vmax = vmin, vmax
+        self.clear()
+
+    def set_cmap(self, cmap):
+        if cmap is self.cmap: return
+        self.cmap = cmap
+        self.clear()
+
+    def overlay(self, data, cmap, vmin, vmax, alpha):
+        """
+        Composite colormapped data over the section. Masked values are left
+        out
+        :param data: numpy array of the shape of the decimated section
+        """
+        self.layers.append(colormap(data, cmap, vmin, vmax, alpha))
+        self.clear()
+
+    def get(self, key, data, extent):
+        """
+        The image of a window, in the (samples, traces) layout imshow expects
+        :param key: the window, see section.pyramid.window
+        :param data: numpy array of shape (traces, samples)
+        :param extent: (left, right, bottom, top) of the window
+        :return: numpy array of uint8, of shape (samples, traces, 4)
+        """
+        if key in self.images:
+            self.images.move_to_end(key)
+            return self.images[key]
+
+        with timing.timed('colormap', **timing.array(data)):
+            image = colormap(data, self.cmap, self.vmin, self.vmax)
+            for layer in self.layers:
+                composite(image, resample(layer, extent, data.shape))
+            image = np.ascontiguousarray(image.transpose(1, 0, 2))
+
+        self.images[key] = image
+        while len(self.images) > self.size:
+            self.images.popitem(last = False)
+        return image
@@ -0,0 +1,163 @@
+import math
+import numpy as np
+
+def read(f, traces, samples):
+    """
+    Read a subset of the traces and samples of a segy file, one trace at a
+    time
+    :param f: open, memory mapped segyio file handle
+    :param traces: range of trace indices
+    :param samples: slice of samples
+    :return: numpy array of shape (len(traces), samples)
+    """
+    count = len(range(*samples.indices(len(f.samples))))
+
+    section = np.empty((len(traces), count), dtype = f.dtype)
+    for i, trace in enumerate(traces):
+        section[i] = f.trace[trace, samples]
+
+    return section
+
+def decimated(f, horizontal = 1, vertical = 1):
+    """
+    Read every horizontal-th trace and every vertical-th sample of a segy file.
+    The file is memory mapped and read one trace at a time, so memory use is
+    bounded by the size of the decimated section, not the size of the file
+    :param f: open segyio file handle
+    :param horizontal: int, keep every n trace
+    :param vertical: int, keep every n sample
+    :return: numpy array of shape (traces, samples)
+    """
+    f.mmap()
+
+    traces = range(0, f.tracecount, horizontal)
+    return read(f, traces, slice(None, None, vertical))
+
+def shape(f):
+    """
+    The full-resolution (traces, samples) shape of a segy file
+    :param f: open segyio file handle
+    :return: (int, int)
+    """
+    return f.tracecount, len(f.samples)
+
+def clamp(x, lo, hi):
+    return max(lo, min(x, hi))
+
+class pyramid(object):
+    """
+    Multi-resolution view of a section, for showing the visible window at
+    roughly screen resolution.
+
+    All coordinates are the display coordinates of the decimated section the
+    plotter was started with, where the point (x, y) covers traces
+    [x * horizontal, (x + 1) * horizontal) and similarly for samples, so
+    polygons are the same at any level.
+
+    Levels coarser than the decimated section are strided views of it.
+    Finer levels are read from the file, but only the visible window plus a
+    margin for panning
+    """
+    def __init__(self, f, base, horizontal = 1, vertical = 1, margin = 0.5):
+        """
+        :param f: open, memory mapped segyio file handle
+        :param base: the decimated section, see decimated()
+        :param horizontal: int, horizontal downsampling of base
+        :param vertical: int, vertical downsampling of base
+        :param margin: float, extra fraction of the window read on each side
+        """
+        self.f = f
+        self.shape = shape(f)
+        self.horizontal = horizontal
+        self.vertical = vertical
+        self.margin = margin
+
+        self.levels = [base]
+        while min(self.levels[-1].shape) > 1:
+            self.levels.append(self.levels[-1][::2, ::2])
+
+        self.cached = None
+
+    def extent(self, traces, samples):
+        """
+        The imshow extent, in display coordinates, of a level covering the
+        traces and samples ranges
+        :param traces: range of full-resolution traces
+        :param samples: range of full-resolution samples
+        :return: (left, right, bottom, top)
+        """
+        h, v = self.horizontal, self.vertical
+        right = traces.start + len(traces) * traces.step
+        bottom = samples.start + len(samples) * samples.step
+        return (traces.start / h - 0.5, right / h - 0.5,
+                bottom / v - 0.5, samples.start / v - 0.5)
+
+    def window(self, xlim, ylim, width, height, finer = True):
+        """
+        The level of detail for a visible window
+        :param xlim: (float, float), visible display x-range
+        :param ylim: (float, float), visible display y-range
+        :param width: int, width of the window in pixels
+        :param height: int, height of the window in pixels
+        :param finer: bool, read traces and samples finer than the decimated
+                      section from the file. If False, the finest level is
+                      the decimated section itself
+        :return: (key, data, extent) where data is (traces, samples), and
+                 key identifies the level and window, or None if the window
+                 is outside the section
+        """
+        h, v = self.horizontal, self.vertical
+        traces, samples = self.shape
+        x0, x1 = sorted(xlim)
+        y0, y1 = sorted(ylim)
+
+        t0 = clamp(int(math.floor((x0 + 0.5) * h)), 0, traces)
+        t1 = clamp(int(math.ceil((x1 + 0.5) * h)), 0, traces)
+        s0 = clamp(int(math.floor((y0 + 0.5) * v)), 0, samples)
+        s1 = clamp(int(math.ceil((y1 + 0.5) * v)), 0, samples)
+        if t0 >= t1 or s0 >= s1: return None
+
+        xstep = max(1, (t1 - t0) // max(1, int(width)))
+        ystep = max(1, (s1 - s0) // max(1, int(height)))
+
+        if (xstep >= h and ystep >= v) or not finer:
+            k = int(math.floor(min(math.log2(xstep / h), math.log2(ystep / v))))
+            k = max(0, min(k, len(self.levels) - 1))
+            xstep, ystep = h << k, v << k
+
+            i0, i1 = t0 // xstep, -(-t1 // xstep)
+            j0, j1 = s0 // ystep, -(-s1 // ystep)
+            data = self.levels[k][i0:i1, j0:j1]
+            tr = range(i0 * xstep, traces, xstep)[:i1 - i0]
+            sr = range(j0 * ystep, samples, ystep)[:j1 - j0]
+            return ('level', k, i0, i1, j0, j1), data, self.extent(tr, sr)
+
+        # align to the step, so that pans show the same traces
+        t0 -= t0 % xstep
+        s0 -= s0 % ystep
+
+        if not self.covers(xstep, ystep, t0, t1, s0, s1):
+            dt = int((t1 - t0) * self.margin)
+            ds = int((s1 - s0) * self.margin)
+            ta = max(0, t0 - dt - (t0 - dt) % xstep)
+            sa = max(0, s0 - ds - (s0 - ds) % ystep)
+            tr = range(ta, min(traces, t1 + dt), xstep)
+            sr = range(sa, min(samples, s1 + ds), ystep)
+
+            data = read(self.f, tr, slice(sr.start, sr.stop, sr.step))
+            self.cached = (tr, sr, data)
+
+        tr, sr, data = self.cached
+        i0, i1 = (t0 - tr.start) // xstep, -(-(t1 - tr.start) // xstep)
+        j0, j1 = (s0 - sr.start) // ystep, -(-(s1 - sr.start) // ystep)
+        tr, sr = tr[i0:i1], sr[j0:j1]
+
+        key = ('file', xstep, ystep, tr.start, len(tr), sr.start, len(sr))
+        return key, data[i0:i1, j0:j1], self.extent(tr, sr)
+
+    def covers(self, xstep, ystep, t0, t1, s0, s1):
+        if self.cached is None: return False
+        tr, sr, _ = self.cached
+        return (tr.step == xstep and sr.step == ystep
+            and tr.start <= t0 and t1 <= tr.stop
+            and sr.start <= s0 and s1 <= sr.stop)
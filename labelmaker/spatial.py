@@ -0,0 +1,103 @@
+import itertools
+import math
+from collections import defaultdict
+
+import numpy as np
+
+class gridindex(object):
+    """
+    Uniform grid of bounding boxes, for finding the polygons that may
+    contain a point without testing every polygon.
+
+    Every key is registered in all the cells its bounding box overlaps, so a
+    lookup only has to check the keys of a single cell. Keys are returned in
+    the order they were (last) inserted, which is also the order of the
+    plotter's polygon dict
+    """
+    def __init__(self, cellsize):
+        """
+        :param cellsize: (float, float), width and height of the grid cells
+        """
+        self.cellsize = cellsize
+        self.cells = defaultdict(set)
+        self.boxes = {}
+        self.order = itertools.count()
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __contains__(self, key):
+        return key in self.boxes
+
+    def cell(self, x, y):
+        dx, dy = self.cellsize
+        return int(math.floor(x / dx)), int(math.floor(y / dy))
+
+    def span(self, box):
+        w, n, e, s, _ = box
+        i0, j0 = self.cell(w, n)
+        i1, j1 = self.cell(e, s)
+        return itertools.product(range(i0, i1 + 1), range(j0, j1 + 1))
+
+    def insert(self, key, vertices):
+        """
+        Add key with the bounding box of vertices, or move it to the back if
+        it is already indexed
+        :param key: hashable, e.g. a matplotlib polygon
+        :param vertices: array_like of shape (n, 2)
+        """
+        if key in self.boxes: self.remove(key)
+
+        vertices = np.asarray(vertices, dtype=np.float64)
+        w, n = vertices.min(axis=0)
+        e, s = vertices.max(axis=0)
+
+        # pad a little, so that points on the boundary are not lost to
+        # rounding when the polygon is tested in display coordinates
+        dx, dy = self.cellsize
+        pad = 1e-6 * max(dx, dy)
+
+        box = (w - pad, n - pad, e + pad, s + pad, next(self.order))
+        self.boxes[key] = box
+        for cell in self.span(box):
+            self.cells[cell].add(key)
+
+    def remove(self, key):
+        """
+        Remove key from the index. Keys not in the index are ignored
+        :param key: hashable
+        """
+        box = self.boxes.pop(key, None)
+        if box is None: return
+
+        for cell in self.span(box):
+            keys = self.cells[cell]
+            keys.discard(key)
+            if not keys: del self.cells[cell]
+
+    def candidates(self, x, y):
+        """
+        The keys whose bounding box contain the point (x, y)
+        :param x: float
+        :param y: float
+        :return: list of keys, in insertion order
+        """
+        if x is None or y is None: return []
+
+        found = []
+        for key in self.cells.get(self.cell(x, y), ()):
+            w, n, e, s, order = self.boxes[key]
+            if w <= x <= e and n <= y <= s:
+                found.append((order, key))
+
+        return [key for _, key in sorted(found, key = lambda item: item[0])]
+
+def cellsize(shape, cells = 32):
+    """
+    Cell size that divides a section into roughly cells × cells cells
+    :param shape: (int, int), (traces, samples) of the displayed section
+    :param cells: int
+    :return: (float, float)
+    """
+    traces, samples = shape
+    return max(1.0, traces / cells), max(1.0, samples / cells)
@@ -0,0 +1,250 @@
+import os
+
+import numpy as np
+
+# Compact, binary polygon storage. Polygons are stored as flat arrays - all
+# vertices back to back, the offset of every polygon's first vertex, and the
+# class of every polygon - so that saving and loading is a handful of array
+# copies rather than one (json) object per vertex.
+#
+# There are two layouts:
+#  * .npz snapshots, written by save_npz, with the arrays x, y, vertices,
+#    offsets and classes, and for cubes also kinds and lines
+#  * .lmp journals, which are append-only logs of added and removed
+#    polygons, so that every edit can be saved by appending a small record
+
+KINDS = {None: 0, 'iline': 1, 'xline': 2}
+KIND_NAMES = {code: kind for kind, code in KINDS.items()}
+
+MAGIC = b'LMPOLYS1'
+HEADER = np.dtype([('magic', 'S8'), ('x', '<i4'), ('y', '<i4')])
+RECORD = np.dtype([('op', 'u1'),
+                   ('kind', 'u1'),
+                   ('pad', 'u1', 2),
+                   ('cls', '<i4'),
+                   ('id', '<i8'),
+                   ('line', '<i8'),
+                   ('count', '<i8')])
+
+ADD, REMOVE, CLASS = 1, 2, 3
+
+def grouped(x, y, entries):
+    """
+    Build the dict returned by read functions, see core.read_polys
+    :param entries: list of (kind, line number, vertices, class)
+    """
+    polys = {'x': int(x), 'y': int(y)}
+
+    if all(kind is None for kind, _, _, _ in entries):
+        polys['polygons'] = [(vertices, cls) for _, _, vertices, cls in entries]
+        return polys
+
+    lines = {}
+    for kind, lineno, vertices, cls in entries:
+        lines.setdefault((kind, lineno), []).append((vertices, cls))
+
+    polys['lines'] = [(kind, lineno, polygons)
+                      for (kind, lineno), polygons in lines.items()]
+    return polys
+
+def save_npz(path, entries, x, y):
+    """
+    Write polygons as a .npz snapshot
+    :param path: output path
+    :param entries: list of (kind, line number, vertices, class), where kind
+                    and line number are None outside cubes
+    :param x: int, horizontal downsampling
+    :param y: int, vertical downsampling
+    """
+    vertices = [np.asarray(v, dtype=np.float64).reshape(-1, 2)
+                for _, _, v, _ in entries]
+    offsets = np.cumsum([0] + [len(v) for v in vertices], dtype=np.int64)
+
+    if vertices: vertices = np.concatenate(vertices)
+    else: vertices = np.empty((0, 2), dtype=np.float64)
+
+    np.savez(path,
+             x = x,
+             y = y,
+             vertices = vertices,
+             offsets = offsets,
+             classes = np.array([cls for _, _, _, cls in entries], dtype=np.int32),
+             kinds = np.array([KINDS[kind] for kind, _, _, _ in entries], dtype=np.uint8),
+             lines = np.array([lineno or 0 for _, lineno, _, _ in entries], dtype=np.int64))
+
+def load_npz(path):
+    """
+    Read a .npz snapshot written by save_npz
+    :param path: path to the .npz file
+    :return: see core.read_polys
+    """
+    with np.load(path) as f:
+        vertices, offsets = f['vertices'], f['offsets']
+        classes, kinds, lines = f['classes'], f['kinds'], f['lines']
+        x, y = f['x'], f['y']
+
+    entries = []
+    for i, cls in enumerate(classes):
+        kind = KIND_NAMES[int(kinds[i])]
+        lineno = int(lines[i]) if kind is not None else None
+        entries.append((kind, lineno, vertices[offsets[i]:offsets[i + 1]], int(cls)))
+
+    return grouped(x, y, entries)
+
+def replay(path):
+    """
+    Replay a journal, and return the polygons that are left
+    :param path: path to the .lmp journal
+    :return: (x, y, dict of id -> (kind, line number, vertices, class),
+             end), the polygons in the order they were (last) added, and
+             end the offset after the last complete record
+    """
+    buf = np.fromfile(path, dtype=np.uint8)
+    if len(buf) < HEADER.itemsize:
+        raise ValueError('{} is not a polygon journal'.format(path))
+
+    header = buf[:HEADER.itemsize].view(HEADER)[0]
+    if header['magic'] != MAGIC:
+        raise ValueError('{} is not a polygon journal'.format(path))
+
+    polygons = {}
+    pos = end = HEADER.itemsize
+    while pos + RECORD.itemsize <= len(buf):
+        record = buf[pos:pos + RECORD.itemsize].view(RECORD)[0]
+        pos += RECORD.itemsize
+        op, key = int(record['op']), int(record['id'])
+
+        if op == ADD:
+            size = int(record['count']) * 2 * 8
+            # a record cut short by a crash is ignored
+            if pos + size > len(buf): break
+            vertices = buf[pos:pos + size].view(np.float64).reshape(-1, 2)
+            pos += size
+
+            kind = KIND_NAMES[int(record['kind'])]
+            lineno = int(record['line']) if kind is not None else None
+            polygons.pop(key, None)
+            polygons[key] = (kind, lineno, vertices, int(record['cls']))
+
+        elif op == REMOVE:
+            polygons.pop(key, None)
+
+        elif op == CLASS and key in polygons:
+            kind, lineno, vertices, _ = polygons[key]
+            polygons[key] = (kind, lineno, vertices, int(record['cls']))
+
+        end = pos
+
+    return int(header['x']), int(header['y']), polygons, end
+
+def load_journal(path):
+    """
+    Read the polygons left in a journal
+    :param path: path to the .lmp journal
+    :return: see core.read_polys
+    """
+    x, y, polygons, _ = replay(path)
+    return grouped(x, y, list(polygons.values()))
+
+class journal(object):
+    """
+    Append-only polygon log, for autosaving every edit cheaply. Every
+    polygon is identified by an integer id, which is handed out by add
+    """
+    def __init__(self, path, x, y):
+        """
+        Open the journal at path, or create it if it does not exist. The
+        polygons already in the journal are available in self.polygons, and
+        self.resumed is True if the journal existed
+        :param path: path to the .lmp journal
+        :param x: int, horizontal downsampling
+        :param y: int, vertical downsampling
+        """
+        self.path = path
+        self.polygons = {}
+        self.resumed = os.path.exists(path) and os.path.getsize(path) > 0
+
+        if self.resumed:
+            hori, vert, self.polygons, end = replay(path)
+            if (hori, vert) != (x, y):
+                raise ValueError('{} was saved with x={}, y={}, not x={}, y={}'
+                                 .format(path, hori, vert, x, y))
+            self.f = open(path, 'ab')
+            # a record cut short by a crash is dropped, or new records would
+            # be read as a part of it
+            self.f.truncate(end)
+        else:
+            self.f = open(path, 'wb')
+            self.f.write(np.array([(MAGIC, x, y)], dtype=HEADER).tobytes())
+            self.f.flush()
+
+        self.x, self.y = x, y
+        self.next = max(self.polygons, default = -1) + 1
+
+    def close(self):
+        self.f.close()
+
+    def write(self, op, key, cls = 0, kind = None, lineno = None, vertices = None):
+        count = 0 if vertices is None else len(vertices)
+        record = np.zeros(1, dtype=RECORD)
+        record[0] = (op, KINDS[kind], (0, 0), cls, key, lineno or 0, count)
+
+        self.f.write(record.tobytes())
+        if vertices is not None:
+            self.f.write(np.ascontiguousarray(vertices, dtype='<f8').tobytes())
+        self.f.flush()
+
+    def add(self, vertices, cls, kind = None, lineno = None, key = None):
+        """
+        Record an added polygon
+        :param vertices: array_like of shape (n, 2)
+        :param cls: int, class value
+        :param kind: 'iline', 'xline' or None
+        :param lineno: int, line number in a cube
+        :param key: int, id of a polygon that is added back, e.g. on undo
+        :return: int, the polygon id
+        """
+        if key is None:
+            key = self.next
+            self.next += 1
+
+        self.write(ADD, key, cls, kind, lineno, np.asarray(vertices).reshape(-1, 2))
+        return key
+
+    def remove(self, key):
+        """
+        Record a removed polygon
+        :param key: int, polygon id
+        """
+        self.write(REMOVE, key)
+
+    def setclass(self, key, cls):
+        """
+        Record a polygon changing class
+        :param key: int, polygon id
+        :param cls: int, the new class value
+        """
+        self.write(CLASS, key, cls)
+
+    def compact(self):
+        """
+        Rewrite the journal with only the polygons that are left
+        :return: dict of old id -> new id
+        """
+        self.f.close()
+        _, _, polygons, _ = replay(self.path)
+
+        tmp = self.path + '.tmp'
+        self.f = open(tmp, 'wb')
+        self.f.write(np.array([(MAGIC, self.x, self.y)], dtype=HEADER).tobytes())
+
+        ids = {}
+        for new, (old, (kind, lineno, vertices, cls)) in enumerate(polygons.items()):
+            self.write(ADD, new, cls, kind, lineno, vertices)
+            ids[old] = new
+
+        self.f.close()
+        os.replace(tmp, self.path)
+        self.f = open(self.path, 'ab')
+        self.next = len(ids)
+        return ids
@@ -0,0 +1,133 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Timing instrumentation. When enabled, with --profile or the environment
+# variable LABELMAKER_PROFILE, every timed() block appends one JSON object to
+# the trace file:
+#
+#   {"event": "export", "seconds": 1.2, "start": 1540000000.0,
+#    "peak_rss_kb": 81234, ...fields of the event}
+#
+# One action, e.g. "export" or "key:ctrl+e", can also be run under cProfile,
+# with --profile-action or LABELMAKER_PROFILE_ACTION. Its stats are dumped to
+# <trace>.<action>.prof, which can be read with pstats or snakeviz.
+#
+# When disabled, timed() does nothing but yield
+
+ENVIRONMENT = 'LABELMAKER_PROFILE'
+ENVIRONMENT_ACTION = 'LABELMAKER_PROFILE_ACTION'
+
+_state = {'trace': None, 'path': None, 'action': None}
+_lock = threading.Lock()
+
+def enable(path = None, action = None):
+    """
+    Start writing the timing trace. Arguments that are None are read from
+    the environment, and if there is no trace path timing stays disabled
+    :param path: path to the JSON-lines trace, which is appended to
+    :param action: str, event to profile with cProfile
+    """
+    path = path or os.environ.get(ENVIRONMENT)
+    action = action or os.environ.get(ENVIRONMENT_ACTION)
+    if not path: return
+
+    disable()
+    _state['trace'] = open(path, 'a')
+    _state['path'] = path
+    _state['action'] = action
+
+def disable():
+    with _lock:
+        if _state['trace'] is not None:
+            _state['trace'].close()
+        _state['trace'] = None
+        _state['path'] = None
+        _state['action'] = None
+
+def enabled():
+    return _state['trace'] is not None
+
+def peak_memory():
+    """
+    Peak resident memory of the process, in kB, or None if unknown
+    """
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kB
+    if sys.platform == 'darwin': peak //= 1024
+    return peak
+
+def array(x):
+    """
+    The fields that describe an array in the trace
+    :param x: numpy array
+    :return: dict
+    """
+    return {'shape': list(x.shape), 'dtype': str(x.dtype), 'bytes': int(x.nbytes)}
+
+def emit(record):
+    with _lock:
+        trace = _state['trace']
+        if trace is None: return
+        trace.write(json.dumps(record, default = str) + '\n')
+        trace.flush()
+
+@contextlib.contextmanager
+def timed(event, **fields):
+    """
+    Time a block, and write it to the trace. The yielded dict can be
+    updated with fields that are only known at the end of the block, e.g.
+    the size of an array that was read
+    :param event: str, name of the event
+    :param fields: fields of the event
+    """
+    if not enabled():
+        yield fields
+        return
+
+    profiler = None
+    if event == _state['action']:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    start, wall = time.perf_counter(), time.time()
+    if profiler is not None: profiler.enable()
+    try:
+        yield fields
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path(event))
+
+        record = {'event': event,
+                  'seconds': time.perf_counter() - start,
+                  'start': wall,
+                  'peak_rss_kb': peak_memory()}
+        record.update(fields)
+        emit(record)
+
+def wrapped(event, fn):
+    """
+    Time every call to fn, when timing is enabled
+    :param event: str, name of the event
+    :param fn: callable
+    :return: callable
+    """
+    def timed_fn(*args, **kwargs):
+        if not enabled(): return fn(*args, **kwargs)
+        with timed(event):
+            return fn(*args, **kwargs)
+    return timed_fn
+
+def profile_path(event):
+    safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in event)
+    return '{}.{}.prof'.format(_state['path'], safe)
@@ -1,18 +1,41 @@
-import math
+import numpy as np
+
+# batched queries against at least this many vertices use a KD-tree, when
+# scipy is available
+KDTREE_VERTICES = 1024
+
+# upper bound on the number of query × vertex distances computed at once
+BLOCK_SIZE = 1 << 20
+
+_kdtree = []
+
+def kdtree():
+    """
+    scipy's cKDTree, or None if scipy is not installed. scipy is slow to
+    import, so it is only imported when a KD-tree is first needed
+    """
+    if not _kdtree:
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            cKDTree = None
+        _kdtree.append(cKDTree)
+    return _kdtree[0]
 
 def within_tolerance(distance, dx, dy, threshold):
     """
     Verify if the distance is within the threshold given dx,dy
-    :param distance: float
+    :param distance: float or array of floats
     :param dx: float
     :param dy: float
     :param threshold: float
-    :return: boolean
+    :return: boolean, or array of booleans
     """
-    maxdx = math.pow((dx * threshold), 2)
-    maxdy = math.pow((dy * threshold), 2)
+    maxdx = np.square(dx * threshold)
+    maxdy = np.square(dy * threshold)
 
-    return distance < math.sqrt(maxdx + maxdy)
+    inside = np.asarray(distance) < np.sqrt(maxdx + maxdy)
+    return bool(inside) if inside.ndim == 0 else inside
 
 def axis_lengths(ax):
     """
@@ -38,20 +61,39 @@ def abslist(value, valuerange):
 def closest(x, y, xdata, ydata, dx, dy):
     """
     Returns the index of the sample that from xdata and ydata
-    that is closest to input x and y
-    :param x: double x-point
-    :param y: double y-point
+    that is closest to input x and y. x and y can be arrays of points, in
+    which case the closest sample is found for every point
+    :param x: double x-point, or array of x-points
+    :param y: double y-point, or array of y-points
     :param xdata: [list] range of x-points
     :param ydata: [list] range of y-points
     :param dx: x-axis length
     :param dy: y-axis length
-    :return: (index, distance)
+    :return: (index, distance), or (array of indices, array of distances)
     """
-    diff_xdata = [x/dx for x in abslist(x, xdata)]
-    diff_ydata = [y/dy for y in abslist(y, ydata)]
-    squared = [math.sqrt(pow(a, 2) + pow(b, 2)) for a, b in zip(diff_xdata, diff_ydata)]
+    xdata = np.asarray(xdata, dtype=np.float64)
+    ydata = np.asarray(ydata, dtype=np.float64)
+    scalar = np.ndim(x) == 0 and np.ndim(y) == 0
+    xs = np.atleast_1d(np.asarray(x, dtype=np.float64)).ravel()
+    ys = np.atleast_1d(np.asarray(y, dtype=np.float64)).ravel()
 
-    min_distance = min(squared)
-    return squared.index(min_distance), min_distance
+    if len(xs) > 1 and len(xdata) >= KDTREE_VERTICES and kdtree() is not None:
+        tree = kdtree()(np.column_stack([xdata / dx, ydata / dy]))
+        distance, index = tree.query(np.column_stack([xs / dx, ys / dy]))
+    else:
+        index = np.empty(len(xs), dtype=np.intp)
+        distance = np.empty(len(xs), dtype=np.float64)
+        block = max(1, BLOCK_SIZE // max(1, len(xdata)))
+        for i in range(0, len(xs), block):
+            qx = xs[i:i + block, np.newaxis]
+            qy = ys[i:i + block, np.newaxis]
+            diff_xdata = np.abs(xdata - qx) / dx
+            diff_ydata = np.abs(ydata - qy) / dy
+            squared = np.sqrt(diff_xdata ** 2 + diff_ydata ** 2)
 
+            nearest = squared.argmin(axis=1)
+            index[i:i + block] = nearest
+            distance[i:i + block] = squared[np.arange(len(nearest)), nearest]
 
+    if scalar: return int(index[0]), float(distance[0])
+    return index, distance
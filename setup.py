@@ -9,13 +9,16 @@ setup(name='labelmaker',
     author='Statoil ASA',
     author_email='fg_gpl@statoil.com',
     entry_points = {
-        'gui_scripts' : [ 'labelmaker = labelmaker:main' ]
+        'gui_scripts' : [ 'labelmaker = labelmaker:main' ],
+        'console_scripts' : [ 'labelmaker-batch = labelmaker.batch:main',
+                              'labelmaker-compare = labelmaker.compare:main' ],
     },
     packages=['labelmaker'],
     license='GPL-3.0',
     setup_requires=['pytest-runner', 'setuptools>=28', 'setuptools_scm'],
     tests_require=['pytest'],
     test_suite='pytest',
-    install_requires=['matplotlib', 'segyio>=1.4'],
+    install_requires=['matplotlib', 'numpy', 'segyio>=1.4'],
+    extras_require={'kdtree': ['scipy']},
     platforms='any',
 )
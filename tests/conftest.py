@@ -0,0 +1,75 @@
+import pytest
+
+import numpy as np
+import segyio
+
+from matplotlib import patches
+
+def mksegy(path, traces, samples, ilines = 1):
+    """
+    Write an inline-sorted segy file with ilines inlines of traces traces
+    each, with unique, increasing sample values
+    """
+    spec = segyio.spec()
+    spec.format = 5
+    spec.samples = list(range(samples))
+    spec.ilines = list(range(1, ilines + 1))
+    spec.xlines = list(range(1, traces + 1))
+    spec.offsets = [1]
+    spec.sorting = segyio.TraceSortingFormat.INLINE_SORTING
+
+    count = ilines * traces
+    data = np.arange(count * samples, dtype=np.single).reshape(count, samples)
+    with segyio.create(str(path), spec) as f:
+        for i in range(count):
+            f.header[i] = {
+                segyio.su.iline: 1 + i // traces,
+                segyio.su.xline: 1 + i % traces,
+                segyio.su.offset: 1,
+                segyio.su.cdp: i,
+            }
+        f.trace = data
+
+    return data
+
+@pytest.fixture
+def segyfile(tmpdir):
+    path = str(tmpdir.join('section.sgy'))
+    data = mksegy(path, 37, 53)
+    return path, data
+
+def mkpolys():
+    """
+    A few overlapping polygons, of the classes 3, 7 and 28
+    """
+    return {
+        patches.Polygon([(1, 1), (9, 2), (8, 15), (2, 12)]): 3,
+        patches.Polygon([(5, 5), (17, 4), (18, 20)]): 7,
+        patches.Polygon([(0.5, 20.2), (6.7, 25.1), (1.2, 25.9)]): 28,
+    }
+
+def random_polys(rng, count, width, height, integer = False, radius = None):
+    """
+    Random polygons of random classes, with vertices anywhere in width x
+    height, or within radius of a random centre
+    :param integer: bool, round the vertices to grid points
+    :return: dict of polygon -> class
+    """
+    polys = {}
+    for _ in range(count):
+        if radius is None:
+            n = rng.randint(3, 12)
+            x = rng.uniform(0, width - 1, n)
+            y = rng.uniform(0, height - 1, n)
+        else:
+            x0, y0 = rng.uniform(0, width), rng.uniform(0, height)
+            n = rng.randint(3, 8)
+            x = x0 + rng.uniform(-radius, radius, n)
+            y = y0 + rng.uniform(-radius, radius, n)
+
+        if integer:
+            # vertices on grid points exercise the edge and vertex cases
+            x, y = np.round(x), np.round(y)
+
+        polys[patches.Polygon(list(zip(x, y)))] = rng.randint(1, 29)
+    return polys
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import threading
+
+from labelmaker import background
+
+def test_task_reports_progress_and_result():
+    def work(n, progress):
+        for i in range(n): progress(i + 1, n)
+        return 'done'
+
+    task = background.task('count', work, 4).start()
+    assert task.wait(5)
+    assert task.state == 'done'
+    assert task.result == 'done'
+    assert (task.done, task.total) == (4, 4)
+
+def test_failure_is_kept():
+    def work(progress):
+        raise ValueError('broken')
+
+    task = background.task('export', work).start()
+    task.wait(5)
+    assert task.state == 'failed'
+    assert task.status() == 'export failed: broken'
+
+def test_cancel_stops_at_next_progress():
+    started = threading.Event()
+    def work(progress):
+        started.set()
+        while True: progress(0, 10)
+
+    task = background.task('export', work).start()
+    started.wait(5)
+    task.cancel()
+    assert task.wait(5)
+    assert task.state == 'cancelled'
+
+def test_new_task_supersedes_previous():
+    order = []
+    started = threading.Event()
+    def slow(progress):
+        started.set()
+        try:
+            while True: progress(0, 1)
+        finally:
+            order.append('slow')
+
+    def fast(progress):
+        order.append('fast')
+
+    first = background.task('export', slow).start()
+    started.wait(5)
+    second = background.task('export', fast, previous = first).start()
+    assert second.wait(5)
+
+    assert first.state == 'cancelled'
+    assert second.state == 'done'
+    # the first task stopped before the second started
+    assert order == ['slow', 'fast']
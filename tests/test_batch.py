@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import json
+import subprocess
+import sys
+
+import numpy as np
+import segyio
+
+from labelmaker.batch import main
+from labelmaker.core import mkoutput, read_polys
+from labelmaker.formats import reader
+
+from conftest import mksegy
+
+def savepolys(path, polygons, x = 1, y = 1):
+    poly_paths = [{'vertices': vertices, 'poly_class': cls}
+                  for vertices, cls in polygons]
+    with open(path, 'w') as f:
+        json.dump({'x': x, 'y': y, 'poly_paths': poly_paths}, f)
+
+def test_batch_export(tmpdir):
+    jobs = []
+    expected = {}
+    for i in range(3):
+        segy = str(tmpdir.join('section{}.sgy'.format(i)))
+        polys = str(tmpdir.join('polys-section{}.json'.format(i)))
+        mksegy(segy, 20 + i, 30)
+        polygons = [([[1, 1], [8, 2], [7 + i, 12]], 1 + i),
+                    ([[2, 5], [9, 5], [9, 14], [2, 14]], 10)]
+        savepolys(polys, polygons, x = 2, y = 2)
+        jobs += [segy, polys]
+        expected['section{}.sgy'.format(i)] = mkoutput(
+            read_polys(polys)['polygons'], (20 + i, 30), 2, 2)
+
+    out = tmpdir.mkdir('out')
+    assert main(['labelmaker-batch', '-j', '2', '-o', str(out)] + jobs) == 0
+
+    for name, labels in expected.items():
+        with segyio.open(str(out.join('labelmade-' + name))) as f:
+            assert np.array_equal(f.trace.raw[:], labels)
+
+    assert main(['labelmaker-batch', '-f', 'rle', '-o', str(out)] + jobs) == 0
+    for name, labels in expected.items():
+        rle = str(out.join('labelmade-' + name.replace('.sgy', '.rle')))
+        with reader(rle) as f:
+            assert np.array_equal(f.read(0, len(labels)), labels)
+
+def test_batch_reports_failures(tmpdir, capsys):
+    segy = str(tmpdir.join('section.sgy'))
+    mksegy(segy, 5, 5)
+    missing = str(tmpdir.join('missing.json'))
+
+    assert main(['labelmaker-batch', '-o', str(tmpdir), segy, missing]) == 1
+    assert 'failed' in capsys.readouterr().out
+
+def test_batch_does_not_import_matplotlib():
+    code = ('import sys, labelmaker.batch, labelmaker.core, labelmaker.compare; '
+            'sys.exit("matplotlib" in sys.modules)')
+    assert subprocess.call([sys.executable, '-c', code]) == 0
+
+def test_batch_export_cube_lines(tmpdir):
+    segy = str(tmpdir.join('cube.sgy'))
+    polys = str(tmpdir.join('polys-cube.json'))
+    mksegy(segy, 6, 10, ilines = 4)
+
+    square = [[0, 0], [5, 0], [5, 9], [0, 9]]
+    lines = [{'kind': 'iline', 'line': 2, 'poly_paths': [{'vertices': square, 'poly_class': 3}]},
+             {'kind': 'xline', 'line': 1, 'poly_paths': []}]
+    with open(polys, 'w') as f:
+        json.dump({'x': 1, 'y': 1, 'lines': lines}, f)
+
+    assert main(['labelmaker-batch', '-o', str(tmpdir), segy, polys]) == 0
+
+    with segyio.open(str(tmpdir.join('labelmade-cube.sgy'))) as f:
+        labels = f.trace.raw[:].reshape(4, 6, 10)
+
+    expected = np.zeros((4, 6, 10), dtype=np.single)
+    expected[1] = mkoutput([(np.array(square, dtype=float), 3)], (6, 10), 1, 1)
+    assert np.array_equal(labels, expected)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import json
+import os
+import subprocess
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+suite = os.path.join(root, 'benchmarks', 'suite.py')
+
+def bench(*args):
+    env = dict(os.environ, PYTHONPATH = root)
+    cmd = [sys.executable, suite, '--traces', '60', '--samples', '40',
+           '--polygons', '5', '--repeat', '1'] + list(args)
+    return subprocess.run(cmd, env = env, stdout = subprocess.PIPE,
+                          universal_newlines = True)
+
+def test_suite_flags_regressions(tmpdir):
+    baseline = str(tmpdir.join('baseline.json'))
+    assert bench('-o', baseline).returncode == 0
+
+    with open(baseline) as f:
+        results = json.load(f)
+    assert set(results['results']) >= {'startup', 'mkoutput', 'export', 'hit-testing'}
+
+    # pretend the baseline was a lot faster
+    for result in results['results'].values():
+        result['seconds'] /= 1000
+    with open(baseline, 'w') as f:
+        json.dump(results, f)
+
+    proc = bench('--only', 'mkoutput', '--baseline', baseline)
+    assert proc.returncode == 1
+    assert 'REGRESSION' in proc.stdout
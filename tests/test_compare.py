@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import json
+
+import numpy as np
+import segyio
+
+from labelmaker.compare import compare, confusion, disagreement, iou, main
+
+from conftest import mksegy
+
+def mklabels(path, labels):
+    mksegy(path, *labels.shape)
+    with segyio.open(path, 'r+', ignore_geometry=True) as f:
+        f.trace = labels.astype(np.single)
+
+@pytest.fixture
+def labelfiles(tmpdir):
+    rng = np.random.RandomState(3)
+    a = rng.randint(0, 4, (37, 53))
+    b = a.copy()
+    b[5:9, 10:20] = rng.randint(0, 6, (4, 10))
+    b[30] = 0
+
+    reference = str(tmpdir.join('reference.sgy'))
+    labels = str(tmpdir.join('labels.sgy'))
+    mklabels(reference, a)
+    mklabels(labels, b)
+    return reference, labels, a, b
+
+def test_confusion():
+    a = np.array([[0, 1, 1], [2, 2, 0]])
+    b = np.array([[0, 1, 2], [2, 0, 0]])
+    expected = [[2, 0, 0],
+                [0, 1, 1],
+                [1, 0, 1]]
+    assert confusion(a, b).tolist() == expected
+    assert confusion(a, b, classes = 4).shape == (4, 4)
+
+    ious = iou(confusion(a, b, classes = 4))
+    assert np.allclose(ious[:3], [2 / 3, 1 / 2, 1 / 3])
+    assert np.isnan(ious[3])
+
+@pytest.mark.parametrize('chunksize', [1, 7, 4096])
+def test_compare_streams(labelfiles, chunksize):
+    reference, labels, a, b = labelfiles
+    result = compare(reference, labels, chunksize = chunksize)
+
+    assert np.array_equal(result['confusion'], confusion(a, b))
+    assert np.allclose(result['disagreement'], (a != b).mean(axis=1))
+    assert result['disagreement'][0] == 0
+    assert result['disagreement'][30] > 0
+
+def test_compare_rejects_different_dimensions(tmpdir, labelfiles):
+    reference, _, _, _ = labelfiles
+    other = str(tmpdir.join('other.sgy'))
+    mksegy(other, 36, 53)
+    with pytest.raises(ValueError):
+        compare(reference, other)
+
+def test_decimated_disagreement(labelfiles):
+    reference, labels, a, b = labelfiles
+    assert np.array_equal(disagreement(reference, labels, 2, 3),
+                          (a != b)[::2, ::3])
+
+def test_compare_main(tmpdir, labelfiles):
+    reference, labels, a, b = labelfiles
+    output = str(tmpdir.join('compare.json'))
+
+    argv = ['labelmaker-compare', '-j', '2', '-o', output,
+            reference, labels, labels, labels]
+    assert main(argv) == 0
+
+    with open(output) as f:
+        results = json.load(f)
+
+    assert results[0]['confusion'] == confusion(a, b).tolist()
+    assert results[1]['disagreement'] == [0] * len(b)
+    assert all(x is None or x == 1 for x in results[1]['iou'])
+
+    assert main(['labelmaker-compare', reference, str(tmpdir.join('missing.sgy'))]) == 1
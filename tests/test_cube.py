@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import time
+import numpy as np
+import segyio
+
+from matplotlib import patches
+
+from labelmaker.cube import cube, slicecache
+from labelmaker.labelmaker import export_lines, mkoutput
+
+from conftest import mksegy
+
+@pytest.fixture
+def cubefile(tmpdir):
+    path = str(tmpdir.join('cube.sgy'))
+    data = mksegy(path, 7, 11, ilines = 5)
+    return path, data.reshape(5, 7, 11)
+
+def test_slicecache_evicts_least_recently_used():
+    cache = slicecache(3 * 80)
+    for key in 'abc':
+        cache.put(key, np.zeros(10))
+
+    assert cache.get('a') is not None
+    cache.put('d', np.zeros(10))
+    assert 'b' not in cache
+    assert all(key in cache for key in 'acd')
+
+    # an oversized slice is kept, but alone
+    cache.put('e', np.zeros(100))
+    assert len(cache) == 1
+    assert cache.size == 800
+
+def test_cube_lines(cubefile):
+    path, data = cubefile
+
+    with segyio.open(path) as f:
+        volume = cube(f, 2, 3)
+        try:
+            for i in range(5):
+                assert np.array_equal(volume.section('iline', i), data[i, ::2, ::3])
+                assert list(volume.traces('iline', i)) == list(range(i * 7, i * 7 + 7))
+
+            for i in range(7):
+                assert np.array_equal(volume.section('xline', i), data[::2, i, ::3])
+                assert list(volume.traces('xline', i)) == list(range(i, 35, 7))
+        finally:
+            volume.close()
+
+def test_cube_prefetches_neighbours(cubefile):
+    path, data = cubefile
+
+    with segyio.open(path) as f:
+        volume = cube(f, prefetch = 1)
+        try:
+            volume.section('xline', 3)
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                if ('xline', 2) in volume.cache and ('xline', 4) in volume.cache:
+                    break
+                time.sleep(0.01)
+
+            assert np.array_equal(volume.cache.get(('xline', 4)), data[:, 4, :])
+            assert np.array_equal(volume.cache.get(('xline', 2)), data[:, 2, :])
+        finally:
+            volume.close()
+
+def test_export_lines(tmpdir, cubefile):
+    path, data = cubefile
+    inline = {patches.Polygon([(0, 0), (6, 0), (6, 4), (0, 4)]): 2}
+    crossline = {patches.Polygon([(1, 2), (3, 2), (3, 9), (1, 9)]): 5}
+
+    with segyio.open(path) as f:
+        volume = cube(f)
+        lines = [(volume.traces('iline', 1), inline),
+                 (volume.traces('xline', 6), crossline)]
+        volume.close()
+
+    with tmpdir.as_cwd():
+        output = export_lines(path, lines, 1, 1)
+
+    with segyio.open(output) as f:
+        labels = f.trace.raw[:].reshape(5, 7, 11)
+
+    expected = np.zeros((5, 7, 11), dtype=np.single)
+    expected[1] = mkoutput(inline, (7, 11), 1, 1)
+    xline = mkoutput(crossline, (5, 11), 1, 1)
+    expected[:, 6][xline != 0] = xline[xline != 0]
+    assert np.array_equal(labels, expected)
+    assert labels[1, 6, 3] == 5 and labels[1, 5, 1] == 2
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import numpy as np
+import segyio
+
+from matplotlib import patches
+
+from labelmaker.labelmaker import export, mkoutput
+from labelmaker.render import chunks, polygons
+
+from conftest import mkpolys
+
+@pytest.mark.parametrize('chunksize, jobs', [(4096, 1), (5, 1), (1, 1), (6, 2)])
+def test_export_matches_mkoutput(tmpdir, segyfile, chunksize, jobs):
+    path, data = segyfile
+    polys = mkpolys()
+    expected = mkoutput(polys, data.shape, 2, 2)
+
+    with tmpdir.as_cwd():
+        export(path, polys, 2, 2, prefix = 'out-',
+               chunksize = chunksize, jobs = jobs)
+
+    with segyio.open(str(tmpdir.join('out-section.sgy'))) as out:
+        with segyio.open(path) as f:
+            assert np.array_equal(out.trace.raw[:], expected)
+            assert list(out.header) == list(f.header)
+            assert out.text[0] == f.text[0]
+
+def test_export_without_geometry(tmpdir):
+    from conftest import mksegy
+
+    path = str(tmpdir.join('unstructured.sgy'))
+    data = mksegy(path, 7, 11, ilines = 3)
+    with segyio.open(path, 'r+') as f:
+        f.header[4] = {segyio.su.xline: 2}
+    with pytest.raises(ValueError):
+        segyio.open(path).close()
+
+    polys = {patches.Polygon([(1, 1), (12, 2), (10, 9)]): 5}
+    with tmpdir.as_cwd():
+        export(path, polys, 1, 1, prefix = 'out-')
+
+    with segyio.open(str(tmpdir.join('out-unstructured.sgy')), ignore_geometry=True) as out:
+        assert np.array_equal(out.trace.raw[:], mkoutput(polys, data.shape, 1, 1))
+        assert out.header[4][segyio.su.xline] == 2
+
+def test_chunks_reassemble(segyfile):
+    _, data = segyfile
+    polys = polygons(mkpolys())
+    expected = mkoutput(polys, data.shape, 2, 2)
+
+    for chunksize in [1, 4, 100]:
+        parts = [(first, chunk.copy())
+                 for first, chunk in chunks(polys, data.shape, 2, 2, chunksize)]
+        assert all(len(chunk) <= chunksize for _, chunk in parts)
+        assert np.array_equal(np.concatenate([c for _, c in parts]), expected)
+
+@pytest.mark.parametrize('format, name', [('segy', 'out-section.sgy'),
+                                          ('npy', 'out-section.npy'),
+                                          ('rle', 'out-section.rle')])
+def test_stopped_export_leaves_no_partial_file(tmpdir, segyfile, format, name):
+    path, data = segyfile
+
+    def progress(done, total):
+        if done > 10: raise KeyboardInterrupt
+
+    def outputs():
+        return sorted(p.basename for p in tmpdir.listdir() if p.basename != 'section.sgy')
+
+    with tmpdir.as_cwd():
+        with pytest.raises(KeyboardInterrupt):
+            export(path, mkpolys(), 2, 2, prefix = 'out-', chunksize = 5,
+                   format = format, progress = progress)
+        assert outputs() == []
+
+        # an earlier export is kept as it was
+        export(path, {}, 2, 2, prefix = 'out-', format = format)
+        with pytest.raises(KeyboardInterrupt):
+            export(path, mkpolys(), 2, 2, prefix = 'out-', chunksize = 5,
+                   format = format, progress = progress)
+        assert outputs() == [name]
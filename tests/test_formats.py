@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import os
+import numpy as np
+import segyio
+
+from matplotlib import patches
+
+from labelmaker import formats
+from labelmaker.core import export, export_lines, mkoutput
+from labelmaker.compare import compare, disagreement
+from labelmaker.incremental import exporter
+
+from conftest import mksegy, mkpolys
+
+def mklabels(rng, traces, samples):
+    # mostly long constant runs, like real labels
+    labels = np.zeros((traces, samples), dtype=np.uint8)
+    for _ in range(20):
+        t0, s0 = rng.randint(0, traces), rng.randint(0, samples)
+        labels[t0:t0 + rng.randint(1, 10), s0:s0 + rng.randint(1, 30)] = rng.randint(1, 29)
+    return labels
+
+def test_encode_decode():
+    rng = np.random.RandomState(1)
+    labels = mklabels(rng, 40, 70)
+    runs, counts = formats.encode(labels)
+    assert len(counts) == 40
+    assert counts.sum() == len(runs)
+    assert (counts >= 1).all()
+    assert np.array_equal(formats.decode(runs, 70), labels)
+
+    assert formats.encode(np.zeros((3, 5)))[1].tolist() == [1, 1, 1]
+
+@pytest.mark.parametrize('format', ['npy', 'rle'])
+def test_lazy_trace_ranges(tmpdir, format):
+    rng = np.random.RandomState(2)
+    labels = mklabels(rng, 50, 60)
+    path = str(tmpdir.join('labels.' + format))
+
+    with formats.writer(path, labels.shape, format) as out:
+        for first in range(0, 50, 7):
+            out.write(first, labels[first:first + 7].astype(np.single))
+
+    with formats.reader(path) as f:
+        assert f.shape == labels.shape
+        assert np.array_equal(f.read(0, 50), labels)
+        for first, last in [(0, 1), (13, 29), (49, 50), (45, 100), (30, 30)]:
+            assert np.array_equal(f.read(first, last), labels[first:last])
+
+    if format == 'rle':
+        assert os.path.getsize(path) < labels.nbytes
+
+def test_labels_out_of_range():
+    with pytest.raises(ValueError):
+        formats.as_labels(np.array([1, 256], dtype=np.single))
+
+@pytest.mark.parametrize('format', ['segy', 'npy', 'rle'])
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_export_formats(tmpdir, segyfile, format, jobs):
+    path, data = segyfile
+    polys = mkpolys()
+    expected = mkoutput(polys, data.shape, 2, 2)
+
+    with tmpdir.as_cwd():
+        output = export(path, polys, 2, 2, prefix = 'out-', chunksize = 10,
+                        jobs = jobs, format = format)
+
+    assert os.path.basename(output) == 'out-section' + formats.FORMATS[format]
+    with formats.reader(output) as f:
+        assert np.array_equal(f.read(0, len(data)), expected)
+
+@pytest.mark.parametrize('format', ['npy', 'rle'])
+def test_export_lines_formats(tmpdir, format):
+    segy = str(tmpdir.join('cube.sgy'))
+    mksegy(segy, 6, 10, ilines = 4)
+
+    square = [(0, 0), (5, 0), (5, 9), (0, 9)]
+    lines = [(np.arange(6, 12), {patches.Polygon(square): 3}),
+             (np.arange(1, 24, 6), {patches.Polygon([(1, 2), (2, 2), (2, 4)]): 5})]
+
+    expected = np.zeros((24, 10), dtype=np.uint8)
+    for traces, polys in lines:
+        labels = mkoutput(polys, (len(traces), 10), 1, 1)
+        expected[traces] = np.where(labels != 0, labels, expected[traces])
+    assert set(np.unique(expected)) == {0, 3, 5}
+
+    with tmpdir.as_cwd():
+        output = export_lines(segy, lines, 1, 1, prefix = 'out-', format = format)
+
+    with formats.reader(output) as f:
+        assert np.array_equal(f.read(0, 24), expected)
+
+def test_incremental_npy(tmpdir, segyfile):
+    path, data = segyfile
+    polys = mkpolys()
+    ex = exporter(path, 1, 1, prefix = 'out-', format = 'npy')
+
+    with tmpdir.as_cwd():
+        output = ex.export(polys)
+        gone = list(polys)[1]
+        ex.removed(gone, gone.get_xy())
+        del polys[gone]
+        ex.export(polys)
+
+    assert np.array_equal(np.load(output), mkoutput(polys, data.shape, 1, 1))
+
+def test_compare_across_formats(tmpdir, segyfile):
+    path, data = segyfile
+    polys = mkpolys()
+
+    with tmpdir.as_cwd():
+        segy = export(path, polys, 1, 1, prefix = 'a-')
+        rle = export(path, polys, 1, 1, prefix = 'b-', format = 'rle')
+        del polys[list(polys)[0]]
+        npy = export(path, polys, 1, 1, prefix = 'c-', format = 'npy')
+
+    assert compare(segy, rle)['disagreement'].sum() == 0
+    assert compare(segy, npy)['disagreement'].sum() > 0
+
+    with formats.reader(segy) as a, formats.reader(npy) as b:
+        expected = (a.read(0, 37) != b.read(0, 37))[::2, ::3]
+    assert np.array_equal(disagreement(segy, npy, 2, 3), expected)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import os
+import numpy as np
+import segyio
+
+from matplotlib import patches
+
+from labelmaker.incremental import exporter, labellayer, merged
+from labelmaker.labelmaker import mkoutput
+
+from conftest import random_polys
+
+def exported(path):
+    with segyio.open(path, ignore_geometry=True) as f:
+        return f.trace.raw[:]
+
+@pytest.mark.parametrize('xscale, yscale', [(1, 1), (2, 3)])
+def test_patched_export_matches_full_export(tmpdir, capsys, segyfile, xscale, yscale):
+    path, data = segyfile
+    rng = np.random.RandomState(5)
+    width = data.shape[0] // xscale
+    height = data.shape[1] // yscale
+
+    ex = exporter(path, xscale, yscale, prefix = 'out-')
+    polys = random_polys(rng, 6, width, height, radius = 4)
+    for poly in polys: ex.changed(poly, poly.get_xy())
+
+    with tmpdir.as_cwd():
+        output = ex.export(polys)
+        assert np.array_equal(exported(output), mkoutput(polys, data.shape, xscale, yscale))
+
+        for _ in range(5):
+            # remove one, recolour one, and add a couple
+            gone = list(polys)[rng.randint(len(polys))]
+            ex.removed(gone, gone.get_xy())
+            del polys[gone]
+
+            recoloured = list(polys)[rng.randint(len(polys))]
+            polys[recoloured] = rng.randint(1, 29)
+            ex.changed(recoloured, recoloured.get_xy())
+
+            for poly, cls in random_polys(rng, 2, width, height, radius = 4).items():
+                polys[poly] = cls
+                ex.changed(poly, poly.get_xy())
+
+            capsys.readouterr()
+            assert ex.export(polys) == output
+            assert 'patching region' in capsys.readouterr().out
+            expected = mkoutput(polys, data.shape, xscale, yscale)
+            assert np.array_equal(exported(output), expected)
+
+def test_changed_output_is_exported_in_full(tmpdir, segyfile):
+    path, data = segyfile
+    ex = exporter(path, 1, 1, prefix = 'out-')
+    poly = patches.Polygon([(2, 2), (10, 2), (10, 10)])
+    polys = {poly: 4}
+
+    with tmpdir.as_cwd():
+        output = ex.export(polys)
+
+        with segyio.open(output, 'r+', ignore_geometry=True) as f:
+            f.trace[20] = np.full(data.shape[1], 9, dtype=np.single)
+        os.utime(output, ns = (0, 0))
+
+        ex.removed(poly, poly.get_xy())
+        ex.export({})
+        assert not exported(output).any()
+
+def test_merged_boxes_are_disjoint():
+    boxes = [(0, 0, 4, 4), (3, 3, 6, 6), (10, 10, 12, 12), (5, 0, 7, 2)]
+    assert sorted(merged(boxes)) == [(0, 0, 7, 6), (10, 10, 12, 12)]
+
+def test_stopped_patch_is_resumed(tmpdir, segyfile):
+    path, data = segyfile
+    rng = np.random.RandomState(3)
+    ex = exporter(path, 1, 1, prefix = 'out-')
+    polys = random_polys(rng, 4, *data.shape, radius = 4)
+
+    with tmpdir.as_cwd():
+        output = ex.export(polys)
+
+        for _ in range(3):
+            x, y = rng.uniform(0, data.shape[0]), rng.uniform(0, data.shape[1])
+            poly = patches.Polygon([(x, y), (x + 2, y), (x + 2, y + 2), (x, y + 2)])
+            polys[poly] = 9
+            ex.changed(poly, poly.get_xy())
+        regions = len(merged(ex.dirty))
+        before = exported(output)
+
+        def progress(done, total):
+            if done == 1: raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            ex.export(polys, progress = progress)
+        # the stopped patch is not written, and its regions are kept
+        assert len(ex.taken) == 1 and len(merged(ex.taken[0])) == regions
+        assert ex.current()
+        assert sorted(os.listdir('.')) == ['out-section.sgy', 'section.sgy']
+        assert np.array_equal(exported(output), before)
+
+        assert ex.export(polys) == output
+        assert ex.dirty == [] and ex.taken == []
+        assert np.array_equal(exported(output), mkoutput(polys, data.shape, 1, 1))
+        assert sorted(os.listdir('.')) == ['out-section.sgy', 'section.sgy']
+
+def test_label_layer_follows_edits():
+    rng = np.random.RandomState(7)
+    shape = (60, 50)
+    colours = np.zeros((256, 4), dtype = np.uint8)
+    colours[:, 0] = np.arange(256)
+    colours[1:, 3] = 127
+
+    layer = labellayer(shape, colours)
+    polys = random_polys(rng, 8, *shape, radius = 4)
+    for poly in polys: layer.changed(poly, poly.get_xy())
+    assert layer.update(polys) != []
+
+    for _ in range(4):
+        gone = list(polys)[rng.randint(len(polys))]
+        del polys[gone]
+        layer.removed(gone, gone.get_xy())
+
+        recoloured = list(polys)[rng.randint(len(polys))]
+        polys[recoloured] = rng.randint(1, 29)
+        layer.changed(recoloured, recoloured.get_xy())
+
+        layer.update(polys)
+        expected = mkoutput(polys, shape, 1, 1)
+        assert np.array_equal(layer.labels, expected)
+        assert np.array_equal(layer.rgba[..., 0], expected.T)
+        assert np.array_equal(layer.rgba[..., 3] > 0, expected.T > 0)
+
+    assert layer.update(polys) == []
+
+def test_masks_of_removed_polygons_are_not_kept(segyfile):
+    path, data = segyfile
+    ex = exporter(path, 1, 1)
+    ex.shape = data.shape
+    a, b = random_polys(np.random.RandomState(3), 2, 40, 40, radius = 4)
+    for poly in (a, b): ex.changed(poly, poly.get_xy())
+
+    ex.mask(a, a.get_xy())
+    assert ex.masks[a] is not None and ex.masks[b] is None
+
+    # an export of a snapshot may render polygons removed since
+    ex.removed(a, a.get_xy())
+    ex.removed(b, b.get_xy())
+    corner, inside = ex.mask(b, b.get_xy())
+    assert inside.any()
+    assert ex.masks == {}
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import contextlib
+import numpy as np
+import segyio
+
+import matplotlib.pyplot as plt
+from matplotlib.backend_bases import KeyEvent, MouseEvent
+from matplotlib.image import AxesImage
+
+from labelmaker.labelmaker import plotter, parser
+from labelmaker.core import read_polys, mkoutput
+from labelmaker.section import decimated, shape, pyramid
+from labelmaker.cube import cube
+from labelmaker import rgba
+from labelmaker import store
+
+@pytest.fixture
+def mkgui(monkeypatch, segyfile):
+    # start plotters with extra command line arguments, on the segyfile or
+    # on path. The section is read like main does, with a pyramid if lod,
+    # or is traces. Files are kept open until the test ends
+    plt.switch_backend('Agg')
+    monkeypatch.setattr(plt, 'show', lambda *args, **kwargs: None)
+
+    with contextlib.ExitStack() as files:
+        def mkgui(*options, path = None, traces = None, stats = None, lod = False):
+            args = parser().parse_args([path or segyfile[0]] + list(options))
+            dims, levels, volume = None, None, None
+
+            if traces is None:
+                f = files.enter_context(segyio.open(args.input,
+                                                    ignore_geometry = not args.cube))
+                if args.cube:
+                    volume = cube(f, args.horizontal, args.vertical)
+                    files.callback(volume.close)
+                    traces = volume.section('iline', 0)
+                    dims = (len(volume.traces('iline', 0)), len(f.samples))
+                else:
+                    traces = decimated(f, args.horizontal, args.vertical)
+                    dims = shape(f)
+                if lod:
+                    levels = pyramid(f, traces, args.horizontal, args.vertical)
+
+            p = plotter(args, traces, dims or traces.shape, levels,
+                        cube = volume, stats = stats)
+            p.run()
+            p.canvas.draw()
+            return p
+
+        yield mkgui
+    plt.close('all')
+
+@pytest.fixture
+def gui(mkgui):
+    return mkgui()
+
+def click(p, x, y):
+    px, py = p.ax.transData.transform((x, y))
+    event = MouseEvent('button_release_event', p.canvas, px, py, button=1)
+    p.canvas.callbacks.process('button_release_event', event)
+
+def key(p, k, x = 1, y = 1):
+    px, py = p.ax.transData.transform((x, y))
+    event = KeyEvent('key_press_event', p.canvas, k, px, py)
+    p.canvas.callbacks.process('key_press_event', event)
+
+def square(p, x0, y0, x1, y1):
+    for x, y in [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]:
+        click(p, x, y)
+    key(p, 'enter')
+
+def export(p):
+    # exports run in the background, which the timer would poll
+    key(p, 'ctrl+e')
+    p.task.wait()
+    p.onprogress()
+
+@pytest.fixture
+def imagedraws(monkeypatch):
+    draws = []
+    draw = AxesImage.draw
+    def counted(self, *args, **kwargs):
+        draws.append(self)
+        return draw(self, *args, **kwargs)
+    monkeypatch.setattr(AxesImage, 'draw', counted)
+    return draws
+
+def test_editing_does_not_redraw_section(gui, imagedraws):
+    for x, y in [(2, 2), (10, 2), (10, 10)]:
+        click(gui, x, y)
+    key(gui, 'z')
+    click(gui, 2, 10)
+    key(gui, 'enter')
+    key(gui, 'escape')
+
+    assert len(gui.polys) == 1
+    assert imagedraws == []
+
+def test_removing_polygon_redraws(gui, imagedraws):
+    square(gui, 2, 2, 10, 10)
+    key(gui, 'd', 5, 5)
+
+    assert gui.polys == {}
+    assert len(imagedraws) == 1
+
+def test_set_class(gui):
+    square(gui, 2, 2, 10, 10)
+    key(gui, 'ctrl+3', 5, 5)
+    assert list(gui.polys.values()) == [13]
+
+def test_hit_testing_follows_removal_and_undo(gui):
+    square(gui, 2, 2, 10, 10)
+    square(gui, 6, 6, 14, 14)
+    first, second = list(gui.polys)
+
+    key(gui, 'd', 8, 8)
+    assert list(gui.polys) == [second]
+    key(gui, 'u')
+    assert list(gui.polys) == [second, first]
+
+    # the overlap belongs to both, and the first match is removed
+    key(gui, 'd', 8, 8)
+    assert list(gui.polys) == [first]
+    key(gui, '4', 8, 8)
+    assert gui.polys[first] == 4
+
+    key(gui, 'e', 3, 3)
+    assert gui.polys == {}
+    assert len(gui.index) == 0
+    assert gui.current_poly_class == 4
+
+def test_reexport_patches_edits(gui, tmpdir, capsys):
+    with tmpdir.as_cwd():
+        square(gui, 2, 2, 10, 10)
+        square(gui, 20, 20, 30, 30)
+        export(gui)
+
+        key(gui, 'd', 25, 25)
+        key(gui, 'u')
+        key(gui, '7', 5, 5)
+        square(gui, 8, 8, 12, 40)
+        capsys.readouterr()
+        export(gui)
+        assert 'patching region' in capsys.readouterr().out
+
+        with segyio.open('labelmade-section.sgy', ignore_geometry=True) as f:
+            labels = f.trace.raw[:]
+
+    assert np.array_equal(labels, mkoutput(gui.polys, gui.shape, 1, 1))
+    assert set(np.unique(labels)) == {0, 1, 7}
+
+@pytest.fixture
+def held(gui, monkeypatch):
+    # exports wait for the event to be set, so that they can be superseded
+    # and cancelled while they run
+    import threading
+    release = threading.Event()
+    export = gui.exporter.export
+    def held(*args, progress):
+        while not release.wait(0.01): progress(0, 1)
+        return export(*args, progress = progress)
+    monkeypatch.setattr(gui.exporter, 'export', held)
+    return release
+
+def test_new_export_supersedes_running(gui, held, tmpdir, capsys):
+    with tmpdir.as_cwd():
+        square(gui, 2, 2, 10, 10)
+        key(gui, 'ctrl+e')
+        first = gui.task
+
+        # labelling goes on during the export, and is in the next export
+        square(gui, 20, 20, 30, 30)
+        key(gui, 'ctrl+e')
+        assert 'Superseding the running export' in capsys.readouterr().out
+
+        held.set()
+        gui.task.wait()
+        gui.onprogress()
+        assert first.state == 'cancelled'
+        assert gui.task.state == 'done'
+        assert gui.status.get_text() == 'export: done'
+
+        with segyio.open('labelmade-section.sgy', ignore_geometry=True) as f:
+            labels = f.trace.raw[:]
+        assert sorted(p.basename for p in tmpdir.listdir()) == ['labelmade-section.sgy', 'section.sgy']
+
+    assert np.array_equal(labels, mkoutput(gui.polys, gui.shape, 1, 1))
+
+def test_superseded_patch_keeps_edits(gui, held, tmpdir):
+    with tmpdir.as_cwd():
+        square(gui, 2, 2, 10, 10)
+        held.set()
+        export(gui)
+        held.clear()
+
+        square(gui, 20, 20, 30, 30)
+        key(gui, 'ctrl+e')
+        square(gui, 8, 8, 12, 40)
+        key(gui, 'ctrl+e')
+        snapshot = dict(gui.polys)
+
+        # changed after the export started, so left for the next one
+        square(gui, 14, 2, 18, 8)
+        held.set()
+        gui.task.wait()
+        with segyio.open('labelmade-section.sgy', ignore_geometry=True) as f:
+            assert np.array_equal(f.trace.raw[:],
+                                  mkoutput(snapshot, gui.shape, 1, 1))
+
+        export(gui)
+        with segyio.open('labelmade-section.sgy', ignore_geometry=True) as f:
+            labels = f.trace.raw[:]
+
+    assert np.array_equal(labels, mkoutput(gui.polys, gui.shape, 1, 1))
+
+def test_cancel_export(gui, held, tmpdir, capsys):
+    with tmpdir.as_cwd():
+        square(gui, 2, 2, 10, 10)
+        key(gui, 'ctrl+e')
+        key(gui, 'ctrl+x')
+        gui.task.wait()
+        gui.onprogress()
+        assert 'Export cancelled' in capsys.readouterr().out
+        assert [p.basename for p in tmpdir.listdir()] == ['section.sgy']
+
+        # the cancelled changes are exported next time
+        held.set()
+        export(gui)
+        with segyio.open('labelmade-section.sgy', ignore_geometry=True) as f:
+            assert np.array_equal(f.trace.raw[:], mkoutput(gui.polys, gui.shape, 1, 1))
+
+def test_fill_adds_region_as_polygon(mkgui):
+    # a horizon, slightly noisy, in an otherwise smooth section
+    rng = np.random.RandomState(0)
+    traces = np.tile(np.linspace(-1, 1, 30), (40, 1))
+    traces[:, 12:15] = 5 + rng.uniform(-0.1, 0.1, (40, 3))
+
+    p = mkgui('--clip', '100', traces = traces, stats = {'min': -1.0, 'max': 5.0})
+
+    key(p, '4', 20, 13)
+    key(p, 'b', 20, 13)
+    assert list(p.polys.values()) == [4]
+    horizon = np.zeros(traces.shape)
+    horizon[:, 12:15] = 4
+    assert np.array_equal(mkoutput(p.polys, traces.shape, 1, 1), horizon)
+
+    # the fill is bounded to the visible window
+    key(p, 'd', 20, 13)
+    p.ax.set_xlim(9.5, 19.5)
+    key(p, 'b', 12, 13)
+    horizon[:10] = horizon[20:] = 0
+    assert np.array_equal(mkoutput(p.polys, traces.shape, 1, 1), horizon)
+
+def test_raster_labels_draw_polygons_in_the_section(mkgui, imagedraws):
+    p = mkgui('--raster-labels')
+    square(p, 2, 2, 10, 10)
+    square(p, 6, 6, 14, 14)
+    first, second = list(p.polys)
+    assert not first.get_visible() and not second.get_visible()
+    p.canvas.draw()
+    assert np.array_equal(p.layer.labels, mkoutput(p.polys, p.shape, 1, 1))
+
+    # the hidden patches are still hit tested
+    key(p, 'd', 8, 8)
+    key(p, '4', 12, 12)
+    assert p.polys == {second: 4}
+    key(p, 'u')
+
+    # the polygons are composited into the section image
+    del imagedraws[:]
+    p.canvas.draw()
+    labels = mkoutput(p.polys, p.shape, 1, 1)
+    assert np.array_equal(p.layer.labels, labels)
+    assert imagedraws == [p.image]
+    section = p.raster.get(*p.window)
+    shown = np.any(p.image.get_array() != section, axis = -1)
+    assert np.array_equal(shown, labels.T > 0)
+
+def test_clip_adjusts_without_rescan(gui, monkeypatch):
+    from labelmaker import preview
+
+    assert gui.clip == 99.5
+    full = gui.image.get_clim()
+
+    def rescan(*args, **kwargs):
+        raise AssertionError('statistics recomputed')
+    monkeypatch.setattr(preview, 'statistics', rescan)
+
+    key(gui, '[')
+    key(gui, '[')
+    assert gui.clip == 98
+    vmin, vmax = gui.image.get_clim()
+    assert full[0] < vmin < vmax < full[1]
+
+    for _ in range(10): key(gui, ']')
+    assert gui.clip == 100
+    assert gui.image.get_clim() == (gui.traces.min(), gui.traces.max())
+
+def test_zoom_swaps_level_of_detail(mkgui):
+    p = mkgui('-x', '4', '-y', '4', lod = True)
+    assert p.image.get_array().shape == p.traces.T.shape + (4,)
+
+    p.ax.set_xlim(2, 4)
+    p.ax.set_ylim(4, 2)
+    zoomed = p.image.get_array()
+    assert zoomed.shape[0] > 4 and zoomed.shape[1] > 4
+    assert p.ax.get_xlim() == (2, 4)
+
+def test_first_frame_is_at_screen_resolution(mkgui, monkeypatch, tmpdir):
+    from conftest import mksegy
+
+    path = str(tmpdir.join('big.sgy'))
+    mksegy(path, 400, 300)
+    monkeypatch.setitem(plt.rcParams, 'figure.figsize', (2, 2))
+    p = mkgui(path = path, lod = True)
+
+    # the view is the whole section, shown from a coarser level
+    assert p.image.get_array().shape == (150, 200, 4)
+    assert p.ax.get_xlim() == (-0.5, 399.5)
+    assert p.ax.get_ylim() == (299.5, -0.5)
+    assert p.level[:2] == ('level', 1)
+
+def test_cube_navigation_keeps_polygons_per_line(mkgui, tmpdir):
+    from conftest import mksegy
+
+    path = str(tmpdir.join('cube.sgy'))
+    mksegy(path, 7, 11, ilines = 5)
+    p = mkgui('--cube', path = path)
+
+    square(p, 1, 1, 4, 4)
+    key(p, 'pagedown')
+    assert p.current_line == ('iline', 1)
+    assert p.polys == {}
+    assert len(p.ax.patches) == 0
+
+    key(p, 't', 3, 3)
+    assert p.current_line == ('xline', 3)
+    assert p.image.get_array().shape == (11, 5, 4)
+    square(p, 0, 0, 2, 2)
+
+    key(p, 'pageup')
+    key(p, 'pageup')
+    assert p.current_line == ('xline', 1)
+    key(p, 't', 0, 0)
+    assert p.current_line == ('iline', 0)
+    assert len(p.polys) == 1 and len(p.ax.patches) == 1
+
+    with tmpdir.as_cwd():
+        key(p, 'ctrl+p')
+        p.load_polys('polys-cube.json')
+    assert len(p.linepolys[('xline', 3)]) == 2
+
+def test_autosave_resumes_session(mkgui, tmpdir):
+    with tmpdir.as_cwd():
+        p = mkgui('--autosave')
+        square(p, 2, 2, 10, 10)
+        square(p, 20, 20, 30, 30)
+        square(p, 12, 12, 15, 15)
+        key(p, 'd', 25, 25)
+        key(p, '5', 13, 13)
+        key(p, 'd', 5, 5)
+        key(p, 'u')
+        expected = [(poly.get_xy(), cls) for poly, cls in p.polys.items()]
+        assert [cls for _, cls in expected] == [5, 1]
+        p.journal.close()
+
+        p = mkgui('--autosave')
+        resumed = [(poly.get_xy(), cls) for poly, cls in p.polys.items()]
+        assert len(resumed) == len(expected)
+        for (va, ca), (vb, cb) in zip(resumed, expected):
+            assert ca == cb and np.array_equal(va, vb)
+
+        # ctrl+p compacts the journal, and keeps tracking the polygons
+        key(p, 'ctrl+p')
+        key(p, 'd', 13, 13)
+        p.journal.close()
+        assert [cls for _, cls in read_polys('polys-section.lmp')['polygons']] == [1]
+        assert [cls for _, cls in read_polys('polys-section.json')['polygons']] == [5, 1]
+
+def test_autosave_loads_polygons_once(mkgui, tmpdir, capsys):
+    def session():
+        p = mkgui('--autosave', '-l', 'saved.lmp')
+        p.journal.close()
+        return p
+
+    with tmpdir.as_cwd():
+        saved = store.journal('saved.lmp', 1, 1)
+        saved.add([(2, 2), (10, 2), (10, 10)], 3)
+        saved.close()
+
+        # the loaded polygons are journaled, and resumed next time instead
+        assert list(session().polys.values()) == [3]
+        capsys.readouterr()
+        assert list(session().polys.values()) == [3]
+        assert 'Not loading saved.lmp' in capsys.readouterr().out
+        assert [cls for _, cls in read_polys('polys-section.lmp')['polygons']] == [3]
+
+def test_compare_shows_disagreement(mkgui, tmpdir, segyfile, capsys):
+    path, data = segyfile
+
+    reference = str(tmpdir.join('reference.sgy'))
+    labels = str(tmpdir.join('labels.sgy'))
+    a = np.zeros(data.shape, dtype=np.single)
+    a[10:20, 5:15] = 1
+    b = a.copy()
+    b[12:14, 5:15] = 2
+
+    with segyio.open(path, ignore_geometry=True) as f:
+        spec = segyio.tools.metadata(f)
+    for fname, out in [(reference, a), (labels, b)]:
+        with segyio.create(fname, spec) as f:
+            f.trace = out
+
+    p = mkgui('-d', reference, '-d', labels, '-x', '2')
+
+    # the disagreement is composited into the image
+    overlay = p.raster.layers[-1]
+    assert np.array_equal(overlay[..., 3] > 0, (a != b)[::2])
+    assert len(p.ax.get_images()) == 1
+
+    section = rgba.colormap(p.traces, p.raster.cmap, p.raster.vmin, p.raster.vmax)
+    changed = np.any(p.image.get_array() != section.transpose(1, 0, 2), axis = 2)
+    assert np.array_equal(changed, (a != b)[::2].T)
+    assert 'traces that disagree: 2 of 37' in capsys.readouterr().out
+
+def test_redraws_reuse_the_colormapped_image(gui, monkeypatch):
+    image = gui.image.get_array()
+    assert image.dtype == np.uint8
+
+    calls = []
+    colormap = rgba.colormap
+    monkeypatch.setattr(rgba, 'colormap', lambda *args: calls.append(args) or colormap(*args))
+
+    for _ in range(3): gui.canvas.draw()
+    assert calls == []
+    assert gui.image.get_array() is image
+
+    key(gui, '[')
+    assert len(calls) == 1
+    assert gui.image.get_array() is not image
+
+    # the readout is the amplitude, not the colour
+    px, py = gui.ax.transData.transform((3, 5))
+    event = MouseEvent('motion_notify_event', gui.canvas, px, py)
+    assert gui.image.get_cursor_data(event) == gui.traces[3, 5]
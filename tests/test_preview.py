@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import os
+import numpy as np
+import segyio
+
+from labelmaker import preview
+from labelmaker.section import decimated
+
+from conftest import mksegy
+
+def load(path, cache, h = 1, v = 1):
+    with segyio.open(path, ignore_geometry=True) as f:
+        return preview.load(f, path, h, v, cache)
+
+def test_warm_load_is_memory_mapped(tmpdir, segyfile):
+    path, data = segyfile
+    cache = preview.previewcache(str(tmpdir.join('cache')))
+
+    cold, stats = load(path, cache, 2, 3)
+    assert np.array_equal(cold, data[::2, ::3])
+    assert stats == preview.statistics(data[::2, ::3])
+    assert stats['min'] == data[::2, ::3].min()
+    assert stats['max'] == data[::2, ::3].max()
+
+    warm, cached = load(path, cache, 2, 3)
+    assert isinstance(warm, np.memmap)
+    assert np.array_equal(warm, cold)
+    assert cached == stats
+
+    # other decimations are other entries
+    assert cache.get(path, 1, 1) is None
+
+def test_changed_file_is_not_served(tmpdir, segyfile):
+    path, data = segyfile
+    cache = preview.previewcache(str(tmpdir.join('cache')))
+    load(path, cache)
+
+    with segyio.open(path, 'r+', ignore_geometry=True) as f:
+        f.trace[0] = np.full(data.shape[1], -1, dtype=np.single)
+    st = os.stat(path)
+    os.utime(path, ns = (st.st_atime_ns, st.st_mtime_ns + 1000))
+
+    assert cache.get(path, 1, 1) is None
+    section, stats = load(path, cache)
+    assert section[0, 0] == -1
+    assert stats['min'] == -1
+
+def test_least_recently_used_is_evicted(tmpdir):
+    paths = []
+    for i in range(3):
+        path = str(tmpdir.join('section{}.sgy'.format(i)))
+        mksegy(path, 20, 50)
+        paths.append(path)
+
+    # room for two sections
+    entry = 20 * 50 * 4 + 128
+    cache = preview.previewcache(str(tmpdir.join('cache')), budget = 2 * entry + 10)
+
+    load(paths[0], cache)
+    load(paths[1], cache)
+    # use the first, so that the second is the oldest
+    os.utime(cache.files(preview.key(paths[1], 1, 1))[0], ns = (0, 0))
+    assert cache.get(paths[0], 1, 1) is not None
+
+    load(paths[2], cache)
+    assert len(cache.entries()) == 2
+    assert cache.size() <= cache.budget
+    assert cache.get(paths[1], 1, 1) is None
+    assert cache.get(paths[0], 1, 1) is not None
+    assert cache.get(paths[2], 1, 1) is not None
+    assert not os.path.exists(cache.files(preview.key(paths[1], 1, 1))[1])
+
+def test_broken_entry_is_a_miss(tmpdir, segyfile):
+    path, data = segyfile
+    cache = preview.previewcache(str(tmpdir.join('cache')))
+    load(path, cache)
+
+    npy, _ = cache.files(preview.key(path, 1, 1))
+    with open(npy, 'wb') as f:
+        f.write(b'garbage')
+
+    assert cache.get(path, 1, 1) is None
+    section, _ = load(path, cache)
+    assert np.array_equal(section, data)
+
+def test_no_cache(segyfile):
+    path, data = segyfile
+    section, stats = load(path, None)
+    assert np.array_equal(section, data)
+    assert stats['max'] == data.max()
+
+def test_main_reopens_from_cache(monkeypatch, tmpdir, segyfile):
+    import matplotlib.pyplot as plt
+    from labelmaker.cli import main
+
+    path, data = segyfile
+    plt.switch_backend('Agg')
+    monkeypatch.setattr(plt, 'show', lambda *args, **kwargs: None)
+    cachedir = str(tmpdir.join('cache'))
+
+    reads = []
+    monkeypatch.setattr(preview, 'decimated',
+                        lambda *args: reads.append(args) or decimated(*args))
+
+    for _ in range(2):
+        main(['labelmaker', path, '-x', '2', '--cache-dir', cachedir])
+        image = plt.gca().get_images()[0]
+        stats = preview.statistics(data[::2])
+        assert image.get_clim() == preview.limits(stats, 99.5)
+        plt.close('all')
+
+    assert len(reads) == 1
+
+    main(['labelmaker', path, '-x', '2', '--no-cache'])
+    plt.close('all')
+    assert len(reads) == 2
+
+def test_clip_limits_ignore_spikes():
+    rng = np.random.RandomState(4)
+    data = rng.normal(size = (400, 300)).astype(np.single)
+    data[100, 100] = 1e6
+    data[200, 200] = -1e6
+
+    stats = preview.statistics(data)
+    assert preview.limits(stats, 100) == (-1e6, 1e6)
+
+    low, high = preview.limits(stats, 99)
+    expected = np.percentile(data, [1, 99])
+    assert abs(low - expected[0]) < 0.01
+    assert abs(high - expected[1]) < 0.01
+
+    tighter = preview.limits(stats, 95)
+    assert low < tighter[0] < tighter[1] < high
+
+def test_large_section_is_not_cached(tmpdir, capsys):
+    path = str(tmpdir.join('section.sgy'))
+    data = mksegy(path, 20, 50)
+
+    cache = preview.previewcache(str(tmpdir.join('cache')), budget = 1000)
+    section, _ = load(path, cache)
+    assert np.array_equal(section, data)
+    assert cache.entries() == []
+    assert 'Not caching the preview' in capsys.readouterr().out
+
+def test_statistics_sample_every_depth():
+    # the amplitude only changes with depth, and the trace length is a
+    # divisor of the size of the section over the number of samples
+    depths = np.linspace(-3, 3, 100)
+    data = np.tile(depths, (600, 1))
+    stats = preview.statistics(data, samples = 1000)
+    assert stats['min'] < -2.5 and stats['max'] > 2.5
+
+    low, high = preview.limits(stats, 90)
+    assert abs(low + 2.4) < 0.2
+    assert abs(high - 2.4) < 0.2
+
+def test_statistics_are_sampled():
+    data = np.arange(10 ** 6, dtype=np.single)
+    stats = preview.statistics(data, samples = 1000)
+    low, high = preview.limits(stats, 90)
+    assert abs(low - 1e5) < 1e4
+    assert abs(high - 9e5) < 1e4
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import collections
+import time
+import numpy as np
+
+from labelmaker import region
+from labelmaker.render import fill
+
+# seconds, for a 4000 x 2000 window. Walking the outline of the serpentine
+# edge by edge took over 30 seconds
+OUTLINE_BUDGET = 1.0
+GROW_BUDGET = 1.0
+
+def flood(data, seed, tolerance):
+    # sample by sample breadth first search
+    mask = np.abs(data - data[seed]) <= tolerance
+    out = np.zeros(mask.shape, dtype=bool)
+    out[seed] = True
+    queue = collections.deque([seed])
+    while queue:
+        i, j = queue.popleft()
+        for a, b in [(i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1)]:
+            if not (0 <= a < mask.shape[0] and 0 <= b < mask.shape[1]): continue
+            if mask[a, b] and not out[a, b]:
+                out[a, b] = True
+                queue.append((a, b))
+    return out
+
+def rasterized(vertices, shape):
+    out = np.zeros(shape, dtype=np.single)
+    fill(out, vertices, 1, 1, 1)
+    return out == 1
+
+def fastest(fn, *args, repeat = 3):
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed), result
+
+def serpentine(traces, samples):
+    # every other trace, joined alternately at the bottom and the top
+    out = np.zeros((traces, samples), dtype=bool)
+    out[::2, :-1] = True
+    out[1::4, -2] = True
+    out[3::4, 0] = True
+    return out
+
+@pytest.mark.parametrize('window', [1, 4, 256])
+def test_grow_matches_flood_fill(window):
+    rng = np.random.RandomState(1)
+    for _ in range(100):
+        data = rng.normal(size = (rng.randint(1, 25), rng.randint(1, 25)))
+        seed = (rng.randint(data.shape[0]), rng.randint(data.shape[1]))
+        assert np.array_equal(region.grow(data, seed, 0.8, window),
+                              flood(data, seed, 0.8))
+
+def test_grow_from_nan_is_empty():
+    data = np.zeros((4, 4))
+    data[1, 1] = np.nan
+    assert not region.grow(data, (1, 1), 1).any()
+    assert not region.grow(data, (0, 0), 1)[1, 1]
+
+def test_grow_with_negative_tolerance_is_empty():
+    data = np.zeros((4, 4))
+    assert not region.grow(data, (1, 1), -0.5).any()
+
+def test_grow_in_noise_is_bounded():
+    rng = np.random.RandomState(4)
+    data = rng.normal(size = (4000, 2000)).astype(np.single)
+    data[2000, 1000] = 0
+
+    # a small region is found without searching the whole window, and a
+    # region of speckle is refused
+    elapsed, grown = fastest(region.grow, data, (2000, 1000), 0.5)
+    assert elapsed < GROW_BUDGET
+    assert np.array_equal(grown, flood(data, (2000, 1000), 0.5))
+
+    elapsed, grown = fastest(region.grow, data, (2000, 1000), 1)
+    assert elapsed < GROW_BUDGET
+    assert grown is None
+
+def test_negative_fill_tolerance_is_rejected(capsys):
+    from labelmaker.cli import main
+    with pytest.raises(SystemExit):
+        main(['labelmaker', 'section.sgy', '--fill-tolerance', '-0.1'])
+    assert '--fill-tolerance must not be negative' in capsys.readouterr().err
+
+def test_outline_covers_region():
+    rng = np.random.RandomState(2)
+    for _ in range(100):
+        data = rng.normal(size = (rng.randint(1, 25), rng.randint(1, 25)))
+        seed = (rng.randint(data.shape[0]), rng.randint(data.shape[1]))
+        grown = region.grow(data, seed, 0.8)
+        covered = rasterized(region.outline(grown), data.shape)
+
+        # everything else that is covered is a hole, away from the edges
+        assert np.array_equal(covered & grown, grown)
+        holes = covered & ~grown
+        assert not (holes[0].any() or holes[-1].any()
+                    or holes[:, 0].any() or holes[:, -1].any())
+
+def test_outline_of_shapes():
+    assert region.outline(np.zeros((3, 3), dtype=bool)) is None
+
+    square = np.zeros((5, 5), dtype=bool)
+    square[1:3, 2:5] = True
+    expected = [(0.5, 1.5), (2.5, 1.5), (2.5, 4.5), (0.5, 4.5)]
+    assert region.outline(square).tolist() == [list(v) for v in expected]
+
+    # a hole is filled, pixels that touch by a corner are not joined
+    ring = np.ones((3, 3), dtype=bool)
+    ring[1, 1] = False
+    ring = np.pad(ring, ((0, 1), (0, 1)))
+    ring[3, 3] = True
+    outline = region.outline(ring)
+    assert len(outline) == 4
+    expected = np.zeros(ring.shape, dtype=bool)
+    expected[:3, :3] = True
+    assert np.array_equal(rasterized(outline, ring.shape), expected)
+
+def test_outline_of_large_serpentine_is_fast():
+    serpent = serpentine(4000, 2000)
+    elapsed, outline = fastest(region.outline, serpent)
+    assert elapsed < OUTLINE_BUDGET
+
+    # two corners at either end of every trace, and two more at the ends
+    assert len(outline) == 2 * 4000 + 2
+
+    small = serpentine(40, 20)
+    outline = region.outline(small)
+    assert len(outline) == 2 * 40 + 2
+    assert np.array_equal(rasterized(outline, small.shape), small)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import numpy as np
+import math
+
+from matplotlib import patches
+
+from labelmaker.render import bbox, fill, mask, polygons, render_parallel, tiles
+from labelmaker.labelmaker import mkoutput
+
+from conftest import random_polys
+
+def reference(polys, shape, xscale, yscale):
+    # the original mkoutput, which uses matplotlib's contains_points
+    traces, samples = shape
+    output = np.zeros((traces, samples), dtype=np.single).T
+
+    for poly, cls in polys.items():
+        xys = poly.get_xy()
+
+        w, n = xys.min(axis=0)
+        e, s = xys.max(axis=0)
+
+        w, n = int(math.floor(w)), int(math.floor(n))
+        e, s = int(math.ceil(e + 1)), int(math.ceil(s + 1))
+
+        w *= xscale
+        e *= xscale
+        s *= yscale
+        n *= yscale
+
+        xs = list(range(w, e))
+        ys = list(range(n, s))
+        xs1 = np.floor_divide(np.tile(xs, len(ys)), xscale)
+        ys1 = np.floor_divide(np.repeat(ys, len(xs)), yscale)
+        points = np.transpose([xs1, ys1])
+        mask = poly.get_path().contains_points(points)
+
+        subout = output[n:s, w:e]
+        np.place(subout, mask, [cls])
+
+    return output.T
+
+@pytest.mark.parametrize('xscale, yscale', [(1, 1), (2, 3), (4, 1), (1, 5)])
+@pytest.mark.parametrize('integer', [False, True])
+def test_mkoutput_matches_contains_points(xscale, yscale, integer):
+    rng = np.random.RandomState(xscale * 10 + yscale + integer)
+    traces, samples = 40 * xscale, 30 * yscale
+
+    for _ in range(10):
+        polys = random_polys(rng, 6, 40, 30, integer)
+        expected = reference(polys, (traces, samples), xscale, yscale)
+        result = mkoutput(polys, (traces, samples), xscale, yscale)
+        assert result.dtype == expected.dtype
+        assert np.array_equal(result, expected)
+
+def test_mask_matches_contains_points():
+    rng = np.random.RandomState(3)
+    xs, ys = np.arange(-2, 25), np.arange(-2, 25)
+    points = np.transpose([np.tile(xs, len(ys)), np.repeat(ys, len(xs))])
+
+    for _ in range(50):
+        vertices = np.round(rng.uniform(0, 22, (rng.randint(3, 20), 2)) * 2) / 2
+        poly = patches.Polygon(vertices)
+        expected = poly.get_path().contains_points(points)
+        result = mask(poly.get_xy(), xs, ys)
+        assert np.array_equal(result.ravel(), expected)
+
+def test_fill_window_matches_full():
+    rng = np.random.RandomState(7)
+    polys = random_polys(rng, 8, 30, 20)
+    full = mkoutput(polys, (60, 60), 2, 3)
+
+    for t0, s0, traces, samples in [(0, 0, 60, 60), (7, 11, 13, 29), (59, 0, 1, 60)]:
+        out = np.zeros((traces, samples), dtype=np.single)
+        for poly, cls in polys.items():
+            fill(out, poly.get_xy(), cls, 2, 3, origin = (t0, s0))
+        assert np.array_equal(out, full[t0:t0 + traces, s0:s0 + samples])
+
+def test_fill_clips_outside_polygons():
+    out = np.zeros((10, 10), dtype=np.single)
+    fill(out, np.array([[-5., -5.], [4., -5.], [4., 4.], [-5., 4.]]), 1)
+    assert out[:5, :5].all()
+    assert out.sum() == 25
+
+    fill(out, np.array([[20., 20.], [30., 20.], [30., 30.]]), 2)
+    assert out.sum() == 25
+
+def test_bbox():
+    assert bbox(np.array([[0.5, 1.5], [3.2, 4.0]])) == (0, 1, 5, 5)
+
+@pytest.mark.parametrize('jobs, tilesize', [(2, None), (3, 7), (4, 1)])
+def test_parallel_matches_serial(jobs, tilesize):
+    rng = np.random.RandomState(jobs)
+    polys = random_polys(rng, 20, 30, 20)
+    serial = mkoutput(polys, (60, 61), 2, 3)
+
+    parallel = render_parallel(polygons(polys), (60, 61), 2, 3, jobs,
+                               tilesize = tilesize)
+    assert parallel.dtype == serial.dtype
+    assert np.array_equal(parallel, serial)
+
+def test_parallel_without_traces():
+    assert render_parallel([], (0, 10), 1, 1, 2).shape == (0, 10)
+
+def test_tiles_cover_traces():
+    for traces, jobs, tilesize in [(10, 3, None), (10, 3, 4), (1, 8, None)]:
+        covered = [t for first, last in tiles(traces, jobs, tilesize)
+                     for t in range(first, last)]
+        assert covered == list(range(traces))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import Normalize
+
+from labelmaker import rgba
+
+def test_colormap_matches_matplotlib():
+    data = np.linspace(-3, 3, 60, dtype=np.single).reshape(6, 10)
+    cmap = plt.get_cmap('seismic')
+
+    image = rgba.colormap(data, cmap, -2, 2)
+    assert image.dtype == np.uint8
+    assert np.array_equal(image, cmap(Normalize(-2, 2)(data), bytes = True))
+
+    flat = rgba.colormap(np.ones((2, 2)), cmap, 1, 1)
+    assert np.array_equal(flat, cmap(np.zeros((2, 2)), bytes = True))
+
+def test_masked_values_are_transparent():
+    data = np.ma.masked_equal(np.array([[0, 1], [1, 0]], dtype=np.uint8), 0)
+    image = rgba.colormap(data, plt.get_cmap('autumn'), 0, 1, alpha = 0.5)
+    assert np.array_equal(image[..., 3], [[0, 127], [127, 0]])
+
+def test_composite():
+    image = np.zeros((1, 2, 4), dtype=np.uint8)
+    image[..., 3] = 255
+    layer = np.array([[[255, 255, 255, 0], [200, 100, 0, 128]]], dtype=np.uint8)
+
+    rgba.composite(image, layer)
+    assert np.array_equal(image[0, 0], [0, 0, 0, 255])
+    assert np.array_equal(image[0, 1], [100, 50, 0, 255])
+
+def test_resample_onto_window():
+    base = np.arange(8 * 6).reshape(8, 6)
+    # the full section is not resampled
+    assert rgba.resample(base, (-0.5, 7.5, 5.5, -0.5), (8, 6)) is base
+
+    # a window at twice the resolution of traces 2-3 and samples 1-4
+    window = rgba.resample(base, (1.5, 3.5, 4.5, 0.5), (4, 8))
+    assert np.array_equal(window, np.repeat(np.repeat(base[2:4, 1:5], 2, 0), 2, 1))
+
+    # every other trace and sample
+    coarse = rgba.resample(base, (-0.5, 7.5, 5.5, -0.5), (4, 3))
+    assert np.array_equal(coarse, base[::2, ::2])
+
+def test_cache_is_per_window_and_cleared_on_change():
+    data = np.random.RandomState(0).normal(size = (10, 20))
+    extent = (-0.5, 9.5, 19.5, -0.5)
+    cache = rgba.rgbacache(plt.get_cmap('gray'), -1, 1, size = 2)
+
+    first = cache.get('a', data, extent)
+    assert first.shape == (20, 10, 4)
+    assert cache.get('a', data, extent) is first
+
+    cache.get('b', data, extent)
+    cache.get('c', data, extent)
+    assert list(cache.images) == ['b', 'c']
+
+    cache.set_limits(-1, 1)
+    assert len(cache.images) == 2
+    cache.set_limits(-2, 2)
+    assert len(cache.images) == 0
+
+    cache.get('a', data, extent)
+    cache.overlay(np.ma.masked_all(data.shape), plt.get_cmap('autumn'), 0, 1, 0.7)
+    assert len(cache.images) == 0
+    assert np.array_equal(cache.get('a', data, extent),
+                          rgba.colormap(data, cache.cmap, -2, 2).transpose(1, 0, 2))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import numpy as np
+import segyio
+
+from labelmaker.section import decimated, shape, pyramid
+
+def test_decimated_matches_slicing(segyfile):
+    path, data = segyfile
+
+    with segyio.open(path, ignore_geometry=True) as f:
+        assert shape(f) == data.shape
+        for x, y in [(1, 1), (2, 3), (8, 8), (5, 1), (40, 60)]:
+            section = decimated(f, x, y)
+            assert np.array_equal(section, data[::x, ::y])
+
+def test_pyramid_levels_match_file(segyfile):
+    path, data = segyfile
+
+    with segyio.open(path, ignore_geometry=True) as f:
+        base = decimated(f, 2, 3)
+        p = pyramid(f, base, 2, 3)
+
+        windows = [
+            # whole section, big and small screens
+            ((-0.5, 18.5), (17.5, -0.5), 1000, 1000),
+            ((-0.5, 18.5), (17.5, -0.5), 4, 3),
+            # zoomed in, finer than the downsampled section
+            ((3.2, 7.9), (9.1, 2.2), 100, 100),
+            ((3.4, 7.9), (9.1, 2.4), 100, 100),
+            ((0, 5), (5, 0), 3, 100),
+        ]
+
+        for xlim, ylim, width, height in windows:
+            key, level, extent = p.window(xlim, ylim, width, height)
+            left, right, bottom, top = extent
+            traces, samples = level.shape
+
+            # every pixel shows the trace and sample at its left/top edge
+            tstep = (right - left) * 2 / traces
+            sstep = (bottom - top) * 3 / samples
+            t0, s0 = (left + 0.5) * 2, (top + 0.5) * 3
+            ts = np.round(t0 + np.arange(traces) * tstep).astype(int)
+            ss = np.round(s0 + np.arange(samples) * sstep).astype(int)
+            assert np.array_equal(level, data[np.ix_(ts, ss)])
+
+            # the window is covered, up to the end of the section
+            assert left <= max(min(xlim), -0.5)
+            assert right >= min(max(xlim), 37 / 2 - 0.5)
+            assert top <= max(min(ylim), -0.5)
+            assert bottom >= min(max(ylim), 53 / 3 - 0.5)
+
+def test_pyramid_reuses_read_window(segyfile):
+    path, _ = segyfile
+
+    with segyio.open(path, ignore_geometry=True) as f:
+        p = pyramid(f, decimated(f, 4, 4), 4, 4)
+        p.window((3, 5), (5, 3), 100, 100)
+        cached = p.cached
+        p.window((3.2, 5.2), (5.1, 3.1), 100, 100)
+        assert p.cached is cached
+
+def test_pyramid_window_without_reading(segyfile):
+    path, data = segyfile
+
+    with segyio.open(path, ignore_geometry=True) as f:
+        base = decimated(f, 2, 3)
+        p = pyramid(f, base, 2, 3)
+
+        key, level, extent = p.window((3.2, 7.9), (9.1, 2.2), 100, 100, finer = False)
+        assert key[:2] == ('level', 0)
+        assert p.cached is None
+        assert np.array_equal(level, base[3:9, 2:10])
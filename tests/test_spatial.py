@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import numpy as np
+
+from labelmaker.spatial import gridindex, cellsize
+
+def brute(boxes, x, y):
+    return [key for key, (w, n, e, s) in boxes.items()
+            if w <= x <= e and n <= y <= s]
+
+def test_candidates_match_brute_force():
+    rng = np.random.RandomState(0)
+    index = gridindex(cellsize((200, 100), 16))
+    boxes = {}
+
+    for key in range(300):
+        centre = rng.uniform(-10, 210, 2) * [1, 0.5]
+        size = rng.uniform(0, 60, 2)
+        vertices = centre + rng.uniform(-1, 1, (rng.randint(3, 8), 2)) * size
+        index.insert(key, vertices)
+        boxes[key] = (*vertices.min(axis=0), *vertices.max(axis=0))
+
+    for key in rng.choice(300, 100, replace = False):
+        index.remove(key)
+        del boxes[key]
+
+    for key in [3, 5, 8]:
+        # re-inserting moves the key to the back, like re-adding to a dict
+        if key not in boxes: continue
+        index.insert(key, [boxes[key][:2], boxes[key][2:]])
+        boxes[key] = boxes.pop(key)
+
+    assert len(index) == len(boxes)
+    for x, y in rng.uniform(-20, 220, (500, 2)) * [1, 0.5]:
+        assert index.candidates(x, y) == brute(boxes, x, y)
+
+def test_remove_missing_is_ignored():
+    index = gridindex((1, 1))
+    index.remove('missing')
+    index.insert('a', [(0, 0), (2, 2)])
+    index.remove('a')
+    assert 'a' not in index
+    assert index.cells == {}
+    assert index.candidates(1, 1) == []
+    assert index.candidates(None, None) == []
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import os
+import subprocess
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# seconds on top of importing numpy and segyio, which everything needs
+LIBRARY_BUDGET = 0.25
+CLI_BUDGET = 0.25
+
+library = ('import labelmaker, labelmaker.core, labelmaker.render, '
+           'labelmaker.utility, labelmaker.store, labelmaker.formats, '
+           'labelmaker.batch, labelmaker.compare, labelmaker.incremental')
+cli = ('import contextlib, io, labelmaker\n'
+       'with contextlib.redirect_stdout(io.StringIO()):\n'
+       '    try: labelmaker.main(["labelmaker", "--help"])\n'
+       '    except SystemExit: pass\n')
+
+def python(code):
+    env = dict(os.environ, PYTHONPATH = root)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', code], env = env,
+                          stdout = subprocess.PIPE, universal_newlines = True)
+    assert proc.returncode == 0
+    return time.perf_counter() - start, proc.stdout
+
+def fastest(code, repeat = 3):
+    return min(python(code)[0] for _ in range(repeat))
+
+heavy = ('matplotlib', 'scipy', 'multiprocessing', 'cProfile')
+def imported(code):
+    check = 'import sys\n{}\nprint(",".join(m for m in {} if m in sys.modules))'
+    return python(check.format(code, heavy))[1].strip()
+
+def test_library_does_not_import_gui():
+    assert imported(library) == ''
+
+def test_cli_help_does_not_import_gui():
+    assert imported(cli) == ''
+
+def test_startup_budget():
+    baseline = fastest('import numpy, segyio')
+    assert fastest(library) - baseline < LIBRARY_BUDGET
+    assert fastest(cli) - baseline < CLI_BUDGET
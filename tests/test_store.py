@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import os
+import numpy as np
+
+from labelmaker import store
+from labelmaker.core import read_polys
+
+def polygons(count, seed = 0):
+    rng = np.random.RandomState(seed)
+    return [(rng.uniform(0, 100, (rng.randint(3, 50), 2)), rng.randint(1, 29))
+            for _ in range(count)]
+
+def same(a, b):
+    assert len(a) == len(b)
+    for (va, ca), (vb, cb) in zip(a, b):
+        assert ca == cb
+        assert np.array_equal(va, vb)
+
+def test_npz_roundtrip(tmpdir):
+    path = str(tmpdir.join('polys.npz'))
+    expected = polygons(20)
+    store.save_npz(path, [(None, None, v, c) for v, c in expected], 2, 3)
+
+    polys = read_polys(path)
+    assert (polys['x'], polys['y']) == (2, 3)
+    same(polys['polygons'], expected)
+
+def test_npz_lines(tmpdir):
+    path = str(tmpdir.join('polys.npz'))
+    a, b, c = polygons(3)
+    entries = [('iline', 5, a[0], a[1]),
+               ('xline', 2, b[0], b[1]),
+               ('iline', 5, c[0], c[1])]
+    store.save_npz(path, entries, 1, 1)
+
+    lines = read_polys(path)['lines']
+    assert [(kind, lineno) for kind, lineno, _ in lines] == [('iline', 5), ('xline', 2)]
+    same(lines[0][2], [a, c])
+    same(lines[1][2], [b])
+
+def test_npz_empty(tmpdir):
+    path = str(tmpdir.join('polys.npz'))
+    store.save_npz(path, [], 1, 1)
+    assert read_polys(path)['polygons'] == []
+
+def test_journal_replays_edits(tmpdir):
+    path = str(tmpdir.join('polys.lmp'))
+    a, b, c = polygons(3)
+
+    j = store.journal(path, 2, 2)
+    ka = j.add(*a)
+    kb = j.add(*b)
+    kc = j.add(*c)
+    j.remove(ka)
+    j.setclass(kc, 17)
+    j.remove(kb)
+    # undo puts the polygon back last
+    j.add(*b, key = kb)
+    j.close()
+
+    same(read_polys(path)['polygons'], [(c[0], 17), b])
+
+    # reopening resumes, and does not reuse ids
+    j = store.journal(path, 2, 2)
+    assert list(j.polygons) == [kc, kb]
+    assert j.add(*a) not in (ka, kb, kc)
+    j.close()
+
+def test_journal_compact(tmpdir):
+    path = str(tmpdir.join('polys.lmp'))
+    expected = polygons(10)
+
+    j = store.journal(path, 1, 1)
+    keys = [j.add(*p) for p in expected]
+    for key in keys[::2]: j.remove(key)
+    before = os.path.getsize(path)
+
+    ids = j.compact()
+    assert sorted(ids) == keys[1::2]
+    assert os.path.getsize(path) < before
+
+    j.add(*expected[0])
+    j.close()
+    same(read_polys(path)['polygons'], expected[1::2] + expected[:1])
+
+def test_journal_ignores_truncated_record(tmpdir):
+    path = str(tmpdir.join('polys.lmp'))
+    a, b = polygons(2)
+
+    j = store.journal(path, 1, 1)
+    j.add(*a)
+    j.add(*b)
+    j.close()
+
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 8)
+
+    same(read_polys(path)['polygons'], [a])
+
+    # the journal is resumed after the last complete record
+    c, = polygons(1, seed = 1)
+    j = store.journal(path, 1, 1)
+    j.add(*c)
+    j.close()
+    same(read_polys(path)['polygons'], [a, c])
+
+def test_journal_rejects_other_downsampling(tmpdir):
+    path = str(tmpdir.join('polys.lmp'))
+    store.journal(path, 1, 1).close()
+    with pytest.raises(ValueError):
+        store.journal(path, 2, 1)
+
+    with open(str(tmpdir.join('bad.lmp')), 'wb') as f:
+        f.write(b'not a journal at all')
+    with pytest.raises(ValueError):
+        store.replay(str(tmpdir.join('bad.lmp')))
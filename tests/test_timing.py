@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import pytest
+
+import json
+import os
+import pstats
+
+import numpy as np
+import segyio
+import matplotlib.pyplot as plt
+
+from labelmaker import timing
+from labelmaker.core import export, mkoutput
+from labelmaker.labelmaker import plotter, parser
+from labelmaker.section import decimated, shape
+
+@pytest.fixture
+def trace(tmpdir):
+    path = str(tmpdir.join('trace.jsonl'))
+    yield path
+    timing.disable()
+
+def events(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def square(n):
+    return [(np.array([(n, n), (n + 5, n), (n + 5, n + 5), (n, n + 5)], dtype=float), 2)]
+
+def test_disabled_by_default(monkeypatch, trace):
+    monkeypatch.delenv(timing.ENVIRONMENT, raising = False)
+    timing.enable()
+    assert not timing.enabled()
+
+    with timing.timed('nothing', x = 1) as info:
+        info['y'] = 2
+    assert not os.path.exists(trace)
+
+def test_environment_enables_trace(monkeypatch, trace, segyfile):
+    path, data = segyfile
+    monkeypatch.setenv(timing.ENVIRONMENT, trace)
+    timing.enable()
+
+    mkoutput(square(2) + square(10), data.shape, 1, 1)
+    with timing.timed('custom', x = 1) as info:
+        info.update(timing.array(data))
+
+    records = events(trace)
+    assert [r['event'] for r in records] == ['rasterize', 'rasterize', 'custom']
+    assert [r['polygon'] for r in records[:2]] == [1, 2]
+    assert records[2]['shape'] == list(data.shape)
+    assert records[2]['bytes'] == data.nbytes
+    assert all(r['seconds'] >= 0 for r in records)
+    if timing.resource is not None:
+        assert all(r['peak_rss_kb'] > 0 for r in records)
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_export_times_chunks_and_polygons(tmpdir, trace, segyfile, jobs):
+    path, data = segyfile
+    timing.enable(trace)
+
+    with tmpdir.as_cwd():
+        export(path, square(3) + square(20), 1, 1, chunksize = 30, jobs = jobs)
+
+    records = events(trace)
+    chunks = [r for r in records if r['event'] == 'render-chunk']
+    assert [r['first'] for r in chunks] == list(range(0, len(data), 30))
+
+    # every polygon is timed in every chunk, or with jobs, in every tile
+    rasterized = [r for r in records if r['event'] == 'rasterize']
+    assert sum(r['traces'] for r in rasterized) == 2 * len(data)
+    assert {r['polygon'] for r in rasterized} == {1, 2}
+    assert all(r['seconds'] >= 0 for r in rasterized)
+
+def test_profile_one_action(tmpdir, trace, segyfile):
+    path, data = segyfile
+    timing.enable(trace, action = 'export')
+
+    with tmpdir.as_cwd():
+        export(path, square(3), 1, 1, chunksize = 10)
+
+    records = events(trace)
+    assert [r['event'] for r in records].count('write-traces') == 4
+    assert records[-1]['event'] == 'export'
+    assert records[-1]['polygons'] == 1
+
+    stats = pstats.Stats(trace + '.export.prof')
+    assert stats.total_calls > 0
+
+def test_plotter_actions(monkeypatch, tmpdir, trace, segyfile):
+    path, _ = segyfile
+    plt.switch_backend('Agg')
+    monkeypatch.setattr(plt, 'show', lambda *args, **kwargs: None)
+
+    args = parser().parse_args([path, '--profile', trace])
+    timing.enable(args.profile, args.profile_action)
+    with segyio.open(path, ignore_geometry=True) as f:
+        p = plotter(args, decimated(f), shape(f))
+    p.run()
+    p.canvas.draw()
+
+    from test_plotter import square as draw, key, export
+    with tmpdir.as_cwd():
+        draw(p, 2, 2, 10, 10)
+        key(p, '3', 5, 5)
+        export(p)
+    plt.close('all')
+
+    names = [r['event'] for r in events(trace)]
+    for name in ['imshow', 'run', 'draw', 'key:enter', 'key:3', 'key:ctrl+e', 'export']:
+        assert name in names
+
+    keys = {r['event']: r for r in events(trace) if r['event'].startswith('key:')}
+    assert keys['key:3']['action'] == 'set_class'
+    assert keys['key:ctrl+e']['polygons'] == 1
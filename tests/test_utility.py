@@ -49,3 +49,29 @@ def test_closest_value():
     assert 10 == closest(0, 0, xdata, ydata, dx, dy)[0]
     assert 13 == closest(4, 0.14, xdata, ydata, dx, dy)[0]
     assert 13 == closest(3, 0, xdata, ydata, dx, dy)[0]
+
+def test_closest_batched():
+    rng = np.random.RandomState(0)
+    xdata = rng.uniform(0, 100, 50)
+    ydata = rng.uniform(-1, 1, 50)
+    xs = rng.uniform(0, 100, 30)
+    ys = rng.uniform(-1, 1, 30)
+
+    index, distance = closest(xs, ys, xdata, ydata, 100, 2)
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        assert (index[i], distance[i]) == closest(x, y, xdata, ydata, 100, 2)
+
+def test_closest_large_vertex_sets():
+    rng = np.random.RandomState(1)
+    xdata = rng.uniform(0, 100, 5000)
+    ydata = rng.uniform(-1, 1, 5000)
+    xs = rng.uniform(0, 100, 200)
+    ys = rng.uniform(-1, 1, 200)
+
+    index, distance = closest(xs, ys, xdata, ydata, 100, 2)
+    expected = [closest(x, y, xdata, ydata, 100, 2)[1] for x, y in zip(xs, ys)]
+    assert np.allclose(distance, expected)
+
+def test_within_tolerance_batched():
+    distances = np.array([0.005, 0.0141, 0.0142, 0.5])
+    assert within_tolerance(distances, 1, 1, 0.01).tolist() == [True, True, False, False]